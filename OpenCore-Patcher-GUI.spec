@@ -9,7 +9,7 @@ block_cipher = None
 a = Analysis(['OpenCore-Patcher-GUI.command'],
              pathex=[],
              binaries=[],
-             datas=[('payloads.dmg', '.'), ('Universal-Binaries.dmg', '.')],
+             datas=[('payloads.dmg', '.'), ('Universal-Binaries.dmg', '.'), ('Universal-Binaries.dmg.manifest.plist', '.')],
              hiddenimports=[],
              hookspath=[],
              hooksconfig={},
@@ -1,5 +1,6 @@
-from curses.ascii import isdigit
+import re
 import enum
+import functools
 
 
 class os_data(enum.IntEnum):
@@ -129,69 +130,79 @@ class os_conversion:
         return int(os_kernel)
 
 
-    def find_largest_build(build_array: list) -> str:
+@functools.total_ordering
+class BuildNumber:
+    """
+    Parsed, hashable and totally ordered macOS build number
+
+    ex. "22A5295i" -> major 22, train "A", number 5295, suffix "i"
+
+    Builds are ordered by major, train, number then suffix, with builds lacking a suffix
+    sorting before lettered revisions of the same number (ie. "22A5295" < "22A5295h" < "22A5295i").
+    Builds that don't follow this format sort before all others, and builds are only equal if their strings are
+
+    Usage:
+        >>> BuildNumber.parse("22A5295i") > BuildNumber.parse("22A5266r")
+        True
+        >>> sorted(builds, key=BuildNumber.parse)
+    """
+
+    BUILD_REGEX = re.compile(r"^(\d+)([A-Z])(\d+)([a-z]*)$")
+
+    def __init__(self, build: str) -> None:
+        self.build:  str  = build
+        self.major:  int  = -1
+        self.train:  str  = ""
+        self.number: int  = -1
+        self.suffix: str  = ""
+        self.valid:  bool = False
+
+        match = self.BUILD_REGEX.match(build)
+        if match:
+            self.major  = int(match.group(1))
+            self.train  = match.group(2)
+            self.number = int(match.group(3))
+            self.suffix = match.group(4)
+            self.valid  = True
+
+        self._key: tuple = (self.major, self.train, self.number, self.suffix, self.build)
+
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def parse(build: str) -> "BuildNumber":
         """
-        Find the newest version within an array of versions
-        These builds will have both numbers and letters in the version
-        ex:
-        [
-            "22A5295i",
-            "22A5266r",
-            "22A5286j",
-            "22A5295h",
-        ]
+        Parse a build number, cached per string
+
+        Parameters:
+            build (str): Build number, ie. "22A5295i"
+
+        Returns:
+            BuildNumber: Parsed build
         """
 
-        max_length =        0  # Length of the longest build
-        build_array_split = [] # 'build_array', converted into individual array of elements
-        final_build =       "" # Largest determined build
-
-
-        # Convert strings to arrays
-        for build in build_array:
-            list_build = list(build)
-            if len(list_build) > max_length:
-                max_length = len(list_build)
-            build_array_split.append(list_build)
-
-        # Pad out each array to same length
-        for build in build_array_split:
-            while len(build) < max_length:
-                build.append("0")
-
-        # Convert all letters to int using ord()
-        for build in build_array_split:
-            for entry in build:
-                if not entry.isdigit():
-                    build[build.index(entry)] = ord(entry)
-
-        for build_outer_loop in build_array_split:
-            for build_inner_loop in list(build_array_split):
-                for i in range(len(build_outer_loop)):
-                    # remove any builds that are not the largest
-                    if int(build_outer_loop[i]) > int(build_inner_loop[i]):
-                        build_array_split.remove(build_inner_loop)
-                        break
-                    if int(build_outer_loop[i]) < int(build_inner_loop[i]):
-                        break
-
-        # Convert array back to string
-        for entry in build_array_split[0]:
-            # Since we split per character, we know that anything above 9 is a letter
-            if int(entry) > 9:
-                # revert back to letter
-                final_build += chr(entry)
-            else:
-                final_build += str(entry)
-
-        # Since we pad with 0s, we need to next determine how many 0s to remove
-        for build in build_array:
-            if final_build.startswith(build):
-                # Handle cases where Apple added a letter to the build
-                # ex. "22A5295" vs "22A5295"
-                remaining_strings = final_build.split(build)[1]
-                # If all remaining strings are 0s, then we can remove the 0s
-                if all(char == "0" for char in remaining_strings):
-                    final_build = build
-
-        return final_build
\ No newline at end of file
+        return BuildNumber(build)
+
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, BuildNumber):
+            return NotImplemented
+        return self._key == other._key
+
+
+    def __lt__(self, other) -> bool:
+        if not isinstance(other, BuildNumber):
+            return NotImplemented
+        return self._key < other._key
+
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+
+    def __str__(self) -> str:
+        return self.build
+
+
+    def __repr__(self) -> str:
+        return f"BuildNumber({self.build!r})"
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# Benchmark for RemoteInstallerCatalog._list_newest_installers_only()
+#
+# Compares the current selection against the original nested-loop implementation
+# on synthetic Software Update catalogs, verifying both return the same installers
+# in the same order before timing them.
+#
+# Usage (from the repository root):
+#   python3 docs/scripts/installer_catalog_benchmark.py [--entries 1000 5000 20000] [--rounds 5] [--catalogs 200]
+
+import sys
+import time
+import random
+import argparse
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from resources.macos_installer_handler import RemoteInstallerCatalog
+
+
+BETA_VARIANTS:    list = ["CustomerSeed", "DeveloperSeed", "PublicSeed"]
+RELEASE_VARIANTS: list = ["PublicRelease"]
+OS_VERSIONS:      list = ["10.12", "10.13", "10.14", "10.15", "11", "12", "13", "14"]
+
+
+def legacy_list_newest_installers_only(available_apps: dict) -> dict:
+    """
+    Original implementation of _list_newest_installers_only(), kept verbatim for comparison
+    """
+
+    if available_apps is None:
+        return {}
+
+    newest_apps: dict = available_apps.copy()
+    supported_versions = ["10.13", "10.14", "10.15", "11", "12", "13"]
+
+
+    for version in supported_versions:
+        remote_version_minor = 0
+        remote_version_security = 0
+        os_builds = []
+
+        # First determine the largest version
+        for ia in newest_apps:
+            if newest_apps[ia]["Version"].startswith(version):
+                if newest_apps[ia]["Variant"] not in ["CustomerSeed", "DeveloperSeed", "PublicSeed"]:
+                    remote_version = newest_apps[ia]["Version"].split(".")
+                    if remote_version[0] == "10":
+                        remote_version.pop(0)
+                        remote_version.pop(0)
+                    else:
+                        remote_version.pop(0)
+                    if int(remote_version[0]) > remote_version_minor:
+                        remote_version_minor = int(remote_version[0])
+                        remote_version_security = 0 # Reset as new minor version found
+                    if len(remote_version) > 1:
+                        if int(remote_version[1]) > remote_version_security:
+                            remote_version_security = int(remote_version[1])
+
+        # Now remove all versions that are not the largest
+        for ia in list(newest_apps):
+            # Don't use Beta builds to determine latest version
+            if newest_apps[ia]["Variant"] in ["CustomerSeed", "DeveloperSeed", "PublicSeed"]:
+                continue
+
+            if newest_apps[ia]["Version"].startswith(version):
+                remote_version = newest_apps[ia]["Version"].split(".")
+                if remote_version[0] == "10":
+                    remote_version.pop(0)
+                    remote_version.pop(0)
+                else:
+                    remote_version.pop(0)
+                if int(remote_version[0]) < remote_version_minor:
+                    newest_apps.pop(ia)
+                    continue
+                if int(remote_version[0]) == remote_version_minor:
+                    if len(remote_version) > 1:
+                        if int(remote_version[1]) < remote_version_security:
+                            newest_apps.pop(ia)
+                            continue
+                    else:
+                        if remote_version_security > 0:
+                            newest_apps.pop(ia)
+                            continue
+
+                # Remove duplicate builds
+                #   ex.  macOS 12.5.1 has 2 builds in the Software Update Catalog
+                #   ref: https://twitter.com/classicii_mrmac/status/1560357471654379522
+                if newest_apps[ia]["Build"] in os_builds:
+                    newest_apps.pop(ia)
+                    continue
+
+                os_builds.append(newest_apps[ia]["Build"])
+
+    # Remove Betas if there's a non-beta version available
+    for ia in list(newest_apps):
+        if newest_apps[ia]["Variant"] in ["CustomerSeed", "DeveloperSeed", "PublicSeed"]:
+            for ia2 in newest_apps:
+                if newest_apps[ia2]["Version"].split(".")[0] == newest_apps[ia]["Version"].split(".")[0] and newest_apps[ia2]["Variant"] not in ["CustomerSeed", "DeveloperSeed", "PublicSeed"]:
+                    newest_apps.pop(ia)
+                    break
+
+    # Remove unsupported versions (namely 14)
+    for ia in list(newest_apps):
+        if newest_apps[ia]["Version"].split(".")[0] not in supported_versions:
+            newest_apps.pop(ia)
+
+    return newest_apps
+
+
+def current_list_newest_installers_only(available_apps: dict) -> dict:
+    """
+    Runs the shipped implementation without fetching a catalog
+    """
+
+    catalog = RemoteInstallerCatalog.__new__(RemoteInstallerCatalog)
+    catalog.available_apps = available_apps
+    return catalog._list_newest_installers_only()
+
+
+def generate_catalog(entries: int, rng: random.Random) -> dict:
+    """
+    Generates a synthetic catalog shaped like RemoteInstallerCatalog.available_apps
+
+    Parameters:
+        entries (int): Number of installers to generate
+        rng (random.Random): Random source, seeded for reproducible catalogs
+
+    Returns:
+        dict: Product ID -> installer dictionary
+    """
+
+    catalog = {}
+    for index in range(entries):
+        os_version = rng.choice(OS_VERSIONS)
+        version = f"{os_version}.{rng.randint(0, 7)}"
+        if rng.random() < 0.6:
+            version += f".{rng.randint(1, 4)}"
+
+        catalog[f"{index:03d}-{rng.randint(10000, 99999)}"] = {
+            "Version": version,
+            # Small build pool so duplicate builds show up, as they do in Apple's catalogs
+            "Build":   f"{rng.randint(17, 23)}{rng.choice('ABCDEFG')}{rng.randint(1, 40)}",
+            "Variant": rng.choice(BETA_VARIANTS if rng.random() < 0.2 else RELEASE_VARIANTS),
+        }
+
+    return catalog
+
+
+def verify(catalogs: int, seed: int) -> None:
+    """
+    Ensures both implementations select the same installers, in the same order
+    """
+
+    rng = random.Random(seed)
+    for _ in range(catalogs):
+        catalog = generate_catalog(rng.randint(0, 300), rng)
+        for variant in [catalog, dict(sorted(catalog.items(), key=lambda item: item[1]["Version"]))]:
+            legacy  = legacy_list_newest_installers_only(variant)
+            current = current_list_newest_installers_only(variant)
+            if list(legacy.items()) != list(current.items()):
+                raise SystemExit(f"Mismatch on catalog:\n  legacy:  {list(legacy)}\n  current: {list(current)}")
+
+    print(f"Verified {catalogs * 2} catalogs, outputs match")
+
+
+def best_of(function, catalog: dict, rounds: int) -> float:
+    """
+    Returns the fastest of several runs, in milliseconds
+    """
+
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function(catalog)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark RemoteInstallerCatalog._list_newest_installers_only()")
+    parser.add_argument("--entries",  type=int, nargs="+", default=[1000, 5000, 20000], help="Catalog sizes to time")
+    parser.add_argument("--rounds",   type=int, default=5,   help="Runs per catalog size, fastest is reported")
+    parser.add_argument("--catalogs", type=int, default=200, help="Random catalogs to compare outputs on")
+    parser.add_argument("--seed",     type=int, default=0,   help="Seed for catalog generation")
+    args = parser.parse_args()
+
+    verify(args.catalogs, args.seed)
+
+    rng = random.Random(args.seed)
+    print(f"{'Entries':>8}  {'Legacy':>12}  {'Current':>12}")
+    for entries in args.entries:
+        catalog = generate_catalog(entries, rng)
+        legacy  = best_of(legacy_list_newest_installers_only,  catalog, args.rounds)
+        current = best_of(current_list_newest_installers_only, catalog, args.rounds)
+        print(f"{entries:>8}  {legacy:>10.1f}ms  {current:>10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,65 +20,298 @@
 # THE SOFTWARE.                                                                 #
 #################################################################################
 
+import io
+import os
+import mmap
 import struct
 import codecs
-from datetime import datetime, timedelta
+from collections.abc import Mapping, Sequence
+from datetime import datetime, timedelta, timezone
+
+def _naiveUTC(date):
+    '''_naiveUTC(date) -> datetime
+
+    Converts a timezone-aware datetime to naive UTC, naive datetimes are taken as UTC already
+    '''
+    if date.tzinfo is None:
+        return date
+    return date.astimezone(timezone.utc).replace(tzinfo=None)
 
 class BPListWriter(object):
     def __init__(self, objects):
-        self.bplist = ""
+        self.bplist = b""
         self.objects = objects
 
-    def binary(self):
-        '''binary -> string
+    def __flatten(self, obj):
+        '''__flatten(obj) -> int
 
-        Generates bplist
+        Assigns an object index to obj and its children, returning obj's index
+        Scalars are deduplicated by value, containers by identity
         '''
-        self.data = 'bplist00'
+        if isinstance(obj, (dict, list, tuple)):
+            key = ('container', id(obj))
+        elif isinstance(obj, datetime):
+            key = ('date', _naiveUTC(obj))
+        elif isinstance(obj, (bytes, bytearray)):
+            key = ('data', bytes(obj))
+        elif obj is None or isinstance(obj, (bool, int, float, str)):
+            key = (type(obj), obj)
+        else:
+            raise TypeError('unsupported type for bplist: '+type(obj).__name__)
 
-        # TODO: flatten objects and count max length size
+        try:
+            return self.object_index[key]
+        except KeyError:
+            pass
 
-        # TODO: write objects and save offsets
+        idx = len(self.flat)
+        self.object_index[key] = idx
+        self.flat.append(obj)
+        if isinstance(obj, dict):
+            # Keys are flattened first, matching CFBinaryPList's layout
+            refs = []
+            for k in obj:
+                if not isinstance(k, str):
+                    raise TypeError('bplist dict keys must be strings')
+                refs.append(self.__flatten(k))
+            for v in obj.values():
+                refs.append(self.__flatten(v))
+            self.refs[idx] = refs
+            # Keep the container alive, its id() is used for deduplication
+            self.containers.append(obj)
+        elif isinstance(obj, (list, tuple)):
+            self.refs[idx] = [self.__flatten(v) for v in obj]
+            self.containers.append(obj)
+        return idx
+
+    def __intSize(self, value):
+        '''__intSize(value) -> int
+
+        Returns the minimal unsigned width (1, 2, 4 or 8 bytes) able to hold value
+        '''
+        if   value < 1 << 8:
+            return 1
+        elif value < 1 << 16:
+            return 2
+        elif value < 1 << 32:
+            return 4
+        return 8
 
-        # TODO: write offsets
+    def __packUInt(self, sz, value):
+        return value.to_bytes(sz, 'big')
 
-        # TODO: write metadata
+    def __packRefs(self, sz, refs):
+        return struct.pack('>%d%s' % (len(refs), {1: 'B', 2: 'H', 4: 'L', 8: 'Q'}[sz]), *refs)
 
-        return self.data
+    def __packCount(self, obj_type, count):
+        '''__packCount(obj_type, count) -> bytes
 
-    def write(self, filename):
+        Packs an object header with its count, using a trailing int object if the count doesn't fit in 4 bits
         '''
+        if count < 0x0F:
+            return bytes([obj_type | count])
+        sz = self.__intSize(count)
+        return bytes([obj_type | 0x0F, 0x10 | (sz.bit_length() - 1)]) + self.__packUInt(sz, count)
+
+    def __packItem(self, idx):
+        '''__packItem(idx) -> bytes
 
-        Writes bplist to file
+        Packs the object at given index, containers reference their children by index
         '''
-        if self.bplist != "":
-            pass
-            # TODO: save self.bplist to file
+        obj = self.flat[idx]
+        if   obj is None:
+            return b'\x00'
+        elif obj is False:
+            return b'\x08'
+        elif obj is True:
+            return b'\x09'
+        elif isinstance(obj, int):
+            if obj < 0:
+                return b'\x13' + struct.pack('>q', obj)
+            elif obj < 1 << 63:
+                sz = self.__intSize(obj)
+                return bytes([0x10 | (sz.bit_length() - 1)]) + self.__packUInt(sz, obj)
+            elif obj < 1 << 64:
+                return b'\x14' + self.__packUInt(16, obj)
+            raise OverflowError('int too large for bplist: '+str(obj))
+        elif isinstance(obj, float):
+            return b'\x23' + struct.pack('>d', obj)
+        elif isinstance(obj, datetime):
+            return b'\x33' + struct.pack('>d', (_naiveUTC(obj) - datetime(2001, 1, 1)).total_seconds())
+        elif isinstance(obj, (bytes, bytearray)):
+            return self.__packCount(0x40, len(obj)) + bytes(obj)
+        elif isinstance(obj, str):
+            try:
+                encoded = obj.encode('ascii')
+                return self.__packCount(0x50, len(encoded)) + encoded
+            except UnicodeEncodeError:
+                encoded = obj.encode('utf-16be')
+                return self.__packCount(0x60, len(encoded) // 2) + encoded
+        elif isinstance(obj, dict):
+            refs = self.refs[idx]
+            return self.__packCount(0xD0, len(refs) // 2) + self.__packRefs(self.object_ref_size, refs)
         else:
-            raise Exception('BPlist not yet generated')
+            refs = self.refs[idx]
+            return self.__packCount(0xA0, len(refs)) + self.__packRefs(self.object_ref_size, refs)
+
+    def __writeTo(self, fp):
+        '''__writeTo(file)
+
+        Streams the bplist to a writable binary file object
+        '''
+        self.flat = []
+        self.refs = {}
+        self.containers = []
+        self.object_index = {}
+
+        # flatten objects and count max length size
+        top_object = self.__flatten(self.objects)
+        self.object_ref_size = self.__intSize(len(self.flat))
+
+        # write objects and save offsets
+        fp.write(b'bplist00')
+        position = 8
+        offsets = []
+        for idx in range(len(self.flat)):
+            offsets.append(position)
+            item = self.__packItem(idx)
+            fp.write(item)
+            position += len(item)
+
+        # write offsets
+        offset_size = self.__intSize(offsets[-1])
+        fp.write(self.__packRefs(offset_size, offsets))
+
+        # write metadata
+        fp.write(struct.pack('>6xBBQQQ', offset_size, self.object_ref_size, len(self.flat), top_object, position))
+
+        self.flat = self.refs = self.containers = self.object_index = None
+
+    def binary(self):
+        '''binary -> bytes
+
+        Generates bplist
+        '''
+        fp = io.BytesIO()
+        self.__writeTo(fp)
+        self.bplist = fp.getvalue()
+        return self.bplist
+
+    def write(self, filename):
+        '''
+
+        Writes bplist to file, streaming objects as they're packed
+        Accepts either a path or a writable binary file object
+        '''
+        if hasattr(filename, 'write'):
+            self.__writeTo(filename)
+            return
+        with open(filename, 'wb') as fp:
+            self.__writeTo(fp)
+
+class BPListDict(Mapping):
+    '''
+    Read-only dict view of a bplist dict, keys are resolved on first lookup and values on access
+    '''
+    def __init__(self, reader, count, objref):
+        self._reader = reader
+        self._count = count
+        self._objref = objref
+        self._index = None
+
+    def __keyIndex(self):
+        if self._index is None:
+            index = {}
+            for i in range(self._count):
+                key = self._reader._resolveRef(self._objref, i)
+                if not isinstance(key, str):
+                    key = codecs.decode(key, "utf-8")
+                index[key] = i
+            self._index = index
+        return self._index
+
+    def __getitem__(self, key):
+        return self._reader._resolveRef(self._objref, self._count + self.__keyIndex()[key])
+
+    def __iter__(self):
+        return iter(self.__keyIndex())
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return 'BPListDict(' + repr(dict(self)) + ')'
+
+    def resolve(self):
+        '''resolve() -> dict
+
+        Recursively resolves into a plain dict
+        '''
+        return {k: _resolveProxy(v) for k, v in self.items()}
+
+class BPListArray(Sequence):
+    '''
+    Read-only list view of a bplist array, elements are resolved on access
+    '''
+    def __init__(self, reader, count, objref):
+        self._reader = reader
+        self._count = count
+        self._objref = objref
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('bplist array index out of range')
+        return self._reader._resolveRef(self._objref, i)
+
+    def __len__(self):
+        return self._count
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, BPListArray)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return 'BPListArray(' + repr(list(self)) + ')'
+
+    def resolve(self):
+        '''resolve() -> list
+
+        Recursively resolves into a plain list
+        '''
+        return [_resolveProxy(v) for v in self]
+
+def _resolveProxy(obj):
+    if isinstance(obj, (BPListDict, BPListArray)):
+        return obj.resolve()
+    return obj
 
 class BPListReader(object):
+    '''
+    Parses a bplist lazily over a memoryview of the input
+
+    Only the trailer is read up front, objects are unpacked when first accessed
+    parse() returns plain dicts and lists, parse(lazy=True) returns BPListDict and BPListArray proxies instead
+    '''
     def __init__(self, s):
-        self.data = s
-        self.objects = []
+        self.data = s if isinstance(s, memoryview) else memoryview(s)
         self.resolved = {}
 
-    def __unpackIntStruct(self, sz, s):
-        '''__unpackIntStruct(size, string) -> int
+    _intFormats = {1: '>B', 2: '>H', 4: '>I', 8: '>Q'}
 
-        Unpacks the integer of given size (1, 2 or 4 bytes) from string
+    def __unpackIntStruct(self, sz, offset):
+        '''__unpackIntStruct(size, offset) -> int
+
+        Unpacks the unsigned integer of given size (1, 2, 4 or 8 bytes) at offset
         '''
-        if   sz == 1:
-            ot = '!B'
-        elif sz == 2:
-            ot = '!H'
-        elif sz == 4:
-            ot = '!I'
-        elif sz == 8:
-            ot = '!Q'
-        else:
+        try:
+            return struct.unpack_from(self._intFormats[sz], self.data, offset)[0]
+        except KeyError:
             raise Exception('int unpack size '+str(sz)+' unsupported')
-        return struct.unpack(ot, s)[0]
 
     def __unpackInt(self, offset):
         '''__unpackInt(offset) -> int
@@ -91,11 +324,16 @@ class BPListReader(object):
         '''__unpackIntMeta(offset) -> (size, int)
 
         Unpacks int field from plist at given offset and returns its size and value
+        8 byte ints are signed, 16 byte ints are unsigned
         '''
         obj_header = self.data[offset]
-        obj_type, obj_info = (obj_header & 0xF0), (obj_header & 0x0F)
+        obj_info = obj_header & 0x0F
         int_sz = 2**obj_info
-        return int_sz, self.__unpackIntStruct(int_sz, self.data[offset+1:offset+1+int_sz])
+        if int_sz == 8:
+            return int_sz, struct.unpack_from('>q', self.data, offset+1)[0]
+        if int_sz == 16:
+            return int_sz, int.from_bytes(self.data[offset+1:offset+17], 'big')
+        return int_sz, self.__unpackIntStruct(int_sz, offset+1)
 
     def __resolveIntSize(self, obj_info, offset):
         '''__resolveIntSize(obj_info, offset) -> (count, offset)
@@ -110,31 +348,20 @@ class BPListReader(object):
             objref = offset+1
         return obj_count, objref
 
-    def __unpackFloatStruct(self, sz, s):
-        '''__unpackFloatStruct(size, string) -> float
-
-        Unpacks the float of given size (4 or 8 bytes) from string
-        '''
-        if   sz == 4:
-            ot = '!f'
-        elif sz == 8:
-            ot = '!d'
-        else:
-            raise Exception('float unpack size '+str(sz)+' unsupported')
-        return struct.unpack(ot, s)[0]
-
     def __unpackFloat(self, offset):
         '''__unpackFloat(offset) -> float
 
-        Unpacks float field from plist at given offset
+        Unpacks float field (4 or 8 bytes) from plist at given offset
         '''
-        obj_header = self.data[offset]
-        obj_type, obj_info = (obj_header & 0xF0), (obj_header & 0x0F)
-        int_sz = 2**obj_info
-        return int_sz, self.__unpackFloatStruct(int_sz, self.data[offset+1:offset+1+int_sz])
+        obj_info = self.data[offset] & 0x0F
+        if   obj_info == 2:
+            return struct.unpack_from('>f', self.data, offset+1)[0]
+        elif obj_info == 3:
+            return struct.unpack_from('>d', self.data, offset+1)[0]
+        raise Exception('float unpack size '+str(2**obj_info)+' unsupported')
 
     def __unpackDate(self, offset):
-        td = int(struct.unpack(">d", self.data[offset+1:offset+9])[0])
+        td = struct.unpack_from(">d", self.data, offset+1)[0]
         return datetime(year=2001,month=1,day=1) + timedelta(seconds=td)
 
     def __unpackItem(self, offset):
@@ -163,39 +390,25 @@ class BPListReader(object):
             return self.__unpackDate(offset)
         elif obj_type == 0x40: #    data    0100 nnnn   [int]   ... // nnnn is number of bytes unless 1111 then int count follows, followed by bytes
             obj_count, objref = self.__resolveIntSize(obj_info, offset)
-            return self.data[objref:objref+obj_count] # XXX: we return data as str
+            return self.data[objref:objref+obj_count].tobytes()
         elif obj_type == 0x50: #    string  0101 nnnn   [int]   ... // ASCII string, nnnn is # of chars, else 1111 then int count, then bytes
             obj_count, objref = self.__resolveIntSize(obj_info, offset)
-            return self.data[objref:objref+obj_count]
+            return self.data[objref:objref+obj_count].tobytes() # XXX: we return ASCII strings as bytes
         elif obj_type == 0x60: #    string  0110 nnnn   [int]   ... // Unicode string, nnnn is # of chars, else 1111 then int count, then big-endian 2-byte uint16_t
             obj_count, objref = self.__resolveIntSize(obj_info, offset)
-            return self.data[objref:objref+obj_count*2].decode('utf-16be')
+            return str(self.data[objref:objref+obj_count*2], 'utf-16be')
         elif obj_type == 0x80: #    uid     1000 nnnn   ...     // nnnn+1 is # of bytes
             # FIXME: Accept as a string for now
-            obj_count, objref = self.__resolveIntSize(obj_info, offset)
-            return self.data[objref:objref+obj_count]
+            return self.data[offset+1:offset+2+obj_info].tobytes()
         elif obj_type == 0xA0: #    array   1010 nnnn   [int]   objref* // nnnn is count, unless '1111', then int count follows
             obj_count, objref = self.__resolveIntSize(obj_info, offset)
-            arr = []
-            for i in range(obj_count):
-                arr.append(self.__unpackIntStruct(self.object_ref_size, self.data[objref+i*self.object_ref_size:objref+i*self.object_ref_size+self.object_ref_size]))
-            return arr
+            return BPListArray(self, obj_count, objref)
         elif obj_type == 0xC0: #   set      1100 nnnn   [int]   objref* // nnnn is count, unless '1111', then int count follows
             # XXX: not serializable via apple implementation
             raise Exception("0xC0 Not Implemented") # FIXME: implement
         elif obj_type == 0xD0: #   dict     1101 nnnn   [int]   keyref* objref* // nnnn is count, unless '1111', then int count follows
             obj_count, objref = self.__resolveIntSize(obj_info, offset)
-            keys = []
-            for i in range(obj_count):
-                keys.append(self.__unpackIntStruct(self.object_ref_size, self.data[objref+i*self.object_ref_size:objref+i*self.object_ref_size+self.object_ref_size]))
-            values = []
-            objref += obj_count*self.object_ref_size
-            for i in range(obj_count):
-                values.append(self.__unpackIntStruct(self.object_ref_size, self.data[objref+i*self.object_ref_size:objref+i*self.object_ref_size+self.object_ref_size]))
-            dic = {}
-            for i in range(obj_count):
-                dic[keys[i]] = values[i]
-            return dic
+            return BPListDict(self, obj_count, objref)
         else:
             raise Exception('don\'t know how to unpack obj type '+hex(obj_type)+' at '+str(offset))
 
@@ -203,68 +416,52 @@ class BPListReader(object):
         try:
             return self.resolved[idx]
         except KeyError:
-            obj = self.objects[idx]
-            if type(obj) == list:
-                newArr = []
-                for i in obj:
-                    newArr.append(self.__resolveObject(i))
-                self.resolved[idx] = newArr
-                return newArr
-            if type(obj) == dict:
-                newDic = {}
-                for k,v in obj.items():
-                    key_resolved = self.__resolveObject(k)
-                    if isinstance(key_resolved, str):
-                        rk = key_resolved
-                    else:
-                        rk = codecs.decode(key_resolved, "utf-8")
-                    rv = self.__resolveObject(v)
-                    newDic[rk] = rv
-                self.resolved[idx] = newDic
-                return newDic
-            else:
-                self.resolved[idx] = obj
-                return obj
+            if not 0 <= idx < self.number_of_objects:
+                raise Exception('object index '+str(idx)+' out of range')
+            obj = self.__unpackItem(self.__unpackIntStruct(self.offset_size, self.table_offset + idx*self.offset_size))
+            self.resolved[idx] = obj
+            return obj
 
-    def parse(self):
+    def _resolveRef(self, objref, i):
+        '''_resolveRef(objref, i)
+
+        Resolves the i-th object reference of a container starting at objref
+        '''
+        return self.__resolveObject(self.__unpackIntStruct(self.object_ref_size, objref + i*self.object_ref_size))
+
+    def parse(self, lazy=False):
+        '''parse(lazy=False)
+
+        Returns the root object, with lazy set dicts and arrays are left as BPListDict and BPListArray proxies
+        '''
         # read header
         if self.data[:8] != b'bplist00':
             raise Exception('Bad magic')
 
-        # read trailer
-        self.offset_size, self.object_ref_size, self.number_of_objects, self.top_object, self.table_offset = struct.unpack('!6xBB4xI4xI4xI', self.data[-32:])
+        # read trailer, offsets and objects are read on demand
+        self.offset_size, self.object_ref_size, self.number_of_objects, self.top_object, self.table_offset = struct.unpack_from('!6xBBQQQ', self.data, len(self.data) - 32)
         #print "** plist offset_size:",self.offset_size,"objref_size:",self.object_ref_size,"num_objs:",self.number_of_objects,"top:",self.top_object,"table_ofs:",self.table_offset
 
-        # read offset table
-        self.offset_table = self.data[self.table_offset:-32]
-        self.offsets = []
-        ot = self.offset_table
-        for i in range(self.number_of_objects):
-            offset_entry = ot[:self.offset_size]
-            ot = ot[self.offset_size:]
-            self.offsets.append(self.__unpackIntStruct(self.offset_size, offset_entry))
-        #print "** plist offsets:",self.offsets
-
-        # read object table
-        self.objects = []
-        k = 0
-        for i in self.offsets:
-            obj = self.__unpackItem(i)
-            #print "** plist unpacked",k,type(obj),obj,"at",i
-            k += 1
-            self.objects.append(obj)
-
-        # rebuild object tree
-        #for i in range(len(self.objects)):
-        #    self.__resolveObject(i)
-
         # return root object
-        return self.__resolveObject(self.top_object)
+        root = self.__resolveObject(self.top_object)
+        return root if lazy else _resolveProxy(root)
 
     @classmethod
-    def plistWithString(cls, s):
+    def plistWithString(cls, s, lazy=False):
         parser = cls(s)
-        return parser.parse()
+        return parser.parse(lazy)
+
+    @classmethod
+    def plistWithFile(cls, path, lazy=False):
+        '''plistWithFile(path, lazy=False)
+
+        Parses a bplist file over a read-only mmap, with lazy set only pages holding accessed objects are read
+        '''
+        with open(path, 'rb') as fp:
+            if os.fstat(fp.fileno()).st_size == 0:
+                raise Exception('Bad magic')
+            data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(data).parse(lazy)
 
 # helpers for testing
 def plist(obj):
@@ -283,10 +480,7 @@ if __name__ == "__main__":
     import json
     file_path = sys.argv[1]
 
-    with open(file_path, "rb") as fp:
-        data = fp.read()
-
-    out = BPListReader(data).parse()
+    out = BPListReader.plistWithFile(file_path)
 
     with open(file_path + ".json", "w") as fp:
-        json.dump(out, indent=4)
\ No newline at end of file
+        json.dump(out, fp, indent=4, default=repr)
\ No newline at end of file
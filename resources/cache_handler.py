@@ -0,0 +1,926 @@
+# Content-addressed cache for large downloads (KDKs, macOS installers, PatcherSupportPkg)
+# Files are stored by their SHA-256 digest, with an index mapping 'URL + validator' to digests
+# Additionally provides a small conditional-request cache for metadata APIs (KDK list, SUCatalog, etc.)
+# and a record of chunklist verification results for downloaded files that haven't changed
+# and an index of parsed installer catalogs, for incremental refreshes
+
+import os
+import enum
+import time
+import stat
+import fcntl
+import shutil
+import hashlib
+import logging
+import plistlib
+import platform
+import subprocess
+from pathlib import Path
+
+from resources import global_settings
+
+
+CACHE_ROOT:           str = "/Users/Shared/.com.dortania.opencore-legacy-patcher.cache"
+DOWNLOAD_CACHE_PATH:  str = f"{CACHE_ROOT}/Downloads"
+HTTP_CACHE_PATH:      str = f"{CACHE_ROOT}/HTTP"
+VERIFICATION_PATH:    str = f"{CACHE_ROOT}/Verification"
+CATALOG_INDEX_PATH:   str = f"{CACHE_ROOT}/Catalogs"
+DEFAULT_CACHE_BUDGET: int = 1000 * 1000 * 1000 * 30  # 30GB, roughly two installers and a handful of KDKs
+
+HASH_CHUNK_SIZE: int = 1024 * 1024 * 4
+
+
+def is_trusted(path: Path) -> bool:
+    """
+    Check a cached file or directory could only have been written by root or the current user
+
+    The cache lives in the world-writable /Users/Shared and feeds root patching inputs (KDKs, manifests),
+    so the path and each of its parents up to CACHE_ROOT must be owned by root or the current user,
+    not be symlinks, and not be writable by group or others
+    Paths outside of CACHE_ROOT (ie. manifests shipped in the application bundle) are left to the caller
+
+    Parameters:
+        path (Path): File or directory to check
+
+    Returns:
+        bool: True if trusted, False if not or missing
+    """
+
+    path = Path(path)
+    cache_root = Path(CACHE_ROOT)
+    if path != cache_root and cache_root not in path.parents:
+        return True
+
+    chain = [path] + [parent for parent in path.parents if parent == cache_root or cache_root in parent.parents]
+    for entry in chain:
+        try:
+            entry_stat = entry.lstat()
+        except OSError:
+            return False
+        if stat.S_ISLNK(entry_stat.st_mode):
+            return False
+        if entry_stat.st_uid not in [0, os.geteuid()]:
+            return False
+        if entry_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            return False
+    return True
+
+
+def ensure_directory(path: Path) -> bool:
+    """
+    Create a cache directory, owned by the current user (root when elevated) and only writable by it
+
+    Directories created by this process are stripped of group and other write permissions,
+    directories created by anyone else must already pass is_trusted()
+
+    Parameters:
+        path (Path): Directory to create
+
+    Returns:
+        bool: True if the directory exists and is trusted
+    """
+
+    path = Path(path)
+    try:
+        path.mkdir(mode=0o755, parents=True, exist_ok=True)
+    except OSError:
+        return False
+
+    cache_root = Path(CACHE_ROOT)
+    for entry in [path] + [parent for parent in path.parents if parent == cache_root or cache_root in parent.parents]:
+        try:
+            entry_stat = entry.lstat()
+            if stat.S_ISDIR(entry_stat.st_mode) and entry_stat.st_uid == os.geteuid() and entry_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                entry.chmod(stat.S_IMODE(entry_stat.st_mode) & ~(stat.S_IWGRP | stat.S_IWOTH))
+        except OSError:
+            return False
+
+    if not is_trusted(path):
+        logging.warning(f"{path} is writable by other users, not using it as a cache")
+        return False
+    return True
+
+
+def create_file(path: Path):
+    """
+    Create (or truncate) a cache file, only writable by the current user regardless of umask
+    Files writable by other users are not trusted, see is_trusted()
+
+    Parameters:
+        path (Path): File to create
+
+    Returns:
+        file: File object opened for binary writing
+    """
+
+    file_descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.fchmod(file_descriptor, 0o644)
+    return os.fdopen(file_descriptor, "wb")
+
+
+class DownloadCache:
+    """
+    Library for storing and retrieving downloaded files from a shared local cache
+
+    Entries are looked up either by 'URL + ETag' (or Last-Modified), or directly by digest.
+    Objects are named by their SHA-256, or '<algorithm>-<digest>' when stored under another digest
+    the download already computed (ie. a chunklist fingerprint), so the file isn't read again just to be cached.
+    Once the cache grows past its byte budget, least recently used entries are evicted.
+
+    Objects are read-only, and files are always copied in and out (as APFS clones where possible),
+    so modifying a restored file can't corrupt the cache. Objects whose stat information changed
+    since they were stored are rehashed before being served, and the cache is only used if no other
+    user could have written to it (see is_trusted())
+    The budget can be set through the 'Download_Cache_Budget' global setting (0 disables the cache)
+
+    Usage:
+        >>> cache = DownloadCache()
+        >>> if cache.restore(url, etag, destination):
+        >>>     print("Served from cache")
+
+        >>> cache.store(downloaded_file, url, etag)
+    """
+
+    def __init__(self, cache_path: str = DOWNLOAD_CACHE_PATH, budget: int = None) -> None:
+        self.cache_path:   Path = Path(cache_path)
+        self.objects_path: Path = self.cache_path / "Objects"
+        self.index_path:   Path = self.cache_path / "Index.plist"
+        self.lock_path:    Path = self.cache_path / ".lock"
+
+        self.budget: int = budget if budget is not None else self._read_budget()
+
+
+    def _read_budget(self) -> int:
+        """
+        Read cache budget from global settings
+
+        Returns:
+            int: Budget in bytes
+        """
+
+        budget = global_settings.GlobalEnviromentSettings().read_property("Download_Cache_Budget")
+        if budget is None:
+            return DEFAULT_CACHE_BUDGET
+        try:
+            return int(budget)
+        except (TypeError, ValueError):
+            logging.warning(f"Invalid Download_Cache_Budget ({budget}), using default")
+            return DEFAULT_CACHE_BUDGET
+
+
+    def is_enabled(self) -> bool:
+        """
+        Query whether the cache can be used
+
+        Returns:
+            bool: True if the cache is enabled and writable
+        """
+
+        if self.budget <= 0:
+            return False
+
+        if not ensure_directory(self.objects_path):
+            return False
+
+        return os.access(self.cache_path, os.W_OK)
+
+
+    def _key(self, url: str, validator: str) -> str:
+        return f"{url}|{validator}"
+
+
+    def _load_index(self) -> dict:
+        """
+        Load cache index, caller must hold the lock
+        """
+
+        index = {"Objects": {}, "Keys": {}}
+        if not self.index_path.exists():
+            return index
+        if not is_trusted(self.index_path):
+            logging.warning("Download cache index is writable by other users, starting fresh")
+            return index
+        try:
+            index.update(plistlib.load(self.index_path.open("rb")))
+        except Exception as e:
+            logging.warning(f"Download cache index unreadable, starting fresh: {e}")
+        return index
+
+
+    def _save_index(self, index: dict) -> None:
+        """
+        Save cache index, caller must hold the lock
+        """
+
+        temp_path = self.index_path.with_suffix(".tmp")
+        with create_file(temp_path) as file:
+            plistlib.dump(index, file)
+        temp_path.replace(self.index_path)
+
+
+    def _locked(self):
+        """
+        Acquire an exclusive lock on the cache, shared between processes
+        (ie. GUI and auto-patcher daemon)
+        """
+
+        lock_file = self.lock_path.open("a")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+
+    def lookup(self, url: str, validator: str = None) -> Path or None:
+        """
+        Find a cached file by URL and validator (ETag or Last-Modified)
+
+        Parameters:
+            url       (str): Source URL
+            validator (str): ETag or Last-Modified reported by the server
+                             If None, the most recently stored entry for the URL is used (ie. offline)
+
+        Returns:
+            Path: Path to cached object, None if not cached
+        """
+
+        if not self.is_enabled():
+            return None
+
+        with self._locked():
+            index = self._load_index()
+
+        if validator is None:
+            candidates = [
+                (index["Objects"][digest]["Last Used"], digest)
+                for key, digest in index["Keys"].items()
+                if key.rsplit("|", 1)[0] == url and digest in index["Objects"]
+            ]
+            if not candidates:
+                return None
+            digest = max(candidates)[1]
+        else:
+            if not validator:
+                return None
+            digest = index["Keys"].get(self._key(url, validator))
+
+        if digest is None:
+            return None
+        return self.lookup_digest(digest, None)
+
+
+    def lookup_digest(self, digest: str, algorithm: str = "sha256") -> Path or None:
+        """
+        Find a cached file by digest
+
+        Parameters:
+            digest    (str): Hex encoded digest, or object name if algorithm is None
+            algorithm (str): Algorithm the digest was computed with, see object_name()
+
+        Returns:
+            Path: Path to cached object, None if not cached
+        """
+
+        if not self.is_enabled():
+            return None
+
+        name = self.object_name(digest, algorithm) if algorithm else digest
+        object_path = self.objects_path / name
+        if not object_path.exists():
+            return None
+        if not is_trusted(object_path):
+            logging.warning(f"Cached object {name} is writable by other users, ignoring")
+            return None
+
+        with self._locked():
+            index = self._load_index()
+            if name not in index["Objects"]:
+                return None
+            if not self._object_intact(object_path, name, index["Objects"][name]):
+                logging.warning(f"Cached object {name} was modified, removing")
+                self._remove_object(index, name)
+                self._save_index(index)
+                return None
+            index["Objects"][name]["Last Used"] = time.time()
+            self._save_index(index)
+
+        return object_path
+
+
+    def object_name(self, digest: str, algorithm: str = "sha256") -> str:
+        """
+        Name of the object storing a file with the given digest
+        """
+
+        if algorithm == "sha256":
+            return digest.lower()
+        return f"{algorithm}-{digest.lower()}"
+
+
+    def restore(self, url: str, validator: str, destination: Path, digest: str = None, algorithm: str = "sha256", checksum = None) -> str or None:
+        """
+        Place a cached copy of the file at the destination
+
+        Parameters:
+            url         (str):  Source URL
+            validator   (str):  ETag or Last-Modified reported by the server, None if offline
+            destination (Path): Where the file should be placed
+            digest      (str):  Expected digest, if known
+            algorithm   (str):  Algorithm of the expected digest
+            checksum    (hashlib object): Updated with the contents while copying, so the copy itself can be verified
+                                          Files are copied instead of cloned when provided
+
+        Returns:
+            str: Name of the object restored (see object_name()), None if not cached
+        """
+
+        object_path = self.lookup_digest(digest, algorithm) if digest else None
+        if object_path is None:
+            object_path = self.lookup(url, validator)
+        if object_path is None:
+            return None
+
+        logging.info(f"Found {Path(url).name} in download cache")
+        try:
+            if checksum is not None:
+                self._copy_hashing(object_path, Path(destination), checksum)
+            else:
+                self._clone_or_copy(object_path, Path(destination))
+            Path(destination).chmod(0o644)
+        except OSError as e:
+            logging.warning(f"Failed to restore {Path(url).name} from download cache: {e}")
+            return None
+        return object_path.name
+
+
+    def store(self, file_path: Path, url: str, validator: str = None, digest: str = None, algorithm: str = "sha256") -> str or None:
+        """
+        Add a downloaded file to the cache
+
+        Parameters:
+            file_path (Path): Path to the downloaded file
+            url       (str):  Source URL
+            validator (str):  ETag or Last-Modified reported by the server
+            digest    (str):  Digest of the file if already computed, otherwise its SHA-256 is calculated here
+            algorithm (str):  Algorithm 'digest' was computed with (hashlib name, or 'chunklist' for Chunklist.fingerprint())
+
+        Returns:
+            str: Name of the stored object, None if not stored
+        """
+
+        file_path = Path(file_path)
+        if not self.is_enabled() or not file_path.exists():
+            return None
+
+        size = file_path.stat().st_size
+        if size > self.budget:
+            logging.info(f"{file_path.name} is larger than the download cache budget, not caching")
+            return None
+
+        if digest is None:
+            digest = self._hash_file(file_path)
+            algorithm = "sha256"
+        digest = self.object_name(digest, algorithm)
+
+        object_path = self.objects_path / digest
+        try:
+            if not object_path.exists():
+                temp_path = object_path.with_name(f"{digest}.tmp")
+                self._clone_or_copy(file_path, temp_path)
+                temp_path.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                temp_path.replace(object_path)
+        except OSError as e:
+            logging.warning(f"Failed to add {file_path.name} to download cache: {e}")
+            return None
+
+        with self._locked():
+            index = self._load_index()
+            index["Objects"][digest] = {"Size": size, "Mtime": object_path.stat().st_mtime_ns, "Last Used": time.time()}
+            index["Keys"][self._key(url, validator or "")] = digest
+            self._evict(index)
+            self._save_index(index)
+
+        logging.info(f"Added {file_path.name} to download cache ({digest})")
+        return digest
+
+
+    def discard(self, name: str) -> None:
+        """
+        Remove an object found to be corrupted (ie. its restored copy didn't match the expected checksum)
+
+        Parameters:
+            name (str): Object name, as returned by restore()
+        """
+
+        with self._locked():
+            index = self._load_index()
+            self._remove_object(index, name)
+            self._save_index(index)
+
+
+    def _evict(self, index: dict) -> None:
+        """
+        Remove least recently used objects until the cache fits its budget
+        Caller must hold the lock
+        """
+
+        total_size = sum(entry["Size"] for entry in index["Objects"].values())
+        if total_size <= self.budget:
+            return
+
+        for digest, entry in sorted(index["Objects"].items(), key=lambda item: item[1]["Last Used"]):
+            if total_size <= self.budget:
+                break
+            logging.info(f"Evicting {digest} from download cache")
+            self._remove_object(index, digest)
+            total_size -= entry["Size"]
+
+
+    def _remove_object(self, index: dict, digest: str) -> None:
+        """
+        Remove an object and all keys pointing to it
+        Caller must hold the lock
+        """
+
+        index["Objects"].pop(digest, None)
+        index["Keys"] = {key: value for key, value in index["Keys"].items() if value != digest}
+        object_path = self.objects_path / digest
+        if object_path.exists():
+            object_path.unlink()
+
+
+    def _clone_or_copy(self, source: Path, destination: Path) -> None:
+        """
+        Copy source to destination, as an APFS clone (copy-on-write) when possible
+        Unlike hard links, the copies never share storage that can be modified in place
+        """
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        if destination.exists():
+            destination.unlink()
+        if platform.system() == "Darwin":
+            if subprocess.run(["cp", "-c", source, destination], stdout=subprocess.PIPE, stderr=subprocess.STDOUT).returncode == 0:
+                return
+        shutil.copyfile(source, destination)
+
+
+    def _copy_hashing(self, source: Path, destination: Path, checksum) -> None:
+        """
+        Copy source to destination, feeding the copied data into checksum
+        """
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        if destination.exists():
+            destination.unlink()
+        with source.open("rb") as source_file, destination.open("wb") as destination_file:
+            while chunk := source_file.read(HASH_CHUNK_SIZE):
+                checksum.update(chunk)
+                destination_file.write(chunk)
+
+
+    def _object_intact(self, object_path: Path, digest: str, entry: dict) -> bool:
+        """
+        Check an object still matches its digest
+        Only rehashed if its size or modification time changed since it was stored
+
+        Caller must hold the lock
+        """
+
+        object_stat = object_path.stat()
+        if object_stat.st_size != entry["Size"]:
+            return False
+        if object_stat.st_mtime_ns == entry.get("Mtime"):
+            return True
+
+        algorithm, _, expected = digest.rpartition("-")
+        algorithm = algorithm or "sha256"
+        if algorithm not in hashlib.algorithms_available:
+            # Can't be rehashed (ie. chunklist fingerprint)
+            return False
+        if self._hash_file(object_path, algorithm) != expected:
+            return False
+        entry["Mtime"] = object_stat.st_mtime_ns
+        return True
+
+
+    def _hash_file(self, file_path: Path, algorithm: str = "sha256") -> str:
+        """
+        Calculate the digest of a file
+        """
+
+        checksum = hashlib.new(algorithm)
+        with file_path.open("rb") as file:
+            while chunk := file.read(HASH_CHUNK_SIZE):
+                checksum.update(chunk)
+        return checksum.hexdigest()
+
+
+class HTTPMetadataCache:
+    """
+    Library for caching small HTTP responses (JSON/plist APIs) between launches
+
+    Responses are stored alongside their ETag and Last-Modified, allowing
+    the next request to be sent conditionally (If-None-Match/If-Modified-Since).
+    When the server replies 304 Not Modified, or cannot be reached, the stored body is used instead
+
+    Each URL is stored as '<SHA-256 of URL>.plist' (metadata) and '<SHA-256 of URL>.body'
+
+    Usage:
+        >>> cache = HTTPMetadataCache()
+        >>> entry = cache.load(url)
+        >>> headers = cache.conditional_headers(entry)
+
+        >>> cache.store(url, response.content, response.headers)
+    """
+
+    def __init__(self, cache_path: str = HTTP_CACHE_PATH) -> None:
+        self.cache_path: Path = Path(cache_path)
+
+
+    def _paths(self, url: str) -> tuple:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return (self.cache_path / f"{key}.plist", self.cache_path / f"{key}.body")
+
+
+    def load(self, url: str) -> dict or None:
+        """
+        Load a cached response
+
+        Parameters:
+            url (str): Request URL
+
+        Returns:
+            dict: Metadata with 'Content' holding the body, None if not cached
+        """
+
+        entry = self.load_metadata(url)
+        if entry is None:
+            return None
+
+        try:
+            content = self.body_path(url).read_bytes()
+        except OSError as e:
+            logging.warning(f"Unable to read cached response for {url}: {e}")
+            return None
+
+        if entry.get("Size") != len(content):
+            return None
+
+        entry["Content"] = content
+        return entry
+
+
+    def load_metadata(self, url: str) -> dict or None:
+        """
+        Load a cached response's metadata, without reading the body
+        Used for large responses that are streamed from body_path() instead
+
+        Parameters:
+            url (str): Request URL
+
+        Returns:
+            dict: Metadata, None if not cached
+        """
+
+        metadata_path, body_path = self._paths(url)
+        if not metadata_path.exists() or not body_path.exists():
+            return None
+        if not is_trusted(metadata_path) or not is_trusted(body_path):
+            logging.warning(f"Cached response for {url} is writable by other users, ignoring")
+            return None
+
+        try:
+            entry = plistlib.load(metadata_path.open("rb"))
+            size = body_path.stat().st_size
+        except Exception as e:
+            logging.warning(f"Unable to read cached response for {url}: {e}")
+            return None
+
+        if entry.get("URL") != url or entry.get("Size") != size:
+            return None
+
+        return entry
+
+
+    def body_path(self, url: str) -> Path:
+        """
+        Path the response body for a URL is stored at
+        """
+
+        return self._paths(url)[1]
+
+
+    def conditional_headers(self, entry: dict) -> dict:
+        """
+        Generate revalidation headers for a cached response
+
+        Parameters:
+            entry (dict): Entry returned by load()
+
+        Returns:
+            dict: If-None-Match and/or If-Modified-Since headers
+        """
+
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("ETag"):
+            headers["If-None-Match"] = entry["ETag"]
+        if entry.get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["Last-Modified"]
+        return headers
+
+
+    def store(self, url: str, content: bytes, headers: dict) -> None:
+        """
+        Cache a response
+
+        Parameters:
+            url     (str):   Request URL
+            content (bytes): Response body
+            headers (dict):  Response headers
+        """
+
+        body_path = self.body_path(url)
+        if not ensure_directory(self.cache_path):
+            return
+        try:
+            # Write to temporary files first, other processes may be reading
+            temp_body_path = body_path.with_suffix(".body.tmp")
+            with create_file(temp_body_path) as file:
+                file.write(content)
+        except OSError as e:
+            logging.warning(f"Unable to cache response for {url}: {e}")
+            return
+
+        self.store_file(url, temp_body_path, headers)
+
+
+    def store_file(self, url: str, file_path: Path, headers: dict) -> None:
+        """
+        Cache a response whose body was already written to disk (ie. while streaming)
+        The file is moved into the cache, so it should reside in the cache directory
+
+        Parameters:
+            url       (str):  Request URL
+            file_path (Path): Response body
+            headers   (dict): Response headers
+        """
+
+        metadata_path, body_path = self._paths(url)
+        if not ensure_directory(self.cache_path):
+            return
+        try:
+            entry = {
+                "URL":           url,
+                "ETag":          headers.get("ETag", ""),
+                "Last-Modified": headers.get("Last-Modified", ""),
+                "Content-Type":  headers.get("Content-Type", ""),
+                "Size":          Path(file_path).stat().st_size,
+                "Date Fetched":  time.time(),
+            }
+            Path(file_path).replace(body_path)
+            temp_metadata_path = metadata_path.with_suffix(".plist.tmp")
+            with create_file(temp_metadata_path) as file:
+                plistlib.dump(entry, file)
+            temp_metadata_path.replace(metadata_path)
+        except OSError as e:
+            logging.warning(f"Unable to cache response for {url}: {e}")
+
+
+class VerificationStatus(enum.Enum):
+    """
+    Enum for recorded verification status
+    """
+
+    IN_PROGRESS: str = "In Progress"
+    SUCCESS:     str = "Success"
+
+
+class VerificationCache:
+    """
+    Library for recording verification results and progress of files
+
+    Entries are keyed by the file's identity (device, inode, size and modification time)
+    and the verification method (ie. the chunklist's digest), so any change
+    to the file or the expected contents invalidates the entry.
+    Failures are never recorded, the file is simply verified again
+
+    Usage:
+        >>> cache = VerificationCache()
+        >>> if cache.is_verified(file_path, method):
+        >>>     print("Already verified")
+
+        >>> cache.store(file_path, method, VerificationStatus.IN_PROGRESS, progress=1000)
+        >>> cache.store(file_path, method, VerificationStatus.SUCCESS)
+    """
+
+    def __init__(self, cache_path: str = VERIFICATION_PATH) -> None:
+        self.cache_path: Path = Path(cache_path)
+
+
+    def file_identity(self, file_path: Path) -> str or None:
+        """
+        Generate the identity of a file
+
+        Parameters:
+            file_path (Path): File to identify
+
+        Returns:
+            str: Identity, None if the file doesn't exist
+        """
+
+        try:
+            stat = Path(file_path).stat()
+        except OSError:
+            return None
+        return f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+    def _entry_path(self, identity: str, method: str) -> Path:
+        return self.cache_path / f"{hashlib.sha256(f'{identity}|{method}'.encode()).hexdigest()}.plist"
+
+
+    def load(self, file_path: Path, method: str, identity: str = None) -> dict or None:
+        """
+        Load the recorded verification state of a file
+
+        Parameters:
+            file_path (Path): Verified file
+            method    (str):  Verification method
+            identity  (str):  Identity of the file, if already generated
+
+        Returns:
+            dict: Entry with 'Status' (VerificationStatus) and 'Progress', None if not recorded
+        """
+
+        identity = identity or self.file_identity(file_path)
+        if identity is None:
+            return None
+
+        entry_path = self._entry_path(identity, method)
+        if not entry_path.exists() or not is_trusted(entry_path):
+            return None
+
+        try:
+            entry = plistlib.load(entry_path.open("rb"))
+            entry["Status"] = VerificationStatus(entry["Status"])
+        except Exception:
+            return None
+
+        if entry.get("Identity") != identity or entry.get("Method") != method:
+            return None
+        return entry
+
+
+    def is_verified(self, file_path: Path, method: str) -> bool:
+        """
+        Query whether a file was successfully verified and hasn't changed since
+
+        Parameters:
+            file_path (Path): Verified file
+            method    (str):  Verification method
+
+        Returns:
+            bool: True if previously verified
+        """
+
+        entry = self.load(file_path, method)
+        return entry is not None and entry["Status"] == VerificationStatus.SUCCESS
+
+
+    def store(self, file_path: Path, method: str, status: VerificationStatus, progress: int = 0, identity: str = None) -> None:
+        """
+        Record the verification state of a file
+
+        Parameters:
+            file_path (Path):               Verified file
+            method    (str):                Verification method
+            status    (VerificationStatus): Verification status
+            progress  (int):                Method specific progress (ie. chunks verified)
+            identity  (str):                Identity of the file when verification started
+        """
+
+        identity = identity or self.file_identity(file_path)
+        if identity is None:
+            return
+
+        entry = {
+            "Path":     str(file_path),
+            "Identity": identity,
+            "Method":   method,
+            "Status":   status.value,
+            "Progress": progress,
+        }
+
+        entry_path = self._entry_path(identity, method)
+        if not ensure_directory(self.cache_path):
+            return
+        try:
+            temp_path = entry_path.with_suffix(".tmp")
+            with create_file(temp_path) as file:
+                plistlib.dump(entry, file)
+            temp_path.replace(entry_path)
+        except OSError as e:
+            logging.warning(f"Unable to record verification state of {file_path}: {e}")
+
+
+    def remove(self, file_path: Path, method: str, identity: str = None) -> None:
+        """
+        Remove any recorded verification state of a file
+
+        Parameters:
+            file_path (Path): Verified file
+            method    (str):  Verification method
+            identity  (str):  Identity of the file when verification started
+        """
+
+        identity = identity or self.file_identity(file_path)
+        if identity is None:
+            return
+
+        entry_path = self._entry_path(identity, method)
+        if entry_path.exists():
+            entry_path.unlink()
+
+
+class InstallerCatalogIndex:
+    """
+    Library for persisting parsed installer catalogs (see macos_installer_handler.RemoteInstallerCatalog)
+
+    Products are keyed by product ID and PostDate, so refreshing a catalog only needs to fetch
+    Info.plists for products that are new or were reposted, and the last index can be served while offline.
+    Products that aren't listed (ie. Apple Silicon only installers) are recorded too, with an empty 'Installer'
+
+    Each catalog URL is stored as '<SHA-256 of URL>.plist'
+
+    Usage:
+        >>> index = InstallerCatalogIndex()
+        >>> products = index.load(catalog_url)
+        >>> products["012-34567"] = {"PostDate": post_date, "Installer": installer}
+        >>> index.store(catalog_url, products)
+    """
+
+    INDEX_VERSION: int = 1  # Bump when the 'Installer' entries change format
+
+
+    def __init__(self, cache_path: str = CATALOG_INDEX_PATH) -> None:
+        self.cache_path: Path = Path(cache_path)
+
+
+    def _path(self, catalog_url: str) -> Path:
+        return self.cache_path / f"{hashlib.sha256(catalog_url.encode()).hexdigest()}.plist"
+
+
+    def load(self, catalog_url: str) -> dict:
+        """
+        Load the index of a catalog
+
+        Parameters:
+            catalog_url (str): Catalog URL
+
+        Returns:
+            dict: Product ID -> {'PostDate': datetime, 'Installer': dict}, in catalog order. Empty if not indexed
+        """
+
+        path = self._path(catalog_url)
+        if not path.exists() or not is_trusted(path):
+            return {}
+
+        try:
+            index = plistlib.load(path.open("rb"))
+        except Exception as e:
+            logging.warning(f"Unable to read catalog index for {catalog_url}: {e}")
+            return {}
+
+        if index.get("Version") != self.INDEX_VERSION or index.get("URL") != catalog_url:
+            return {}
+
+        return {product["Product"]: {"PostDate": product["PostDate"], "Installer": product["Installer"]} for product in index["Products"]}
+
+
+    def store(self, catalog_url: str, products: dict) -> None:
+        """
+        Save the index of a catalog, replacing the previous index
+
+        Parameters:
+            catalog_url (str):  Catalog URL
+            products    (dict): Product ID -> {'PostDate': datetime, 'Installer': dict}, in catalog order
+        """
+
+        index = {
+            "Version":      self.INDEX_VERSION,
+            "URL":          catalog_url,
+            "Date Indexed": time.time(),
+            # Stored as a list, as plist dictionaries don't preserve order
+            "Products":     [{"Product": product, **entry} for product, entry in products.items()],
+        }
+
+        path = self._path(catalog_url)
+        if not ensure_directory(self.cache_path):
+            return
+        try:
+            temp_path = path.with_suffix(".plist.tmp")
+            with create_file(temp_path) as file:
+                plistlib.dump(index, file)
+            temp_path.replace(path)
+        except (OSError, TypeError, OverflowError) as e:
+            logging.warning(f"Unable to save catalog index for {catalog_url}: {e}")
@@ -258,6 +258,11 @@ class Constants:
     def payload_local_binaries_root_path_dmg(self):
         return self.original_path / Path("Universal-Binaries.dmg")
 
+    @property
+    def payload_local_binaries_root_path_manifest(self):
+        # Generated by Build-Binary.command, read-only at runtime
+        return self.original_path / Path("Universal-Binaries.dmg.manifest.plist")
+
 
     # OpenCore
     @property
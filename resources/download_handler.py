@@ -0,0 +1,263 @@
+# Scheduler for running multiple DownloadObjects concurrently
+# Coordinates downloads with per-host concurrency limits, priorities and cancellation,
+# avoiding background prefetches from competing with downloads the user is waiting on
+
+import time
+import enum
+import asyncio
+import logging
+import threading
+import itertools
+import concurrent.futures
+
+from urllib.parse import urlparse
+
+from resources import network_handler
+
+
+MAX_DOWNLOADS_PER_HOST: int = 2
+MAX_DOWNLOADS_TOTAL:    int = 4
+
+
+class DownloadPriority(enum.IntEnum):
+    """
+    Enum for download priorities, lower values are scheduled first
+    """
+
+    FOREGROUND: int = 0  # Required for the current operation (ie. KDK for root patching)
+    NORMAL:     int = 1
+    BACKGROUND: int = 2  # Prefetching (ie. caching installers)
+
+
+    def bandwidth_class(self) -> network_handler.BandwidthClass:
+        """
+        Get the bandwidth class downloads of this priority are rate limited under
+        """
+
+        if self == DownloadPriority.BACKGROUND:
+            return network_handler.BandwidthClass.BACKGROUND
+        return network_handler.BandwidthClass.FOREGROUND
+
+
+class DownloadJobStatus(enum.Enum):
+    """
+    Enum for download job status
+    """
+
+    PENDING:   str = "Pending"
+    RUNNING:   str = "Running"
+    CANCELLED: str = "Cancelled"
+    FINISHED:  str = "Finished"
+
+
+class DownloadJob:
+    """
+    Handle for a DownloadObject queued in a DownloadManager
+    """
+
+    def __init__(self, download_obj: network_handler.DownloadObject, priority: DownloadPriority, sequence: int) -> None:
+        self.download_obj: network_handler.DownloadObject = download_obj
+        self.priority:     DownloadPriority = priority
+        self.sequence:     int = sequence
+        self.host:         str = urlparse(download_obj.url).netloc
+        self.status:       DownloadJobStatus = DownloadJobStatus.PENDING
+
+        self._finished: threading.Event = threading.Event()
+
+
+    def sort_key(self) -> tuple:
+        return (self.priority, self.sequence)
+
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until the job has finished or was cancelled
+
+        Parameters:
+            timeout (float): Seconds to wait, None for no limit
+
+        Returns:
+            bool: True if the download completed successfully
+        """
+
+        self._finished.wait(timeout)
+        return self.download_obj.download_complete
+
+
+class DownloadManager:
+    """
+    Schedules DownloadObjects on an asyncio event loop running in a background thread
+
+    Each DownloadObject still performs its own transfer, the manager decides when it may start:
+    - Higher priority jobs start first, ties are broken by submission order
+    - No more than 'max_per_host' jobs run against a single host at once
+    - No more than 'max_total' jobs run at once
+
+    Usage:
+        >>> manager = DownloadManager()
+        >>> kdk_job = manager.enqueue(kdk_download_obj, DownloadPriority.FOREGROUND)
+        >>> manager.enqueue(installer_download_obj, DownloadPriority.BACKGROUND)
+
+        >>> if kdk_job.wait():
+        >>>     print("KDK downloaded")
+
+        >>> manager.shutdown()
+    """
+
+    def __init__(self, max_per_host: int = MAX_DOWNLOADS_PER_HOST, max_total: int = MAX_DOWNLOADS_TOTAL) -> None:
+        self.max_per_host: int = max_per_host
+        self.max_total:    int = max_total
+
+        self._pending: list = []
+        self._running: list = []
+        self._tasks:   set  = set()
+        self._counter = itertools.count()
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_total, thread_name_prefix="DownloadManager")
+        self._loop     = asyncio.new_event_loop()
+        self._thread   = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+
+    def enqueue(self, download_obj: network_handler.DownloadObject, priority: DownloadPriority = DownloadPriority.NORMAL) -> DownloadJob:
+        """
+        Queue a download
+
+        Parameters:
+            download_obj (DownloadObject):   Download to schedule, must not have been started yet
+            priority     (DownloadPriority): Scheduling priority
+
+        Returns:
+            DownloadJob: Handle for waiting on or cancelling the download
+        """
+
+        job = DownloadJob(download_obj, priority, next(self._counter))
+        download_obj.bandwidth_class = priority.bandwidth_class()
+        logging.info(f"Queueing download: {download_obj.filename} ({priority.name})")
+        self._loop.call_soon_threadsafe(self._add_job, job)
+        return job
+
+
+    def cancel(self, job: DownloadJob) -> None:
+        """
+        Cancel a queued or running download
+
+        Parameters:
+            job (DownloadJob): Job to cancel
+        """
+
+        self._loop.call_soon_threadsafe(self._cancel_job, job)
+
+
+    def wait_all(self, timeout: float = None) -> bool:
+        """
+        Block until all queued downloads have finished
+
+        Parameters:
+            timeout (float): Seconds to wait, None for no limit
+
+        Returns:
+            bool: True if all downloads completed successfully
+        """
+
+        future = asyncio.run_coroutine_threadsafe(self._snapshot(), self._loop)
+        jobs = future.result()
+
+        # Single deadline shared by all jobs
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results = []
+        for job in jobs:
+            results.append(job.wait(None if deadline is None else max(0, deadline - time.monotonic())))
+        return all(results)
+
+
+    def shutdown(self) -> None:
+        """
+        Cancel all downloads, wait for them to stop and close the event loop
+        """
+
+        if self._loop.is_closed():
+            return
+
+        asyncio.run_coroutine_threadsafe(self._cancel_all(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        # Transfers notice 'should_stop' between chunks
+        self._executor.shutdown(wait=True)
+
+
+    async def _snapshot(self) -> list:
+        return self._pending + self._running
+
+
+    async def _cancel_all(self) -> None:
+        for job in self._pending + self._running:
+            self._cancel_job(job)
+
+        # Tasks aren't cancelled, they finish once their transfer notices 'should_stop'
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+    def _add_job(self, job: DownloadJob) -> None:
+        self._pending.append(job)
+        self._pending.sort(key=DownloadJob.sort_key)
+        self._schedule()
+
+
+    def _cancel_job(self, job: DownloadJob) -> None:
+        if job in self._pending:
+            self._pending.remove(job)
+            job.status = DownloadJobStatus.CANCELLED
+            job._finished.set()
+            logging.info(f"Cancelled queued download: {job.download_obj.filename}")
+        elif job in self._running:
+            # DownloadObject will raise once it notices, '_run_job' handles cleanup
+            job.status = DownloadJobStatus.CANCELLED
+            job.download_obj.should_stop = True
+            logging.info(f"Cancelling active download: {job.download_obj.filename}")
+
+
+    def _can_start(self, job: DownloadJob) -> bool:
+        if len(self._running) >= self.max_total:
+            return False
+        if len([running for running in self._running if running.host == job.host]) >= self.max_per_host:
+            return False
+        return True
+
+
+    def _schedule(self) -> None:
+        """
+        Start as many pending jobs as limits allow, in priority order
+        """
+
+        for job in list(self._pending):
+            if not self._can_start(job):
+                continue
+            self._pending.remove(job)
+            self._running.append(job)
+            job.status = DownloadJobStatus.RUNNING
+            task = self._loop.create_task(self._run_job(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+
+    async def _run_job(self, job: DownloadJob) -> None:
+        future = self._loop.run_in_executor(self._executor, lambda: job.download_obj.download(spawn_thread=False))
+        try:
+            # The job only finishes once download() has returned, as the file may still be written to until then
+            while not future.done():
+                try:
+                    await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    job.status = DownloadJobStatus.CANCELLED
+                    job.download_obj.should_stop = True
+            future.result()
+        except Exception as e:
+            logging.error(f"Download job failed: {job.download_obj.filename}: {e}")
+        finally:
+            self._running.remove(job)
+            if job.status != DownloadJobStatus.CANCELLED:
+                job.status = DownloadJobStatus.FINISHED
+            job._finished.set()
+            self._schedule()
@@ -3,17 +3,32 @@
 # - https://gist.github.com/dhinakg/cbe30edf31ddc153fd0b0c0570c9b041
 # Copyright (C) 2021-2023, Dhinak G, Mykola Grymalyuk
 
+import os
+import mmap
 import enum
+import time
+import array
+import bisect
+import struct
 import hashlib
 import logging
 import binascii
+import itertools
 import threading
+import collections
+import concurrent.futures
 
 from typing import Union
 from pathlib import Path
 
+from resources import cache_handler
+
 CHUNK_LENGTH = 4 + 32
 
+HASH_THREADS: int = min(8, os.cpu_count() or 1)  # hashlib releases the GIL, allowing chunks to be hashed in parallel
+
+CHECKPOINT_INTERVAL: int = 5  # Seconds between saving verification progress
+
 
 class ChunklistStatus(enum.Enum):
     """
@@ -24,15 +39,107 @@ class ChunklistStatus(enum.Enum):
     FAILURE     = 2
 
 
+class Chunklist:
+    """
+    Compact, array backed representation of a chunklist's chunks
+
+    Large installers have tens of thousands of chunks, so rather than an object per chunk
+    the table is stored as:
+    - lengths: array('I') of chunk lengths
+    - digests: single buffer of SHA-256 digests, 32 bytes per chunk
+    - offsets: array('Q') of each chunk's file offset, plus the total size (len + 1 entries)
+
+    Parameters:
+        lengths (array.array): Chunk lengths
+        digests (bytes):       Concatenated chunk digests
+    """
+
+    DIGEST_LENGTH: int = 32
+
+    def __init__(self, lengths: array.array, digests: bytes) -> None:
+        self.lengths: array.array = lengths
+        self.digests: bytes       = digests
+        self.offsets: array.array = array.array("Q", itertools.accumulate(lengths, initial=0))
+
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Chunklist":
+        """
+        Parse packed chunk records (4 byte little endian length, 32 byte SHA-256)
+
+        Parameters:
+            data (bytes): Chunk records, as stored in the chunklist file
+
+        Returns:
+            Chunklist: Parsed chunks
+        """
+
+        data = data[:len(data) - len(data) % CHUNK_LENGTH]
+        lengths = array.array("I", [length for (length,) in struct.iter_unpack("<I32x", data)])
+        digests = b"".join([digest for (digest,) in struct.iter_unpack("<4x32s", data)])
+        return cls(lengths, digests)
+
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+
+    def length(self, index: int) -> int:
+        return self.lengths[index]
+
+
+    def digest(self, index: int) -> bytes:
+        return self.digests[index * self.DIGEST_LENGTH:(index + 1) * self.DIGEST_LENGTH]
+
+
+    def offset(self, index: int) -> int:
+        return self.offsets[index]
+
+
+    def fingerprint(self) -> str:
+        """
+        SHA-256 of the chunk table, identifying the expected file contents
+        """
+
+        return hashlib.sha256(self.lengths.tobytes() + self.digests).hexdigest()
+
+
+    def total_size(self) -> int:
+        """
+        Size of the file described by the chunklist
+        """
+
+        return self.offsets[-1]
+
+
+    def index_at(self, offset: int) -> int:
+        """
+        Find the chunk containing a file offset
+
+        Parameters:
+            offset (int): File offset
+
+        Returns:
+            int: Chunk index, len(self) if the offset is past the end of the file
+        """
+
+        return bisect.bisect_right(self.offsets, offset) - 1
+
+
 class ChunklistVerification:
     """
     Library to validate Apple's files against their chunklist format
     Supports both chunklist and integrityDataV1 files
     - Ref: https://github.com/apple-oss-distributions/xnu/blob/xnu-8020.101.4/bsd/kern/chunklist.h
 
+    When 'use_cache' is set, progress is checkpointed to the verification cache (see cache_handler.py).
+    A file that was already verified, and hasn't changed since, is accepted without reading it,
+    and an interrupted verification continues from the last checkpoint
+
     Parameters:
         file_path      (Path): Path to the file to validate
         chunklist_path (Path): Path to the chunklist file
+        use_cache      (bool): Record and reuse verification progress
 
     Usage:
         >>> chunk_obj = ChunklistVerification("InstallAssistant.pkg", "InstallAssistant.pkg.integrityDataV1")
@@ -44,28 +151,33 @@ class ChunklistVerification:
         ...     print(chunk_obj.error_msg)
     """
 
-    def __init__(self, file_path: Path, chunklist_path: Union[Path, bytes]) -> None:
+    def __init__(self, file_path: Path, chunklist_path: Union[Path, bytes], use_cache: bool = False) -> None:
         if isinstance(chunklist_path, bytes):
             self.chunklist_path: bytes = chunklist_path
         else:
             self.chunklist_path: Path = Path(chunklist_path)
         self.file_path:          Path = Path(file_path)
 
-        self.chunks: dict = self._generate_chunks(self.chunklist_path)
+        self.chunks: Chunklist = self._generate_chunks(self.chunklist_path)
 
         self.error_msg:     str = ""
         self.current_chunk: int = 0
-        self.total_chunks:  int = len(self.chunks)
+        self.total_chunks:  int = len(self.chunks) if self.chunks else 0
+
+        self.use_cache: bool = use_cache
 
         self.status: ChunklistStatus = ChunklistStatus.IN_PROGRESS
 
 
-    def _generate_chunks(self, chunklist: Union[Path, bytes]) -> dict:
+    def _generate_chunks(self, chunklist: Union[Path, bytes]) -> Chunklist:
         """
-        Generate a dictionary of the chunklist header and chunks
+        Parse the chunklist header and chunks
 
         Parameters:
             chunklist (Path | bytes): Path to the chunklist file or the chunklist file itself
+
+        Returns:
+            Chunklist: Parsed chunks, None if not a chunklist
         """
 
         chunklist: bytes = chunklist if isinstance(chunklist, bytes) else chunklist.read_bytes()
@@ -86,9 +198,8 @@ class ChunklistVerification:
             return None
 
         all_chunks = chunklist[header["chunkOffset"]:header["chunkOffset"]+header["chunkCount"]*CHUNK_LENGTH]
-        chunks = [{"length": int.from_bytes(all_chunks[i:i+4], "little"), "checksum": all_chunks[i+4:i+CHUNK_LENGTH]} for i in range(0, len(all_chunks), CHUNK_LENGTH)]
 
-        return chunks
+        return Chunklist.from_bytes(all_chunks)
 
 
     def _validate(self) -> None:
@@ -112,21 +223,254 @@ class ChunklistVerification:
             logging.info(self.error_msg)
             return
 
-        with self.file_path.open("rb") as f:
-            for chunk in self.chunks:
-                self.current_chunk += 1
-                status = hashlib.sha256(f.read(chunk["length"])).digest()
-                if status != chunk["checksum"]:
-                    self.error_msg = f"Chunk {self.current_chunk} checksum status FAIL: chunk sum {binascii.hexlify(chunk['checksum']).decode()}, calculated sum {binascii.hexlify(status).decode()}"
-                    self.status = ChunklistStatus.FAILURE
-                    logging.info(self.error_msg)
-                    return
+        cache = cache_handler.VerificationCache() if self.use_cache else None
+        method = f"chunklist:{self.chunks.fingerprint()}"
+        identity = cache.file_identity(self.file_path) if cache else None
+        if cache:
+            entry = cache.load(self.file_path, method, identity)
+            if entry and entry["Status"] == cache_handler.VerificationStatus.SUCCESS:
+                logging.info(f"{self.file_path.name} was already verified, skipping")
+                self.current_chunk = self.total_chunks
+                self.status = ChunklistStatus.SUCCESS
+                return
+            if entry and 0 < entry["Progress"] < self.total_chunks:
+                logging.info(f"Resuming verification of {self.file_path.name} from chunk {entry['Progress']}")
+                self.current_chunk = entry["Progress"]
+
+        last_checkpoint = time.time()
+
+        # Chunks are hashed in parallel, but results are consumed in order
+        # so 'current_chunk' and the reported failure match a sequential pass
+        # Only a limited number of chunks are in flight, bounding memory usage
+        pending = collections.deque()
+        try:
+            with MappedFileReader(self.file_path) as reader, concurrent.futures.ThreadPoolExecutor(max_workers=HASH_THREADS) as executor:
+                try:
+                    next_chunk = self.current_chunk
+                    while pending or next_chunk < len(self.chunks):
+                        while next_chunk < len(self.chunks) and len(pending) < HASH_THREADS * 2:
+                            pending.append(executor.submit(self._hash_chunk, reader, self.chunks.offset(next_chunk), self.chunks.length(next_chunk)))
+                            next_chunk += 1
+
+                        status = pending.popleft().result()
+                        checksum = self.chunks.digest(self.current_chunk)
+                        self.current_chunk += 1
+                        if status != checksum:
+                            if cache:
+                                cache.remove(self.file_path, method, identity)
+                            self.error_msg = f"Chunk {self.current_chunk} checksum status FAIL: chunk sum {binascii.hexlify(checksum).decode()}, calculated sum {binascii.hexlify(status).decode()}"
+                            self.status = ChunklistStatus.FAILURE
+                            logging.info(self.error_msg)
+                            return
+
+                        if cache and time.time() - last_checkpoint > CHECKPOINT_INTERVAL:
+                            cache.store(self.file_path, method, cache_handler.VerificationStatus.IN_PROGRESS, self.current_chunk, identity)
+                            last_checkpoint = time.time()
+                finally:
+                    # Don't wait on chunks that won't be consumed
+                    for future in pending:
+                        future.cancel()
+        except Exception as e:
+            # ie. the file couldn't be opened or mapped, status would otherwise never leave IN_PROGRESS
+            self.error_msg = f"Failed to validate {self.file_path.name}: {e}"
+            self.status = ChunklistStatus.FAILURE
+            logging.info(self.error_msg)
+            return
+
+        if cache:
+            cache.store(self.file_path, method, cache_handler.VerificationStatus.SUCCESS, self.current_chunk, identity)
 
         self.status = ChunklistStatus.SUCCESS
 
 
+    def _hash_chunk(self, reader: "MappedFileReader", offset: int, length: int) -> bytes:
+        """
+        Calculate SHA-256 of a single chunk
+
+        Parameters:
+            reader (MappedFileReader): Mapped file being validated, shared between threads
+            offset (int):              File offset of the chunk
+            length (int):              Length of the chunk
+
+        Returns:
+            bytes: Digest of the chunk
+        """
+
+        with reader.slice(offset, length) as data:
+            return hashlib.sha256(data).digest()
+
+
     def validate(self) -> None:
         """
         Spawns _validate() thread
         """
         threading.Thread(target=self._validate).start()
+
+
+    def mark_verified(self) -> None:
+        """
+        Record the file as verified without reading it
+        ie. when every chunk was already validated during download
+        """
+
+        if not self.chunks:
+            return
+        cache_handler.VerificationCache().store(self.file_path, f"chunklist:{self.chunks.fingerprint()}", cache_handler.VerificationStatus.SUCCESS, self.total_chunks)
+
+
+    def validate_chunk(self, index: int) -> bool:
+        """
+        Validate a single chunk, without reading the rest of the file
+
+        Parameters:
+            index (int): Chunk index (zero based)
+
+        Returns:
+            bool: True if the chunk matches the chunklist
+        """
+
+        if not self.chunks or not self.file_path.is_file():
+            return False
+
+        with MappedFileReader(self.file_path) as reader:
+            return self._hash_chunk(reader, self.chunks.offset(index), self.chunks.length(index)) == self.chunks.digest(index)
+
+
+class MappedFileReader:
+    """
+    Read-only, memory mapped view of a file
+
+    Slices are memoryviews into the page cache, so reading a chunk doesn't
+    allocate or copy. Slices may be taken from multiple threads at once
+
+    Slices must be released before the reader is closed, use them as context managers
+
+    Parameters:
+        file_path (Path): Path to the file to map
+
+    Usage:
+        >>> with MappedFileReader("InstallAssistant.pkg") as reader:
+        ...     with reader.slice(offset, length) as data:
+        ...         digest = hashlib.sha256(data).digest()
+    """
+
+    def __init__(self, file_path: Path) -> None:
+        self.file_path: Path = Path(file_path)
+        self.size:      int  = 0
+
+        self._file = None
+        self._map  = None
+        self._view: memoryview = None
+
+
+    def __enter__(self) -> "MappedFileReader":
+        self._file = self.file_path.open("rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size == 0:
+            # mmap() refuses empty files
+            self._view = memoryview(b"")
+        else:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+    def slice(self, offset: int, length: int) -> memoryview:
+        """
+        Get a view of part of the file
+
+        Parameters:
+            offset (int): File offset
+            length (int): Number of bytes, the view is shorter if the file ends first
+
+        Returns:
+            memoryview: View into the mapped file
+        """
+
+        return self._view[offset:offset + length]
+
+
+class ChunklistStreamVerification:
+    """
+    Incrementally validates data against a chunklist as it arrives
+    Allows network_handler.DownloadObject to verify chunks during download, avoiding a second read of the file
+
+    Parameters:
+        chunks (Chunklist): Chunks from ChunklistVerification.chunks
+        offset (int):       File offset the stream starts at, must be on a chunk boundary
+
+    Usage:
+        >>> verifier = ChunklistStreamVerification(chunk_obj.chunks)
+        >>> for data in stream:
+        ...     if not verifier.update(data):
+        ...         print(verifier.error_msg)
+    """
+
+    def __init__(self, chunks: Chunklist, offset: int = 0) -> None:
+        self.chunks:    Chunklist = chunks
+        self.error_msg: str       = ""
+
+        index = bisect.bisect_left(chunks.offsets, offset)
+        if index == len(chunks.offsets) or chunks.offset(index) != offset:
+            raise ValueError(f"Offset {offset} is not on a chunk boundary")
+
+        self.current_chunk: int = index
+
+        self._hash      = hashlib.sha256()
+        self._remaining = self.chunks.length(self.current_chunk) if self.current_chunk < len(self.chunks) else 0
+
+
+    def update(self, data: bytes) -> bool:
+        """
+        Feed data into the verifier
+
+        Parameters:
+            data (bytes): Next bytes of the stream
+
+        Returns:
+            bool: False once a chunk fails validation or data extends past the chunklist
+        """
+
+        view = memoryview(data)
+        while view:
+            if self.current_chunk >= len(self.chunks):
+                self.error_msg = "Received more data than described by chunklist"
+                return False
+
+            length = min(self._remaining, len(view))
+            self._hash.update(view[:length])
+            self._remaining -= length
+            view = view[length:]
+
+            if self._remaining > 0:
+                continue
+
+            checksum = self.chunks.digest(self.current_chunk)
+            status = self._hash.digest()
+            if status != checksum:
+                self.error_msg = f"Chunk {self.current_chunk + 1} checksum status FAIL: chunk sum {binascii.hexlify(checksum).decode()}, calculated sum {binascii.hexlify(status).decode()}"
+                logging.info(self.error_msg)
+                return False
+
+            self.current_chunk += 1
+            self._hash = hashlib.sha256()
+            self._remaining = self.chunks.length(self.current_chunk) if self.current_chunk < len(self.chunks) else 0
+
+        return True
+
+
+    def at_chunk_boundary(self) -> bool:
+        """
+        Query whether all data received so far consisted of whole, verified chunks
+        """
+
+        if self.current_chunk >= len(self.chunks):
+            return True
+        return self._remaining == self.chunks.length(self.current_chunk)
@@ -13,16 +13,334 @@ import requests
 import subprocess
 import os
 
+import re
 import logging
+import functools
 
-from resources import utilities, network_handler, constants
+from resources import utilities, network_handler, constants, cache_handler
 from data import os_data
 
-KDK_INSTALL_PATH: str  = "/Library/Developer/KDKs"
-KDK_INFO_PLIST:   str  = "KDKInfo.plist"
-KDK_API_LINK:     str  = "https://dortania.github.io/KdkSupportPkg/manifest.json"
+KDK_INSTALL_PATH:   str  = "/Library/Developer/KDKs"
+KDK_INFO_PLIST:     str  = "KDKInfo.plist"
+KDK_API_LINK:       str  = "https://dortania.github.io/KdkSupportPkg/manifest.json"
+KDK_INDEX_PATH:     str  = f"{cache_handler.CACHE_ROOT}/KDK-Index.plist"
+KDK_INVENTORY_PATH: str  = f"{cache_handler.CACHE_ROOT}/KDK-Inventory.plist"
 
-KDK_ASSET_LIST:   list = None
+KDK_CHECKSUM_KEYS: list = [("sha256", "sha256"), ("sha1sum", "sha1"), ("md5sum", "md5")]  # API key -> hashlib name, strongest first
+
+KDK_ASSET_INDEX = None  # KernelDebugKitIndex, shared by all KernelDebugKitObjects in this process
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_kdk_version(version: str) -> packaging.version.Version:
+    return cast(packaging.version.Version, packaging.version.parse(version))
+
+
+class KernelDebugKitIndex:
+    """
+    Index of KDKs available from the KdkSupportPkg API
+
+    KDKs are hashed by build for exact matches, and bucketed by (major, minor) version
+    for closest matches. Buckets are sorted newest first, by version, date then build.
+
+    The index is persisted alongside the API response's validator (ETag or Last-Modified),
+    so later processes receiving the same response skip parsing and sorting the list
+
+    Parameters:
+        kdks      (list): KDKs from the API
+        validator (str):  ETag or Last-Modified of the API response, empty if unknown
+
+    Usage:
+        >>> index = KernelDebugKitIndex(results.json(), results.headers.get("ETag"))
+        >>> kdk = index.find_build("22E261") or index.find_closest(packaging.version.parse("13.3.1"))
+    """
+
+    INDEX_VERSION: int = 1
+
+
+    def __init__(self, kdks: list, validator: str = "", buckets: dict = None) -> None:
+        self.validator: str  = validator or ""
+        self.builds:    dict = {}  # Build -> KDK
+        self.buckets:   dict = {}  # (major, minor) -> KDKs, newest first
+
+        if buckets is None:
+            # Not loaded from disk, sort and bucket the list
+            kdks = sorted(kdks, key=lambda x: (_parse_kdk_version(x["version"]), datetime.datetime.fromisoformat(x["date"]), os_data.BuildNumber.parse(x["build"])), reverse=True)
+            buckets = {}
+            for i, kdk in enumerate(kdks):
+                version = _parse_kdk_version(kdk["version"])
+                buckets.setdefault((version.major, version.minor), []).append(i)
+
+        self.kdks: list = kdks  # Newest first
+        for kdk in kdks:
+            self.builds.setdefault(kdk["build"], kdk)
+        for bucket, indices in buckets.items():
+            self.buckets[bucket] = [kdks[i] for i in indices]
+        self._bucket_indices: dict = buckets
+
+
+    def find_build(self, build: str) -> dict or None:
+        """
+        Find the KDK exactly matching a build
+
+        Returns:
+            dict: KDK, None if not available
+        """
+
+        return self.builds.get(build)
+
+
+    def find_closest(self, version: packaging.version.Version) -> dict or None:
+        """
+        Find the newest KDK no newer than the version, from the same or previous minor version
+
+        Parameters:
+            version (packaging.version.Version): Host version
+
+        Returns:
+            dict: KDK, None if not available
+        """
+
+        for minor in [version.minor, version.minor - 1]:
+            bucket = self.buckets.get((version.major, minor), [])
+
+            # Bucket is sorted newest first, find the first KDK not newer than the host
+            low, high = 0, len(bucket)
+            while low < high:
+                middle = (low + high) // 2
+                if _parse_kdk_version(bucket[middle]["version"]) > version:
+                    low = middle + 1
+                else:
+                    high = middle
+            if low < len(bucket):
+                return bucket[low]
+
+        return None
+
+
+    @classmethod
+    def load(cls, validator: str) -> "KernelDebugKitIndex":
+        """
+        Load the persisted index, if it was built from the same API response
+
+        Parameters:
+            validator (str): ETag or Last-Modified of the current API response
+
+        Returns:
+            KernelDebugKitIndex: Index, None if missing or outdated
+        """
+
+        if not validator or not Path(KDK_INDEX_PATH).exists():
+            return None
+        if not cache_handler.is_trusted(KDK_INDEX_PATH):
+            # URLs and checksums are taken from the index, ignore it if another user could have written it
+            logging.warning("KDK index is writable by other users, ignoring")
+            return None
+
+        try:
+            index = plistlib.load(Path(KDK_INDEX_PATH).open("rb"))
+        except Exception as e:
+            logging.warning(f"Unable to read KDK index: {e}")
+            return None
+
+        if index.get("Version") != cls.INDEX_VERSION or index.get("Validator") != validator:
+            return None
+
+        buckets = {tuple(int(part) for part in bucket.split(".")): indices for bucket, indices in index["Buckets"].items()}
+        return cls(index["KDKs"], validator, buckets)
+
+
+    def save(self) -> None:
+        """
+        Persist the index for other processes (GUI, auto-patcher, CLI)
+        """
+
+        if not self.validator:
+            return
+
+        index = {
+            "Version":   self.INDEX_VERSION,
+            "Validator": self.validator,
+            "KDKs":      self.kdks,
+            "Buckets":   {f"{major}.{minor}": indices for (major, minor), indices in self._bucket_indices.items()},
+        }
+
+        if not cache_handler.ensure_directory(Path(KDK_INDEX_PATH).parent):
+            return
+
+        try:
+            temp_path = Path(f"{KDK_INDEX_PATH}.tmp")
+            with cache_handler.create_file(temp_path) as file:
+                plistlib.dump(index, file)
+            temp_path.replace(KDK_INDEX_PATH)
+        except (OSError, TypeError, OverflowError) as e:
+            logging.warning(f"Unable to save KDK index: {e}")
+
+
+class KernelDebugKitInventory:
+    """
+    Persisted inventory of installed KDKs and KDK pkg backups in KDK_INSTALL_PATH
+
+    The folder is only listed again when its modification time changes (ie. a KDK was added or removed).
+    KDKs that passed validation are recorded with the modification times of their root and
+    'System/Library/Extensions' folders, and are trusted until either changes, avoiding repeated
+    pkg receipt checks. Only successful validations are recorded
+
+    Entries are sorted newest build first
+
+    Usage:
+        >>> inventory = KernelDebugKitInventory()
+        >>> for entry in inventory.refresh():
+        ...     if entry["Type"] == "KDK" and inventory.is_valid(entry):
+        ...         print(entry["Name"])
+    """
+
+    INVENTORY_VERSION: int = 1
+
+    KDK_NAME_REGEX = re.compile(r"^KDK_(?P<version>.+)_(?P<build>[^_]+)\.(kdk|pkg)$")
+
+
+    def __init__(self, kdk_path: str = KDK_INSTALL_PATH, inventory_path: str = KDK_INVENTORY_PATH) -> None:
+        self.kdk_path:       Path = Path(kdk_path)
+        self.inventory_path: Path = Path(inventory_path)
+        self.entries:        list = []
+
+        self._directory_mtime: int = None
+
+
+    def refresh(self) -> list:
+        """
+        Update the inventory, listing the KDK folder only if it changed
+
+        Returns:
+            list: Entries ('Name', 'Type', 'Build', 'Version', 'Valid'), newest build first. Empty if the folder doesn't exist
+        """
+
+        try:
+            directory_mtime = self.kdk_path.stat().st_mtime_ns
+        except OSError:
+            self.entries = []
+            return self.entries
+
+        if self._directory_mtime is None:
+            self._load()
+        if self._directory_mtime == directory_mtime:
+            return self.entries
+
+        logging.info("Refreshing installed KDK inventory")
+        previous_entries = {entry["Name"]: entry for entry in self.entries}
+        entries = []
+        for kdk_entry in self.kdk_path.iterdir():
+            if kdk_entry.is_dir():
+                entry_type = "KDK"
+            elif kdk_entry.name.endswith(".pkg"):
+                entry_type = "Package"
+            else:
+                continue
+
+            if kdk_entry.name in previous_entries and previous_entries[kdk_entry.name]["Type"] == entry_type:
+                entries.append(previous_entries[kdk_entry.name])
+                continue
+
+            name_match = self.KDK_NAME_REGEX.match(kdk_entry.name)
+            entries.append({
+                "Name":    kdk_entry.name,
+                "Type":    entry_type,
+                "Build":   name_match.group("build")   if name_match else kdk_entry.stem.split("_")[-1],
+                "Version": name_match.group("version") if name_match else "",
+                "Valid":   False,
+            })
+
+        # Prefer the newest build when multiple KDKs match (ie. loosely matching a version)
+        self.entries = sorted(entries, key=lambda entry: os_data.BuildNumber.parse(entry["Build"]), reverse=True)
+        self._directory_mtime = directory_mtime
+        self._save()
+        return self.entries
+
+
+    def _validity_stamp(self, name: str) -> list:
+        """
+        Modification times identifying a KDK's current state, None if missing
+        """
+
+        try:
+            return [
+                (self.kdk_path / name).stat().st_mtime_ns,
+                (self.kdk_path / name / "System/Library/Extensions").stat().st_mtime_ns,
+            ]
+        except OSError:
+            return None
+
+
+    def is_valid(self, entry: dict) -> bool:
+        """
+        Check whether a KDK previously passed validation and hasn't changed since
+
+        Parameters:
+            entry (dict): Entry from refresh()
+
+        Returns:
+            bool: True if known valid, False if it needs to be validated
+        """
+
+        if entry["Type"] != "KDK" or entry["Valid"] is False:
+            return False
+
+        stamp = self._validity_stamp(entry["Name"])
+        return stamp is not None and stamp == entry.get("Stamp")
+
+
+    def mark_valid(self, entry: dict) -> None:
+        """
+        Record that a KDK passed validation
+
+        Parameters:
+            entry (dict): Entry from refresh()
+        """
+
+        stamp = self._validity_stamp(entry["Name"])
+        if stamp is None:
+            return
+        entry["Valid"] = True
+        entry["Stamp"] = stamp
+        self._save()
+
+
+    def _load(self) -> None:
+        if not self.inventory_path.exists() or not cache_handler.is_trusted(self.inventory_path):
+            return
+
+        try:
+            inventory = plistlib.load(self.inventory_path.open("rb"))
+        except Exception as e:
+            logging.warning(f"Unable to read KDK inventory: {e}")
+            return
+
+        if inventory.get("Version") != self.INVENTORY_VERSION or inventory.get("Path") != str(self.kdk_path):
+            return
+
+        self.entries = inventory["Entries"]
+        self._directory_mtime = inventory["Directory Modified"]
+
+
+    def _save(self) -> None:
+        inventory = {
+            "Version":            self.INVENTORY_VERSION,
+            "Path":               str(self.kdk_path),
+            "Directory Modified": self._directory_mtime,
+            "Entries":            self.entries,
+        }
+
+        if not cache_handler.ensure_directory(self.inventory_path.parent):
+            return
+
+        try:
+            temp_path = self.inventory_path.with_suffix(".plist.tmp")
+            with cache_handler.create_file(temp_path) as file:
+                plistlib.dump(inventory, file)
+            temp_path.replace(self.inventory_path)
+        except OSError as e:
+            logging.warning(f"Unable to save KDK inventory: {e}")
 
 
 class KernelDebugKitObject:
@@ -67,6 +385,7 @@ class KernelDebugKitObject:
         self.kdk_url_version: str = ""
 
         self.kdk_url_expected_size: int = 0
+        self.kdk_url_checksum:      tuple = None  # (hashlib name, digest) published by the API
 
         self.kdk_url_is_exactly_match: bool = False
 
@@ -75,6 +394,9 @@ class KernelDebugKitObject:
         self.kdk_closest_match_url_version: str = ""
 
         self.kdk_closest_match_url_expected_size: int = 0
+        self.kdk_closest_match_url_checksum:      tuple = None
+
+        self.kdk_download_obj: network_handler.DownloadObject = None
 
         self.success: bool = False
 
@@ -83,24 +405,25 @@ class KernelDebugKitObject:
         self._get_latest_kdk()
 
 
-    def _get_remote_kdks(self) -> list or None:
+    def _get_remote_kdks(self) -> KernelDebugKitIndex or None:
         """
         Fetches a list of available KDKs from the KdkSupportPkg API
-        Additionally caches the list for future use, avoiding extra API calls
+        Additionally caches the index for future use, avoiding extra API calls
 
         Returns:
-            list: A list of KDKs, sorted by version and date if available. Returns None if the API is unreachable
+            KernelDebugKitIndex: Index of available KDKs. Returns None if the API is unreachable
         """
 
-        global KDK_ASSET_LIST
+        global KDK_ASSET_INDEX
 
         logging.info("Pulling KDK list from KdkSupportPkg API")
-        if KDK_ASSET_LIST:
-            return KDK_ASSET_LIST
+        if KDK_ASSET_INDEX:
+            return KDK_ASSET_INDEX
 
         try:
             results = network_handler.NetworkUtilities().get(
                 KDK_API_LINK,
+                use_cache=True,
                 headers={
                     "User-Agent": f"OCLP/{self.constants.patcher_version}"
                 },
@@ -113,10 +436,18 @@ class KernelDebugKitObject:
         if results.status_code != 200:
             logging.info("Could not fetch KDK list")
             return None
+        if getattr(results, "offline", False) is True:
+            # Stale index, KDKs listed in it can't be downloaded either
+            logging.info("Could not contact KDK API, ignoring cached KDK list")
+            return None
 
-        KDK_ASSET_LIST = sorted(results.json(), key=lambda x: (packaging.version.parse(x["version"]), datetime.datetime.fromisoformat(x["date"])), reverse=True)
+        validator = results.headers.get("ETag") or results.headers.get("Last-Modified")
+        KDK_ASSET_INDEX = KernelDebugKitIndex.load(validator)
+        if KDK_ASSET_INDEX is None:
+            KDK_ASSET_INDEX = KernelDebugKitIndex(results.json(), validator)
+            KDK_ASSET_INDEX.save()
 
-        return KDK_ASSET_LIST
+        return KDK_ASSET_INDEX
 
 
     def _get_latest_kdk(self, host_build: str = None, host_version: str = None) -> None:
@@ -180,34 +511,25 @@ class KernelDebugKitObject:
             return
 
         # First check exact match
-        for kdk in remote_kdk_version:
-            if (kdk["build"] != host_build):
-                continue
+        kdk = remote_kdk_version.find_build(host_build)
+        if kdk:
             self.kdk_url = kdk["url"]
             self.kdk_url_build = kdk["build"]
             self.kdk_url_version = kdk["version"]
             self.kdk_url_expected_size = kdk["fileSize"]
+            self.kdk_url_checksum = self._kdk_checksum(kdk)
             self.kdk_url_is_exactly_match = True
-            break
 
         # If no exact match, check for closest match
         if self.kdk_url == "":
-            for kdk in remote_kdk_version:
-                kdk_version = cast(packaging.version.Version, packaging.version.parse(kdk["version"]))
-                if kdk_version > parsed_version:
-                    continue
-                if kdk_version.major != parsed_version.major:
-                    continue
-                if kdk_version.minor not in range(parsed_version.minor - 1, parsed_version.minor + 1):
-                    continue
-
-                # The KDK list is already sorted by version then date, so the first match is the closest
+            kdk = remote_kdk_version.find_closest(parsed_version)
+            if kdk:
                 self.kdk_closest_match_url = kdk["url"]
                 self.kdk_closest_match_url_build = kdk["build"]
                 self.kdk_closest_match_url_version = kdk["version"]
                 self.kdk_closest_match_url_expected_size = kdk["fileSize"]
+                self.kdk_closest_match_url_checksum = self._kdk_checksum(kdk)
                 self.kdk_url_is_exactly_match = False
-                break
 
         if self.kdk_url == "":
             if self.kdk_closest_match_url == "":
@@ -221,6 +543,7 @@ class KernelDebugKitObject:
             self.kdk_url_build = self.kdk_closest_match_url_build
             self.kdk_url_version = self.kdk_closest_match_url_version
             self.kdk_url_expected_size = self.kdk_closest_match_url_expected_size
+            self.kdk_url_checksum = self.kdk_closest_match_url_checksum
         else:
             logging.info(f"Direct match found for {host_build} ({host_version})")
 
@@ -272,7 +595,32 @@ class KernelDebugKitObject:
         kdk_plist_path = Path(f"{kdk_download_path.parent}/{KDK_INFO_PLIST}") if override_path == "" else Path(f"{Path(override_path).parent}/{KDK_INFO_PLIST}")
 
         self._generate_kdk_info_plist(kdk_plist_path)
-        return network_handler.DownloadObject(self.kdk_url, kdk_download_path)
+
+        # Checked while downloading, see validate_kdk_checksum()
+        checksum_algorithm, checksum = self.kdk_url_checksum if self.kdk_url_checksum else ("sha256", None)
+        self.kdk_download_obj = network_handler.DownloadObject(
+            self.kdk_url, kdk_download_path, use_cache=True,
+            expected_checksum=checksum, checksum_algorithm=checksum_algorithm,
+            expected_size=self.kdk_url_expected_size or None
+        )
+        return self.kdk_download_obj
+
+
+    def _kdk_checksum(self, kdk: dict) -> tuple:
+        """
+        Get the strongest checksum the KdkSupportPkg API published for a KDK
+
+        Parameters:
+            kdk (dict): KDK entry from the API
+
+        Returns:
+            tuple: (hashlib name, digest), None if no checksum was published
+        """
+
+        for key, algorithm in KDK_CHECKSUM_KEYS:
+            if kdk.get(key):
+                return (algorithm, kdk[key])
+        return None
 
 
     def _generate_kdk_info_plist(self, plist_path: str) -> None:
@@ -397,36 +745,39 @@ class KernelDebugKitObject:
             else:
                 match = self.host_build
 
-        if not Path(KDK_INSTALL_PATH).exists():
-            return None
+        inventory = KernelDebugKitInventory()
+        kdk_entries = inventory.refresh()
 
-        for kdk_folder in Path(KDK_INSTALL_PATH).iterdir():
-            if not kdk_folder.is_dir():
+        for entry in kdk_entries:
+            if entry["Type"] != "KDK":
                 continue
             if check_version:
-                if match not in kdk_folder.name:
+                if match not in entry["Name"]:
                     continue
             else:
-                if not kdk_folder.name.endswith(f"{match}.kdk"):
+                if not entry["Name"].endswith(f"{match}.kdk"):
                     continue
 
+            kdk_folder = Path(KDK_INSTALL_PATH) / entry["Name"]
+            if inventory.is_valid(entry):
+                return kdk_folder
             if self._local_kdk_valid(kdk_folder):
+                inventory.mark_valid(entry)
                 return kdk_folder
 
         # If we can't find a KDK, next check if there's a backup present
         # Check for KDK packages in the same directory as the KDK
-        for kdk_pkg in Path(KDK_INSTALL_PATH).iterdir():
-            if kdk_pkg.is_dir():
-                continue
-            if not kdk_pkg.name.endswith(".pkg"):
+        for entry in kdk_entries:
+            if entry["Type"] != "Package":
                 continue
             if check_version:
-                if match not in kdk_pkg.name:
+                if match not in entry["Name"]:
                     continue
             else:
-                if not kdk_pkg.name.endswith(f"{match}.pkg"):
+                if not entry["Name"].endswith(f"{match}.pkg"):
                     continue
 
+            kdk_pkg = Path(KDK_INSTALL_PATH) / entry["Name"]
             logging.info(f"Found KDK backup: {kdk_pkg.name}")
             if self.passive is False:
                 logging.info("Attempting KDK restoration")
@@ -496,7 +847,8 @@ class KernelDebugKitObject:
             return
 
         logging.info("Cleaning unused KDKs")
-        for kdk_folder in Path(KDK_INSTALL_PATH).iterdir():
+        for entry in KernelDebugKitInventory().refresh():
+            kdk_folder = Path(KDK_INSTALL_PATH) / entry["Name"]
             if kdk_folder.name.endswith(".kdk") or kdk_folder.name.endswith(".pkg"):
                 should_remove = True
                 for build in exclude_builds:
@@ -529,8 +881,14 @@ class KernelDebugKitObject:
             logging.error(f"KDK DMG does not exist: {kdk_dmg_path}")
             return False
 
-        # TODO: should we use the checksum from the API?
-        result = subprocess.run(["hdiutil", "verify", self.constants.kdk_download_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # Skip the second pass over the image if it already matched the API's checksum while downloading
+        if self.kdk_download_obj and self.kdk_download_obj.checksum_verified and self.kdk_download_obj.filepath == Path(kdk_dmg_path):
+            self._remove_unused_kdks()
+            self.success = True
+            logging.info("Kernel Debug Kit checksum verified during download")
+            return True
+
+        result = subprocess.run(["hdiutil", "verify", kdk_dmg_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         if result.returncode != 0:
             logging.info("Error: Kernel Debug Kit checksum verification failed!")
             logging.info(f"Output: {result.stderr.decode('utf-8')}")
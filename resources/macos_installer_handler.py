@@ -7,9 +7,12 @@ import tempfile
 import enum
 import logging
 import applescript
+import requests
+import xml.parsers.expat
+import concurrent.futures
 
 from data import os_data
-from resources import network_handler, utilities
+from resources import network_handler, utilities, sucatalog_parser, cache_handler
 
 
 APPLICATION_SEARCH_PATH:  str = "/Applications"
@@ -34,6 +37,8 @@ CATALOG_URL_VARIANTS:     list = [
     "leopard",
 ]
 
+BUILD_MANIFEST_FETCH_THREADS: int = 8  # Concurrent Info.plist requests while parsing the catalog
+
 tmp_dir = tempfile.TemporaryDirectory()
 
 
@@ -236,7 +241,8 @@ class RemoteInstallerCatalog:
 
     def __init__(self, seed_override: SeedType = SeedType.PublicRelease, os_override: int = os_data.os_data.ventura) -> None:
 
-        self.catalog_url: str = self._construct_catalog_url(seed_override, os_override)
+        self.catalog_url:      str  = self._construct_catalog_url(seed_override, os_override)
+        self.catalog_complete: bool = False  # Set once the entire catalog was parsed
 
         self.available_apps:        dict = self._parse_catalog()
         self.available_apps_latest: dict = self._list_newest_installers_only()
@@ -281,25 +287,61 @@ class RemoteInstallerCatalog:
         return url
 
 
-    def _fetch_catalog(self) -> dict:
+    def _fetch_catalog(self):
         """
-        Fetches the catalog from Apple's servers
+        Fetches the catalog from Apple's servers, parsing it as it downloads
 
-        Returns:
-            dict: The catalog as a dictionary
+        Yields:
+            tuple: (product ID, product dictionary) for each macOS installer in the catalog
         """
 
-        catalog: dict = {}
-
         if network_handler.NetworkUtilities(self.catalog_url).verify_network_connection() is False:
-            return catalog
+            return
+
+        parser = sucatalog_parser.SUCatalogParser(self._is_installer_product)
+        try:
+            yield from parser.parse(network_handler.NetworkUtilities().stream(self.catalog_url, use_cache=True))
+        except (xml.parsers.expat.ExpatError, requests.exceptions.RequestException) as e:
+            logging.error(f"Failed to parse catalog: {e}")
+            return
+
+        self.catalog_complete = True
+
+
+    def _is_installer_product(self, product: dict) -> bool:
+        """
+        Determine whether a catalog product is a macOS installer (InstallAssistant.pkg with SharedSupport and BuildManifest)
+        """
+
+        if "ExtendedMetaInfo" not in product:
+            return False
+        if "Packages" not in product:
+            return False
+        if "InstallAssistantPackageIdentifiers" not in product["ExtendedMetaInfo"]:
+            return False
+        if "SharedSupport" not in product["ExtendedMetaInfo"]["InstallAssistantPackageIdentifiers"]:
+            return False
+        if "BuildManifest" not in product["ExtendedMetaInfo"]["InstallAssistantPackageIdentifiers"]:
+            return False
+        return True
+
+
+    def _fetch_build_plist(self, url: str) -> dict:
+        """
+        Fetches a product's Info.plist (BuildManifest metadata)
+
+        Parameters:
+            url (str): URL of the Info.plist package
+
+        Returns:
+            dict: Parsed Info.plist, None if invalid
+        """
 
         try:
-            catalog = plistlib.loads(network_handler.NetworkUtilities().get(self.catalog_url).content)
+            return plistlib.loads(network_handler.NetworkUtilities().get(url).content)
         except plistlib.InvalidFileException:
-            return {}
+            return None
 
-        return catalog
 
     def _parse_catalog(self) -> dict:
         """
@@ -308,104 +350,115 @@ class RemoteInstallerCatalog:
         Returns:
             dict: Dictionary of available installers
         """
-        available_apps: dict = {}
+        index = cache_handler.InstallerCatalogIndex()
+        indexed_products: dict = index.load(self.catalog_url)
+        products:         dict = {}  # Product ID -> {'PostDate', 'Installer'}, in catalog order
+        failed_products:  set  = set()
+
+        # Fetch each new or reposted product's Info.plist concurrently, while the catalog is still being parsed
+        # Results are merged in catalog order, so the outcome doesn't depend on which requests finish first
+        pending: list = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=BUILD_MANIFEST_FETCH_THREADS) as executor:
+            for product, product_info in self._fetch_catalog():
+                if product in indexed_products and indexed_products[product]["PostDate"] == product_info["PostDate"]:
+                    products[product] = indexed_products[product]
+                    continue
 
-        catalog: dict = self._fetch_catalog()
-        if not catalog:
-            return available_apps
+                products[product] = {"PostDate": product_info["PostDate"], "Installer": {}}
+                for bm_package in product_info["Packages"]:
+                    if "Info.plist" not in bm_package["URL"]:
+                        continue
+                    if "InstallInfo.plist" in bm_package["URL"]:
+                        continue
 
-        if "Products" not in catalog:
-            return available_apps
+                    pending.append((product, product_info, executor.submit(self._fetch_build_plist, bm_package["URL"])))
 
-        for product in catalog["Products"]:
-            if "ExtendedMetaInfo" not in catalog["Products"][product]:
+        for product, product_info, future in pending:
+            build_plist = future.result()
+            if build_plist is None:
+                # List the previously indexed (ie. pre-repost) entry for this run, if there is one
+                failed_products.add(product)
+                if product in indexed_products:
+                    products[product] = indexed_products[product]
                 continue
-            if "Packages" not in catalog["Products"][product]:
+
+            if "MobileAssetProperties" not in build_plist:
                 continue
-            if "InstallAssistantPackageIdentifiers" not in catalog["Products"][product]["ExtendedMetaInfo"]:
+            if "SupportedDeviceModels" not in build_plist["MobileAssetProperties"]:
                 continue
-            if "SharedSupport" not in catalog["Products"][product]["ExtendedMetaInfo"]["InstallAssistantPackageIdentifiers"]:
+            if "OSVersion" not in build_plist["MobileAssetProperties"]:
                 continue
-            if "BuildManifest" not in catalog["Products"][product]["ExtendedMetaInfo"]["InstallAssistantPackageIdentifiers"]:
+            if "Build" not in build_plist["MobileAssetProperties"]:
                 continue
 
-            for bm_package in catalog["Products"][product]["Packages"]:
-                if "Info.plist" not in bm_package["URL"]:
-                    continue
-                if "InstallInfo.plist" in bm_package["URL"]:
-                    continue
-
-                try:
-                    build_plist = plistlib.loads(network_handler.NetworkUtilities().get(bm_package["URL"]).content)
-                except plistlib.InvalidFileException:
-                    continue
-
-                if "MobileAssetProperties" not in build_plist:
-                    continue
-                if "SupportedDeviceModels" not in build_plist["MobileAssetProperties"]:
-                    continue
-                if "OSVersion" not in build_plist["MobileAssetProperties"]:
-                    continue
-                if "Build" not in build_plist["MobileAssetProperties"]:
-                    continue
+            # Ensure Apple Silicon specific Installers are not listed
+            if "VMM-x86_64" not in build_plist["MobileAssetProperties"]["SupportedDeviceModels"]:
+                continue
 
-                # Ensure Apple Silicon specific Installers are not listed
-                if "VMM-x86_64" not in build_plist["MobileAssetProperties"]["SupportedDeviceModels"]:
-                    continue
+            version = build_plist["MobileAssetProperties"]["OSVersion"]
+            build   = build_plist["MobileAssetProperties"]["Build"]
 
-                version = build_plist["MobileAssetProperties"]["OSVersion"]
-                build   = build_plist["MobileAssetProperties"]["Build"]
-
-                try:
-                    catalog_url = build_plist["MobileAssetProperties"]["BridgeVersionInfo"]["CatalogURL"]
-                    if "beta" in catalog_url:
-                        catalog_url = "PublicSeed"
-                    elif "customerseed" in catalog_url:
-                        catalog_url = "CustomerSeed"
-                    elif "seed" in catalog_url:
-                        catalog_url = "DeveloperSeed"
-                    else:
-                        catalog_url = "Public"
-                except KeyError:
-                    # Assume Public if no catalog URL is found
+            try:
+                catalog_url = build_plist["MobileAssetProperties"]["BridgeVersionInfo"]["CatalogURL"]
+                if "beta" in catalog_url:
+                    catalog_url = "PublicSeed"
+                elif "customerseed" in catalog_url:
+                    catalog_url = "CustomerSeed"
+                elif "seed" in catalog_url:
+                    catalog_url = "DeveloperSeed"
+                else:
                     catalog_url = "Public"
+            except KeyError:
+                # Assume Public if no catalog URL is found
+                catalog_url = "Public"
 
-                download_link = None
-                integrity     = None
-                size          = None
-                date = catalog["Products"][product]["PostDate"]
-
-                for ia_package in catalog["Products"][product]["Packages"]:
-                    if "InstallAssistant.pkg" not in ia_package["URL"]:
-                        continue
-                    if "URL" not in ia_package:
-                        continue
-                    if "IntegrityDataURL" not in ia_package:
-                        continue
+            download_link = None
+            integrity     = None
+            size          = None
+            date = product_info["PostDate"]
 
-                    download_link = ia_package["URL"]
-                    integrity     = ia_package["IntegrityDataURL"]
-                    size          = ia_package["Size"] if ia_package["Size"] else 0
+            for ia_package in product_info["Packages"]:
+                if "InstallAssistant.pkg" not in ia_package["URL"]:
+                    continue
+                if "URL" not in ia_package:
+                    continue
+                if "IntegrityDataURL" not in ia_package:
+                    continue
 
+                download_link = ia_package["URL"]
+                integrity     = ia_package["IntegrityDataURL"]
+                size          = ia_package["Size"] if ia_package["Size"] else 0
 
-                if any([version, build, download_link, size, integrity]) is None:
-                    continue
 
-                available_apps.update({
-                    product: {
-                        "Version":   version,
-                        "Build":     build,
-                        "Link":      download_link,
-                        "Size":      size,
-                        "integrity": integrity,
-                        "Source":   "Apple Inc.",
-                        "Variant":   catalog_url,
-                        "OS":        os_data.os_conversion.os_to_kernel(version),
-                        "Models":    build_plist["MobileAssetProperties"]["SupportedDeviceModels"],
-                        "Date":      date
-                    }
-                })
+            if None in [version, build, download_link, size, integrity]:
+                continue
 
+            products[product]["Installer"] = {
+                "Version":   version,
+                "Build":     build,
+                "Link":      download_link,
+                "Size":      size,
+                "integrity": integrity,
+                "Source":   "Apple Inc.",
+                "Variant":   catalog_url,
+                "OS":        os_data.os_conversion.os_to_kernel(version),
+                "Models":    build_plist["MobileAssetProperties"]["SupportedDeviceModels"],
+                "Date":      date
+            }
+
+        if not self.catalog_complete:
+            # Offline or partially parsed, serve what was previously indexed
+            if indexed_products:
+                logging.info("Using previously indexed catalog for products that could not be refreshed")
+            products = {**indexed_products, **products}
+
+        # Products whose Info.plist couldn't be fetched aren't indexed, so they're retried on the next refresh
+        # When the entire catalog was parsed, products no longer listed are dropped
+        indexable_products = {product: entry for product, entry in products.items() if product not in failed_products}
+        if indexable_products != indexed_products:
+            index.store(self.catalog_url, indexable_products)
+
+        available_apps: dict = {product: entry["Installer"] for product, entry in products.items() if entry["Installer"]}
         available_apps = {k: v for k, v in sorted(available_apps.items(), key=lambda x: x[1]['Version'])}
         
         return available_apps
@@ -424,80 +477,68 @@ class RemoteInstallerCatalog:
         if self.available_apps is None:
             return {}
 
-        newest_apps: dict = self.available_apps.copy()
         supported_versions = ["10.13", "10.14", "10.15", "11", "12", "13"]
+        beta_variants      = ["CustomerSeed", "DeveloperSeed", "PublicSeed"]
+
+        # First determine the largest version of each OS, ignoring betas
+        # Minor and security versions are relative to the OS (ie. 10.15.7 -> (7, None), 12.6.1 -> (6, 1))
+        # Security versions are tracked from the largest minor version's first appearance onwards
+        parsed_versions: dict = {}  # Installer -> (OS, minor, security)
+        largest_versions: dict = {}  # OS -> (minor, security)
+        for ia, installer in self.available_apps.items():
+            if installer["Variant"] in beta_variants:
+                continue
+            os_version = next((version for version in supported_versions if installer["Version"].startswith(version)), None)
+            if os_version is None:
+                continue
 
-
-        for version in supported_versions:
-            remote_version_minor = 0
-            remote_version_security = 0
-            os_builds = []
-
-            # First determine the largest version
-            for ia in newest_apps:
-                if newest_apps[ia]["Version"].startswith(version):
-                    if newest_apps[ia]["Variant"] not in ["CustomerSeed", "DeveloperSeed", "PublicSeed"]:
-                        remote_version = newest_apps[ia]["Version"].split(".")
-                        if remote_version[0] == "10":
-                            remote_version.pop(0)
-                            remote_version.pop(0)
-                        else:
-                            remote_version.pop(0)
-                        if int(remote_version[0]) > remote_version_minor:
-                            remote_version_minor = int(remote_version[0])
-                            remote_version_security = 0 # Reset as new minor version found
-                        if len(remote_version) > 1:
-                            if int(remote_version[1]) > remote_version_security:
-                                remote_version_security = int(remote_version[1])
-
-            # Now remove all versions that are not the largest
-            for ia in list(newest_apps):
-                # Don't use Beta builds to determine latest version
-                if newest_apps[ia]["Variant"] in ["CustomerSeed", "DeveloperSeed", "PublicSeed"]:
+            remote_version = installer["Version"].split(".")
+            remote_version = remote_version[2:] if remote_version[0] == "10" else remote_version[1:]
+            minor    = int(remote_version[0])
+            security = int(remote_version[1]) if len(remote_version) > 1 else None
+            parsed_versions[ia] = (os_version, minor, security)
+
+            largest_minor, largest_security = largest_versions.get(os_version, (0, 0))
+            if minor > largest_minor:
+                largest_minor, largest_security = minor, 0  # Reset as new minor version found
+            if security is not None and security > largest_security:
+                largest_security = security
+            largest_versions[os_version] = (largest_minor, largest_security)
+
+        # Now remove all versions that are not the largest
+        newest_apps: dict = {}
+        os_builds:   dict = {}  # OS -> builds already listed
+        for ia, installer in self.available_apps.items():
+            if ia in parsed_versions:
+                os_version, minor, security = parsed_versions[ia]
+                largest_minor, largest_security = largest_versions[os_version]
+                if minor < largest_minor:
+                    continue
+                if security is None and largest_security > 0:
+                    continue
+                if security is not None and security < largest_security:
                     continue
 
-                if newest_apps[ia]["Version"].startswith(version):
-                    remote_version = newest_apps[ia]["Version"].split(".")
-                    if remote_version[0] == "10":
-                        remote_version.pop(0)
-                        remote_version.pop(0)
-                    else:
-                        remote_version.pop(0)
-                    if int(remote_version[0]) < remote_version_minor:
-                        newest_apps.pop(ia)
-                        continue
-                    if int(remote_version[0]) == remote_version_minor:
-                        if len(remote_version) > 1:
-                            if int(remote_version[1]) < remote_version_security:
-                                newest_apps.pop(ia)
-                                continue
-                        else:
-                            if remote_version_security > 0:
-                                newest_apps.pop(ia)
-                                continue
-
-                    # Remove duplicate builds
-                    #   ex.  macOS 12.5.1 has 2 builds in the Software Update Catalog
-                    #   ref: https://twitter.com/classicii_mrmac/status/1560357471654379522
-                    if newest_apps[ia]["Build"] in os_builds:
-                        newest_apps.pop(ia)
-                        continue
+                # Remove duplicate builds
+                #   ex.  macOS 12.5.1 has 2 builds in the Software Update Catalog
+                #   ref: https://twitter.com/classicii_mrmac/status/1560357471654379522
+                if installer["Build"] in os_builds.setdefault(os_version, set()):
+                    continue
+                os_builds[os_version].add(installer["Build"])
 
-                    os_builds.append(newest_apps[ia]["Build"])
+            newest_apps[ia] = installer
 
         # Remove Betas if there's a non-beta version available
+        # and remove unsupported versions (namely 14)
+        released_versions = set(installer["Version"].split(".")[0] for installer in newest_apps.values() if installer["Variant"] not in beta_variants)
         for ia in list(newest_apps):
-            if newest_apps[ia]["Variant"] in ["CustomerSeed", "DeveloperSeed", "PublicSeed"]:
-                for ia2 in newest_apps:
-                    if newest_apps[ia2]["Version"].split(".")[0] == newest_apps[ia]["Version"].split(".")[0] and newest_apps[ia2]["Variant"] not in ["CustomerSeed", "DeveloperSeed", "PublicSeed"]:
-                        newest_apps.pop(ia)
-                        break
-
-        # Remove unsupported versions (namely 14)
-        for ia in list(newest_apps):
-            if newest_apps[ia]["Version"].split(".")[0] not in supported_versions:
+            major_version = newest_apps[ia]["Version"].split(".")[0]
+            if newest_apps[ia]["Variant"] in beta_variants and major_version in released_versions:
                 newest_apps.pop(ia)
-        
+                continue
+            if major_version not in supported_versions:
+                newest_apps.pop(ia)
+
         return newest_apps
 
 
@@ -555,11 +596,8 @@ class LocalInstallerCatalog:
             app_sdk:      str = application_info_plist["DTSDKBuild"] if "DTSDKBuild" in application_info_plist else "Unknown"
             min_required: str = application_info_plist["LSMinimumSystemVersion"] if "LSMinimumSystemVersion" in application_info_plist else "Unknown"
 
-            kernel:       int = 0
-            try:
-                kernel = int(app_sdk[:2])
-            except ValueError:
-                pass
+            sdk_build = os_data.BuildNumber.parse(app_sdk)
+            kernel:       int = sdk_build.major if sdk_build.valid else 0
 
             min_required = os_data.os_conversion.os_to_kernel(min_required) if min_required != "Unknown" else 0
 
@@ -598,7 +636,7 @@ class LocalInstallerCatalog:
             })
 
         # Sort Applications by version
-        application_list = {k: v for k, v in sorted(application_list.items(), key=lambda item: item[1]["Version"])}
+        application_list = {k: v for k, v in sorted(application_list.items(), key=lambda item: (item[1]["Version"], os_data.BuildNumber.parse(item[1]["Build"])))}
         return application_list
 
 
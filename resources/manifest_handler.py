@@ -0,0 +1,509 @@
+# Merkle tree manifests of directory trees
+# Used to detect corrupted or modified files in PatcherSupportPkg's payload tree against a manifest
+# generated by Build-Binary.command, without rehashing files that haven't changed since it was built,
+# and to merge only the changed parts of a tree (ie. Kernel Debug Kits) into the root volume
+
+import os
+import hashlib
+import logging
+import plistlib
+from pathlib import Path
+
+from resources import cache_handler
+
+
+MANIFEST_VERSION:    int = 1
+MANIFEST_CACHE_PATH: str = f"{cache_handler.CACHE_ROOT}/Manifests"  # Used if the manifest can't be stored next to its source
+
+HASH_CHUNK_SIZE: int = 1024 * 1024 * 4
+
+ENTRY_FILE:      str = "File"
+ENTRY_LINK:      str = "Link"
+ENTRY_DIRECTORY: str = "Directory"
+
+
+def source_identity(file_path: Path) -> str:
+    """
+    Generate an identity for the file a tree was extracted from (ie. Universal-Binaries.dmg)
+    Device and inode are left out, as they change when the app is copied or the image remounted
+
+    Parameters:
+        file_path (Path): Source file
+
+    Returns:
+        str: Identity, empty string if the file doesn't exist
+    """
+
+    try:
+        stat = Path(file_path).stat()
+    except OSError:
+        return ""
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class TreeManifest:
+    """
+    Merkle tree of a directory
+
+    Each file is recorded with its SHA-256, and each directory with the digest of its
+    children's names, types and digests. The stat information (size, mtime, inode) of every file
+    is recorded too, so verification only rehashes files that appear to have changed
+
+    Parameters:
+        root_path (Path): Root of the tree
+        entries   (dict): Relative path -> entry, "" being the root directory
+        source    (str):  Identity of the source the tree came from, see source_identity()
+
+    Usage:
+        >>> manifest = TreeManifest.load(tree_path, manifest_path, shared_cache=False)
+        >>> problems = manifest.verify_paths(["10.13.6/System/Library/Extensions/AppleIntelSNBGraphicsFB.kext"])
+        >>> if problems:
+        ...     print(problems)
+    """
+
+    def __init__(self, root_path: Path, entries: dict, source: str = "") -> None:
+        self.root_path: Path = Path(root_path)
+        self.entries:   dict = entries
+        self.source:    str  = source
+
+        self._children: dict = {}
+        for relative_path in self.entries:
+            if relative_path == "":
+                continue
+            self._children.setdefault(os.path.dirname(relative_path), []).append(relative_path)
+
+
+    @property
+    def root_digest(self) -> str:
+        """
+        Digest of the entire tree
+        """
+
+        return self.entries[""]["Digest"] if "" in self.entries else ""
+
+
+    @classmethod
+    def build(cls, root_path: Path, source: str = "") -> "TreeManifest":
+        """
+        Hash an entire tree
+
+        Parameters:
+            root_path (Path): Root of the tree
+            source    (str):  Identity of the source the tree came from
+
+        Returns:
+            TreeManifest: Manifest of the tree
+        """
+
+        root_path = Path(root_path)
+        logging.info(f"Building manifest of {root_path}")
+
+        entries = {}
+        for directory, directories, files in os.walk(root_path, topdown=False):
+            relative_directory = os.path.relpath(directory, root_path)
+            relative_directory = "" if relative_directory == "." else relative_directory
+
+            children = []
+            for name in directories + files:
+                relative_path = os.path.join(relative_directory, name)
+                if name in directories and relative_path in entries:
+                    children.append(relative_path)
+                    continue
+                entries[relative_path] = cls._hash_entry(root_path / relative_path)
+                children.append(relative_path)
+
+            entries[relative_directory] = {
+                "Type":   ENTRY_DIRECTORY,
+                "Digest": cls._directory_digest({child: entries[child] for child in children}),
+            }
+
+        return cls(root_path, entries, source)
+
+
+    @classmethod
+    def load(cls, root_path: Path, manifest_path: Path, shared_cache: bool = True) -> "TreeManifest":
+        """
+        Load a saved manifest
+
+        Parameters:
+            root_path     (Path): Root of the tree the manifest describes
+            manifest_path (Path): Saved manifest
+            shared_cache  (bool): Fall back to a copy in the shared cache, disable for shipped manifests
+
+        Returns:
+            TreeManifest: Manifest, None if missing, unreadable or from a different manifest version
+        """
+
+        for path in cls._candidate_paths(manifest_path) if shared_cache else [Path(manifest_path)]:
+            if not path.exists():
+                continue
+            if not cache_handler.is_trusted(path):
+                # Manifests decide what is skipped when verifying or merging, ignore any another user could have written
+                logging.warning(f"Manifest {path} is writable by other users, ignoring")
+                continue
+            try:
+                data = plistlib.load(path.open("rb"))
+            except Exception as e:
+                logging.warning(f"Unable to read manifest {path}: {e}")
+                continue
+            if data.get("Version") != MANIFEST_VERSION:
+                continue
+            return cls(root_path, data["Entries"], data.get("Source", ""))
+
+        return None
+
+
+    @classmethod
+    def load_or_build(cls, root_path: Path, manifest_path: Path, source: str = "") -> "TreeManifest":
+        """
+        Load a saved manifest, rebuilding it if the source changed
+
+        Parameters:
+            root_path     (Path): Root of the tree
+            manifest_path (Path): Where the manifest is saved
+            source        (str):  Identity of the source the tree came from
+
+        Returns:
+            TreeManifest: Manifest of the tree
+        """
+
+        manifest = cls.load(root_path, manifest_path)
+        if manifest is not None and manifest.source == source:
+            return manifest
+
+        manifest = cls.build(root_path, source)
+        manifest.save(manifest_path)
+        return manifest
+
+
+    @classmethod
+    def _candidate_paths(cls, manifest_path: Path) -> list:
+        manifest_path = Path(manifest_path)
+        return [manifest_path, Path(MANIFEST_CACHE_PATH) / manifest_path.name]
+
+
+    def save(self, manifest_path: Path) -> None:
+        """
+        Save the manifest, falling back to the shared cache if the location isn't writable
+
+        Parameters:
+            manifest_path (Path): Where to save the manifest
+        """
+
+        data = {
+            "Version": MANIFEST_VERSION,
+            "Source":  self.source,
+            "Root":    self.root_digest,
+            "Entries": self.entries,
+        }
+
+        for path in self._candidate_paths(manifest_path):
+            try:
+                if not cache_handler.ensure_directory(path.parent):
+                    raise OSError("directory is writable by other users")
+                temp_path = path.with_name(f"{path.name}.tmp")
+                with cache_handler.create_file(temp_path) as file:
+                    plistlib.dump(data, file)
+                temp_path.replace(path)
+                logging.info(f"Saved manifest to {path}")
+                return
+            except OSError as e:
+                logging.warning(f"Unable to save manifest to {path}: {e}")
+
+
+    def verify_paths(self, relative_paths: list, exclude: list = None) -> list:
+        """
+        Verify files and directories against the manifest
+
+        Only files whose size, modification time or inode differ from the manifest are rehashed
+
+        Parameters:
+            relative_paths (list): Paths relative to the root, directories are verified recursively
+            exclude        (list): Relative paths whose contents may legitimately differ (ie. patched in place)
+
+        Returns:
+            list: Description of each problem found, empty if intact
+        """
+
+        exclude = set(exclude or [])
+        problems = []
+        verified = set()
+        for relative_path in relative_paths:
+            relative_path = os.path.normpath(relative_path).lstrip("/")
+            if relative_path in verified:
+                continue
+            verified.add(relative_path)
+            self._verify(relative_path, exclude, problems)
+        return problems
+
+
+    def changed_files(self, exclude: list = None) -> list:
+        """
+        Find recorded files and links that are missing or no longer match the manifest
+
+        Only the recorded entries are checked, directories are not listed, and files are only
+        rehashed if their size, modification time or inode differ from the manifest
+
+        Parameters:
+            exclude (list): Relative paths to skip, including their children
+
+        Returns:
+            list: Relative paths of changed entries
+        """
+
+        exclude = exclude or []
+        exclude_prefixes = tuple(f"{path}/" for path in exclude)
+        changed = []
+        for relative_path, entry in self.entries.items():
+            if entry["Type"] == ENTRY_DIRECTORY:
+                continue
+            if relative_path in exclude or relative_path.startswith(exclude_prefixes):
+                continue
+
+            path = self.root_path / relative_path
+            if not os.path.lexists(path):
+                changed.append(relative_path)
+                continue
+            current = self._current_entry(path, entry)
+            if current["Type"] != entry["Type"] or current["Digest"] != entry["Digest"]:
+                changed.append(relative_path)
+
+        return changed
+
+
+    def diff(self, other: "TreeManifest") -> list:
+        """
+        Find entries that are new or different compared to another manifest
+        Subtrees whose digests match are skipped without comparing their contents
+
+        Parameters:
+            other (TreeManifest): Manifest to compare against (ie. of a previous version of the tree)
+
+        Returns:
+            list: Relative paths of files and links that differ, and of empty directories missing from the other manifest
+        """
+
+        changed = []
+        pending = [""] if "" in self.entries else []
+        while pending:
+            relative_path = pending.pop()
+            entry = self.entries[relative_path]
+            other_entry = other.entries.get(relative_path)
+            if other_entry is not None and other_entry["Type"] == entry["Type"] and other_entry["Digest"] == entry["Digest"]:
+                continue
+
+            if entry["Type"] != ENTRY_DIRECTORY:
+                changed.append(relative_path)
+                continue
+
+            children = self._children.get(relative_path, [])
+            if not children and other_entry is None:
+                changed.append(relative_path)
+            pending.extend(children)
+
+        return sorted(changed)
+
+
+    def record_at(self, destination_root: Path, exclude: list = None, previous: "TreeManifest" = None) -> "TreeManifest":
+        """
+        Create a manifest for a copy of this tree, verifying the copy against this manifest
+
+        Files are rehashed unless the previous manifest of the copy already recorded them with the same
+        digest and their size, modification time and inode are unchanged since (ie. they weren't copied again)
+
+        Parameters:
+            destination_root (Path):         Root of the copy
+            exclude          (list):         Relative paths that may legitimately differ, recorded as in this manifest
+            previous         (TreeManifest): Manifest of the copy before it was updated, if any
+
+        Returns:
+            TreeManifest: Manifest of the copy
+        """
+
+        destination_root = Path(destination_root)
+        exclude = exclude or []
+        exclude_prefixes = tuple(f"{path}/" for path in exclude)
+        problems = []
+        entries = {}
+        for relative_path, entry in self.entries.items():
+            if entry["Type"] == ENTRY_DIRECTORY or relative_path in exclude or relative_path.startswith(exclude_prefixes):
+                entries[relative_path] = entry
+                continue
+
+            path = destination_root / relative_path
+            if not os.path.lexists(path):
+                problems.append(f"Missing: {relative_path}")
+                continue
+
+            previous_entry = previous.entries.get(relative_path) if previous is not None else None
+            if previous_entry is not None and previous_entry["Type"] == entry["Type"] and previous_entry["Digest"] == entry["Digest"]:
+                current = self._current_entry(path, previous_entry)
+            else:
+                current = self._hash_entry(path)
+            if current["Type"] != entry["Type"] or current["Digest"] != entry["Digest"]:
+                problems.append(f"Modified: {relative_path}")
+                continue
+            entries[relative_path] = current
+
+        if problems:
+            for problem in problems:
+                logging.info(f"- {problem}")
+            raise Exception(f"Failed to copy {self.root_path} to {destination_root} ({len(problems)} problems)")
+
+        return TreeManifest(destination_root, entries, self.source)
+
+
+    def _verify(self, relative_path: str, exclude: set, problems: list) -> str:
+        """
+        Recompute the digest of an entry, recording any differences from the manifest
+
+        Returns:
+            str: Current digest, empty string if missing
+        """
+
+        entry = self.entries.get(relative_path)
+        path = self.root_path / relative_path
+
+        if not os.path.lexists(path):
+            problems.append(f"Missing: {relative_path}")
+            return ""
+        if entry is None:
+            problems.append(f"Not in manifest: {relative_path}")
+            return ""
+        if relative_path in exclude:
+            return entry["Digest"]
+
+        if entry["Type"] != ENTRY_DIRECTORY:
+            current = self._current_entry(path, entry)
+            if current["Type"] != entry["Type"] or current["Digest"] != entry["Digest"]:
+                problems.append(f"Modified: {relative_path}")
+            return current["Digest"]
+
+        if not path.is_dir() or path.is_symlink():
+            problems.append(f"Modified: {relative_path}")
+            return ""
+
+        expected_children = set(self._children.get(relative_path, []))
+        current_children = set(os.path.join(relative_path, name) for name in os.listdir(path))
+        for child in expected_children - current_children:
+            problems.append(f"Missing: {child}")
+        for child in current_children - expected_children:
+            problems.append(f"Not in manifest: {child}")
+
+        digests = {}
+        for child in expected_children & current_children:
+            digests[child] = {"Type": self.entries[child]["Type"], "Digest": self._verify(child, exclude, problems)}
+        return self._directory_digest(digests)
+
+
+    def _current_entry(self, path: Path, entry: dict) -> dict:
+        """
+        Get the current state of a file or link, reusing the recorded digest if its stat information is unchanged
+        """
+
+        stat = os.lstat(path)
+        if (
+            entry["Type"] == ENTRY_FILE and
+            not os.path.islink(path) and
+            entry.get("Size") == stat.st_size and
+            entry.get("Mtime") == stat.st_mtime_ns and
+            entry.get("Inode") == stat.st_ino
+        ):
+            return entry
+        return self._hash_entry(path)
+
+
+    @classmethod
+    def _hash_entry(cls, path: Path) -> dict:
+        """
+        Hash a single file or symlink
+        """
+
+        stat = os.lstat(path)
+        if os.path.islink(path):
+            return {
+                "Type":   ENTRY_LINK,
+                "Digest": hashlib.sha256(os.readlink(path).encode()).hexdigest(),
+            }
+
+        checksum = hashlib.sha256()
+        with open(path, "rb") as file:
+            while chunk := file.read(HASH_CHUNK_SIZE):
+                checksum.update(chunk)
+
+        return {
+            "Type":   ENTRY_FILE,
+            "Digest": checksum.hexdigest(),
+            "Size":   stat.st_size,
+            "Mtime":  stat.st_mtime_ns,
+            "Inode":  stat.st_ino,
+        }
+
+
+    @classmethod
+    def _directory_digest(cls, children: dict) -> str:
+        """
+        Combine the digests of a directory's children
+
+        Parameters:
+            children (dict): Relative path -> entry, for each child
+
+        Returns:
+            str: Digest of the directory
+        """
+
+        checksum = hashlib.sha256()
+        for child in sorted(children):
+            checksum.update(f"{children[child]['Type']}\0{os.path.basename(child)}\0{children[child]['Digest']}\n".encode())
+        return checksum.hexdigest()
+
+
+def merge_tree(destination_root: Path, destination_identity: str, previous: TreeManifest, copy_function, load_source, exclude: list = None) -> TreeManifest:
+    """
+    Merge a tree into a destination, copying only what changed since the previous merge
+
+    Entries are copied if they differ between the source and the previous merge, or if they
+    no longer match the previous merge at the destination (ie. replaced by root patches).
+    Entries already in the destination but not in the source are left alone
+
+    Without a previous merge into the same destination everything is copied
+    Either way, the merged entries are verified against the source manifest
+
+    Parameters:
+        destination_root     (Path):         Root to merge into
+        destination_identity (str):          Identity of the destination (ie. root volume and build), stored as the result's source
+        previous             (TreeManifest): Manifest returned by the previous merge, ignored if made for a different destination identity
+        copy_function        (function):     Called with (source root, destination root, relative paths), copying each path
+                                             Relative paths are None if the entire tree should be copied
+        load_source          (function):     Called without arguments to load or build the manifest of the tree to merge
+        exclude              (list):         Relative paths at the destination that may legitimately differ after merging
+
+    Returns:
+        TreeManifest: Manifest of the merged entries at the destination, for the next merge
+    """
+
+    destination_root = Path(destination_root)
+
+    if previous is not None and previous.source != destination_identity:
+        logging.info(f"Previous merge into {destination_root} was made for {previous.source or 'an unknown destination'}, ignoring")
+        previous = None
+
+    source = load_source()
+    if previous is None:
+        logging.info(f"Merging all of {source.root_path}")
+        copy_function(source.root_path, destination_root, None)
+    else:
+        relative_paths = set(source.diff(previous))
+        for relative_path in previous.changed_files(exclude):
+            if relative_path in source.entries:
+                relative_paths.add(relative_path)
+
+        if relative_paths:
+            logging.info(f"Merging {len(relative_paths)} changed entries of {source.root_path}")
+            copy_function(source.root_path, destination_root, sorted(relative_paths))
+        else:
+            logging.info(f"{source.root_path} already merged")
+
+    merged = source.record_at(destination_root, exclude, previous)
+    merged.source = destination_identity
+    return merged
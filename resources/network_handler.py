@@ -3,19 +3,39 @@
 # object for libraries to query download progress and status
 # Copyright (C) 2023, Mykola Grymalyuk
 
+import re
+import io
 import time
+import math
+import bisect
 import requests
 import threading
 import logging
 import enum
 import hashlib
 import atexit
+import plistlib
+import email.utils
+import urllib.request
+import concurrent.futures
 from pathlib import Path
+from urllib.parse import urlparse
 
-from resources import utilities
+from resources import utilities, cache_handler, integrity_verification, global_settings
 
 SESSION = requests.Session()
 
+SEGMENTED_DOWNLOAD_CONNECTIONS: int = 4                  # Number of concurrent Range requests per download
+SEGMENTED_DOWNLOAD_THRESHOLD:   int = 1024 * 1024 * 256  # Only split files larger than 256MB
+DOWNLOAD_CHUNK_SIZE:            int = 1024 * 1024 * 4
+STREAM_CHUNK_SIZE:              int = 1024 * 64          # Chunk size for incrementally parsed responses
+
+REACHABILITY_CACHE_TTL:         int = 60  # Seconds a successful reachability check is trusted for
+REACHABILITY_CACHE_TTL_OFFLINE: int = 10  # Seconds a failed reachability check is trusted for
+
+REACHABILITY_CACHE:      dict = {}  # Host -> (time checked, reachable), shared by all NetworkUtilities instances
+REACHABILITY_CACHE_LOCK: threading.Lock = threading.Lock()
+
 
 class DownloadStatus(enum.Enum):
     """
@@ -28,6 +48,142 @@ class DownloadStatus(enum.Enum):
     COMPLETE:    str = "Complete"
 
 
+class BandwidthClass(enum.Enum):
+    """
+    Enum for bandwidth classes, each class shares a single rate limit across all downloads
+    """
+
+    FOREGROUND: str = "Foreground"  # Downloads the user is waiting on
+    BACKGROUND: str = "Background"  # Prefetching and caching
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter, shared between threads
+
+    Consumers may take more than the bucket holds (ie. a full read from the socket),
+    the resulting debt is paid off by sleeping, keeping the average rate at the limit
+    """
+
+    def __init__(self, rate: int = 0) -> None:
+        self.rate: int = rate  # Bytes per second, 0 for unlimited
+
+        self._tokens:      float = float(rate)
+        self._last_refill: float = time.monotonic()
+        self._lock:        threading.Lock = threading.Lock()
+
+
+    def set_rate(self, rate: int) -> None:
+        """
+        Change the rate limit, applies to data consumed from now on
+
+        Parameters:
+            rate (int): Bytes per second, 0 for unlimited
+        """
+
+        with self._lock:
+            self.rate = max(int(rate), 0)
+            self._tokens = min(self._tokens, float(self.rate))
+            self._last_refill = time.monotonic()
+
+
+    def consume(self, amount: int) -> None:
+        """
+        Take tokens from the bucket, blocking until the rate limit allows it
+
+        Parameters:
+            amount (int): Number of bytes transferred
+        """
+
+        with self._lock:
+            if self.rate <= 0:
+                return
+            now = time.monotonic()
+            self._tokens = min(float(self.rate), self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+
+class BandwidthLimiter:
+    """
+    Rate limits shared by all DownloadObjects, one token bucket per BandwidthClass
+
+    Initial limits are read from the 'Download_Bandwidth_Limit_Foreground' and
+    'Download_Bandwidth_Limit_Background' global settings (bytes per second, 0 or unset for unlimited),
+    and can be changed at runtime through set_limit()
+
+    Usage:
+        >>> BANDWIDTH_LIMITER.set_limit(BandwidthClass.BACKGROUND, 1024 * 1024 * 5)
+        >>> print(BANDWIDTH_LIMITER.get_limit(BandwidthClass.BACKGROUND))
+    """
+
+    def __init__(self) -> None:
+        self._buckets: dict = {bandwidth_class: TokenBucket() for bandwidth_class in BandwidthClass}
+        self._settings_loaded: bool = False
+
+
+    def _load_settings(self) -> None:
+        if self._settings_loaded:
+            return
+        self._settings_loaded = True
+
+        settings = global_settings.GlobalEnviromentSettings()
+        for bandwidth_class, bucket in self._buckets.items():
+            limit = settings.read_property(f"Download_Bandwidth_Limit_{bandwidth_class.value}")
+            if limit is None:
+                continue
+            try:
+                bucket.set_rate(int(limit))
+            except (TypeError, ValueError):
+                logging.warning(f"Invalid Download_Bandwidth_Limit_{bandwidth_class.value} ({limit}), ignoring")
+
+
+    def set_limit(self, bandwidth_class: BandwidthClass, rate: int) -> None:
+        """
+        Set the rate limit of a bandwidth class
+
+        Parameters:
+            bandwidth_class (BandwidthClass): Class to limit
+            rate            (int):            Bytes per second, 0 for unlimited
+        """
+
+        self._load_settings()
+        logging.info(f"Setting {bandwidth_class.value} bandwidth limit to {utilities.human_fmt(rate) + '/s' if rate else 'unlimited'}")
+        self._buckets[bandwidth_class].set_rate(rate)
+
+
+    def get_limit(self, bandwidth_class: BandwidthClass) -> int:
+        """
+        Query the rate limit of a bandwidth class
+
+        Returns:
+            int: Bytes per second, 0 if unlimited
+        """
+
+        self._load_settings()
+        return self._buckets[bandwidth_class].rate
+
+
+    def consume(self, bandwidth_class: BandwidthClass, amount: int) -> None:
+        """
+        Account for transferred data, blocking if the class is over its limit
+
+        Parameters:
+            bandwidth_class (BandwidthClass): Class of the transfer
+            amount          (int):            Number of bytes transferred
+        """
+
+        self._load_settings()
+        self._buckets[bandwidth_class].consume(amount)
+
+
+BANDWIDTH_LIMITER = BandwidthLimiter()
+
+
 class NetworkUtilities:
     """
     Utilities for network related tasks, primarily used for downloading files
@@ -44,20 +200,49 @@ class NetworkUtilities:
         """
         Verifies that the network is available
 
+        Results are cached per host for a short period, so repeated checks
+        (ie. root patch detection followed by downloading) don't each cost a round-trip
+
         Returns:
             bool: True if network is available, False otherwise
         """
 
+        reachable = self.cached_network_connection()
+        if reachable is not None:
+            return reachable
+
         try:
-            requests.head(self.url, timeout=5, allow_redirects=True)
-            return True
+            SESSION.head(self.url, timeout=5, allow_redirects=True)
+            reachable = True
         except (
             requests.exceptions.Timeout,
             requests.exceptions.TooManyRedirects,
             requests.exceptions.ConnectionError,
             requests.exceptions.HTTPError
         ):
-            return False
+            reachable = False
+
+        _record_reachability(self.url, reachable)
+        return reachable
+
+
+    def cached_network_connection(self) -> bool or None:
+        """
+        Query the cached reachability of the host, without touching the network
+
+        Returns:
+            bool: True if reachable, False if unreachable, None if not recently checked
+        """
+
+        with REACHABILITY_CACHE_LOCK:
+            entry = REACHABILITY_CACHE.get(urlparse(self.url).netloc)
+        if entry is None:
+            return None
+
+        checked, reachable = entry
+        if time.time() - checked > (REACHABILITY_CACHE_TTL if reachable else REACHABILITY_CACHE_TTL_OFFLINE):
+            return None
+        return reachable
 
     def validate_link(self) -> bool:
         """
@@ -81,13 +266,15 @@ class NetworkUtilities:
             return False
 
 
-    def get(self, url: str, **kwargs) -> requests.Response:
+    def get(self, url: str, use_cache: bool = False, **kwargs) -> requests.Response:
         """
         Wrapper for requests's get method
         Implement additional error handling
 
         Parameters:
             url (str): URL to get
+            use_cache (bool): Revalidate against the on-disk metadata cache (see cache_handler.py)
+                              Only intended for small, non-streamed responses such as JSON/plist APIs
             **kwargs: Additional parameters for requests.get
 
         Returns:
@@ -96,6 +283,11 @@ class NetworkUtilities:
 
         result: requests.Response = None
 
+        cache = cache_handler.HTTPMetadataCache() if use_cache else None
+        cached_entry = cache.load(url) if cache else None
+        if cached_entry:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **cache.conditional_headers(cached_entry)}
+
         try:
             result = SESSION.get(url, **kwargs)
         except (
@@ -105,11 +297,131 @@ class NetworkUtilities:
             requests.exceptions.HTTPError
         ) as error:
             logging.warn(f"Error calling requests.get: {error}")
+            if isinstance(error, requests.exceptions.ConnectionError):
+                _record_reachability(url, False)
+            if cached_entry:
+                logging.info(f"Using cached response for {url}")
+                return self._cached_response(url, cached_entry, offline=True)
             # Return empty response object
             return requests.Response()
 
+        _record_reachability(url, True)
+
+        if cached_entry and result.status_code == 304:
+            return self._cached_response(url, cached_entry)
+        if cache and result.status_code == 200:
+            cache.store(url, result.content, result.headers)
+
         return result
 
+
+    def _cached_response(self, url: str, entry: dict, offline: bool = False) -> requests.Response:
+        """
+        Build a response object from a cached metadata entry
+
+        Parameters:
+            url     (str):  Request URL
+            entry   (dict): Entry from HTTPMetadataCache.load()
+            offline (bool): Server couldn't be reached, so the entry wasn't revalidated
+                            Exposed as 'response.offline', callers can check it to treat the body as stale
+
+        Returns:
+            requests.Response: Response mimicking a 200 from the server
+        """
+
+        response = requests.Response()
+        response.url = url
+        response.offline = offline
+        response.status_code = 200
+        response._content = entry["Content"]
+        response.headers = requests.structures.CaseInsensitiveDict({
+            key: entry[key] for key in ["ETag", "Last-Modified", "Content-Type"] if entry.get(key)
+        })
+        return response
+
+
+    def stream(self, url: str, use_cache: bool = False, chunk_size: int = STREAM_CHUNK_SIZE, **kwargs):
+        """
+        Stream a response body, for incrementally parsing large responses (ie. SUCatalog)
+
+        With 'use_cache', the body is written to the metadata cache as it arrives,
+        and the cached copy is streamed instead when the server replies 304 or cannot be reached
+
+        Parameters:
+            url        (str):  URL to get
+            use_cache  (bool): Revalidate against the on-disk metadata cache (see cache_handler.py)
+            chunk_size (int):  Size of each chunk yielded
+            **kwargs: Additional parameters for requests.get
+
+        Yields:
+            bytes: Chunks of the response body, nothing if the request failed
+        """
+
+        cache = cache_handler.HTTPMetadataCache() if use_cache else None
+        cached_entry = cache.load_metadata(url) if cache else None
+        if cached_entry:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **cache.conditional_headers(cached_entry)}
+
+        try:
+            result = SESSION.get(url, stream=True, **kwargs)
+        except (
+            requests.exceptions.Timeout,
+            requests.exceptions.TooManyRedirects,
+            requests.exceptions.ConnectionError,
+            requests.exceptions.HTTPError
+        ) as error:
+            logging.warn(f"Error calling requests.get: {error}")
+            if isinstance(error, requests.exceptions.ConnectionError):
+                _record_reachability(url, False)
+            if cached_entry:
+                logging.info(f"Using cached response for {url}")
+                yield from self._stream_file(cache.body_path(url), chunk_size)
+            return
+
+        _record_reachability(url, True)
+
+        with result:
+            if cached_entry and result.status_code == 304:
+                yield from self._stream_file(cache.body_path(url), chunk_size)
+                return
+            if result.status_code != 200:
+                logging.warning(f"Unexpected status code {result.status_code} for {url}")
+                if cached_entry:
+                    logging.info(f"Using cached response for {url}")
+                    yield from self._stream_file(cache.body_path(url), chunk_size)
+                return
+            if cache is None:
+                yield from result.iter_content(chunk_size)
+                return
+
+            # Tee into the cache, only committed once the whole body has arrived
+            temp_path = cache.body_path(url).with_suffix(f".body.{threading.get_ident()}.part")
+            try:
+                if not cache_handler.ensure_directory(temp_path.parent):
+                    raise OSError("cache directory is writable by other users")
+                temp_file = cache_handler.create_file(temp_path)
+            except OSError as e:
+                logging.warning(f"Unable to cache response for {url}: {e}")
+                yield from result.iter_content(chunk_size)
+                return
+
+            try:
+                with temp_file:
+                    for chunk in result.iter_content(chunk_size):
+                        temp_file.write(chunk)
+                        yield chunk
+                cache.store_file(url, temp_path, result.headers)
+            finally:
+                if temp_path.exists():
+                    temp_path.unlink()
+
+
+    def _stream_file(self, file_path: Path, chunk_size: int):
+        with open(file_path, "rb") as file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+
+
     def post(self, url: str, **kwargs) -> requests.Response:
         """
         Wrapper for requests's post method
@@ -140,10 +452,131 @@ class NetworkUtilities:
         return result
 
 
+class LocalFileAdapter(requests.adapters.BaseAdapter):
+    """
+    Transport adapter for file:// URLs, allowing local shares to be used as download mirrors
+
+    Supports GET and HEAD, including single Range and If-Range requests,
+    so local files behave like a range-capable HTTP server
+    """
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, timeout=None, verify=True, cert=None, proxies=None) -> requests.Response:
+        response = requests.Response()
+        response.request = request
+        response.url     = request.url
+        response.raw     = io.BytesIO(b"")
+
+        path = Path(urllib.request.url2pathname(urlparse(request.url).path))
+        if request.method not in ["GET", "HEAD"]:
+            response.status_code = 405
+            return response
+        if not path.is_file():
+            response.status_code = 404
+            return response
+
+        stat = path.stat()
+        size = stat.st_size
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag":          f'"{size:x}-{int(stat.st_mtime):x}"',
+            "Last-Modified": email.utils.formatdate(stat.st_mtime, usegmt=True),
+        }
+
+        start, end = 0, size - 1
+        response.status_code = 200
+        requested_range = re.fullmatch(r"bytes=(\d+)-(\d*)", request.headers.get("Range", ""))
+        if requested_range and request.headers.get("If-Range", headers["ETag"]) in [headers["ETag"], headers["Last-Modified"]]:
+            start = int(requested_range[1])
+            end = min(int(requested_range[2]), size - 1) if requested_range[2] else size - 1
+            if start >= size:
+                response.status_code = 416
+                response.headers = requests.structures.CaseInsensitiveDict({**headers, "Content-Range": f"bytes */{size}"})
+                return response
+            response.status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        headers["Content-Length"] = str(end - start + 1)
+        response.headers = requests.structures.CaseInsensitiveDict(headers)
+        if request.method == "GET":
+            response.raw = _LocalFileRange(path, start, end - start + 1)
+        return response
+
+
+    def close(self) -> None:
+        pass
+
+
+class _LocalFileRange(io.RawIOBase):
+    """
+    Read-only view of a byte range within a local file, used as LocalFileAdapter's response body
+    """
+
+    def __init__(self, path: Path, start: int, length: int) -> None:
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = length
+
+
+    def readable(self) -> bool:
+        return True
+
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+SESSION.mount("file://", LocalFileAdapter())
+
+
+def _record_reachability(url: str, reachable: bool) -> None:
+    """
+    Update the shared reachability cache for the URL's host
+
+    Parameters:
+        url       (str):  URL that was contacted
+        reachable (bool): Whether the host responded
+    """
+
+    with REACHABILITY_CACHE_LOCK:
+        REACHABILITY_CACHE[urlparse(url).netloc] = (time.time(), reachable)
+
+
 class DownloadObject:
     """
     Object for downloading files from the network
 
+    Interrupted downloads are resumed on the next attempt, as long as the
+    '.part' file and its manifest are still present and the server reports
+    the same validators (ETag/Last-Modified) for the URL
+
+    When 'use_cache' is set, the shared download cache (see cache_handler.py)
+    is checked before going to the network, and completed downloads are added to it
+
+    When 'chunklist' is provided (see integrity_verification.py), each chunk is
+    validated as it arrives and the download stops at the first corrupted chunk
+
+    When 'expected_checksum' and/or 'expected_size' are provided (ie. published by an API),
+    the file is downloaded over a single connection, hashed as it arrives and checked once complete,
+    without a second pass over the file. Files that don't match are discarded, 'checksum_verified' is set if they do.
+    The computed digest is reused as the file's download cache key, and copies restored from the cache are hashed too
+
+    Transfers are rate limited according to 'bandwidth_class' (see BandwidthLimiter),
+    the class can be changed while the download is active
+
+    When 'mirrors' are provided (or configured through the 'Download_Mirrors' global setting),
+    all sources are raced and the fastest responder is used. If a source fails mid-transfer,
+    the remaining bytes are requested from the next source without discarding completed ranges.
+    Mirrors may be HTTP(S) or file:// URLs, and must serve identical content
+
     Usage:
         >>> download_object = DownloadObject(url, path)
         >>> download_object.download(display_progress=True)
@@ -158,32 +591,67 @@ class DownloadObject:
 
     """
 
-    def __init__(self, url: str, path: str) -> None:
+    def __init__(self, url: str, path: str, segments: int = SEGMENTED_DOWNLOAD_CONNECTIONS, use_cache: bool = False, chunklist: integrity_verification.Chunklist = None, mirrors: list = None, bandwidth_class: BandwidthClass = BandwidthClass.FOREGROUND, expected_checksum: str = None, checksum_algorithm: str = "sha256", expected_size: int = None) -> None:
         self.url:       str = url
         self.status:    str = DownloadStatus.INACTIVE
         self.error_msg: str = ""
         self.filename:  str = self._get_filename()
 
-        self.filepath:  Path = Path(path)
+        self.filepath:      Path = Path(path)
+        self.partial_path:  Path = self.filepath.with_name(f"{self.filepath.name}.part")
+        self.manifest_path: Path = self.filepath.with_name(f"{self.filepath.name}.part.plist")
 
         self.total_file_size:      float = 0.0
         self.downloaded_file_size: float = 0.0
+        self.resumed_file_size:    float = 0.0
         self.start_time:           float = time.time()
 
         self.error:             bool = False
         self.should_stop:       bool = False
         self.download_complete: bool = False
-        self.has_network:       bool = NetworkUtilities(self.url).verify_network_connection()
+        self.has_network:       bool = True  # Determined by the first request in _download()
 
         self.active_thread: threading.Thread = None
 
-        self.should_checksum: bool = False
+        self.mirrors:    list = mirrors if mirrors is not None else self._mirrors_from_settings()
+
+        self.bandwidth_class: BandwidthClass = bandwidth_class
+        self.source_url: str  = url  # Source currently being downloaded from, either 'url' or a mirror
+
+        self.should_checksum:    bool = False
+        self.checksum_requested: bool = False  # Caller needs the checksum (see download_simple()), not only the cache
 
         self.checksum = None
-        self._checksum_storage: hash = None
 
-        if self.has_network:
-            self._populate_file_size()
+        self.expected_checksum:  str  = expected_checksum.lower() if expected_checksum else None
+        self.checksum_algorithm: str  = checksum_algorithm  # hashlib name, ie. 'sha256', 'sha1' or 'md5'
+        self.expected_size:      int  = expected_size
+        self.checksum_verified:  bool = False
+
+        self.segments:        int  = segments  # Number of concurrent connections, 1 disables segmented downloads
+        self.supports_ranges: bool = False
+
+        self.etag:          str = ""
+        self.last_modified: str = ""
+
+        self.use_cache: bool = use_cache
+        self.cache_hit: bool = False
+
+        self.chunklist:          integrity_verification.Chunklist = chunklist  # Chunks from integrity_verification.ChunklistVerification
+        self.chunklist_verified: bool = False
+        self._chunk_offsets:     list = chunklist.offsets if chunklist else []
+        self._verifiers:         list = []
+
+        # Each entry is [start, position, end], bytes [start, position) are on disk
+        self._segment_state:     list = []
+        self._segment_lock:      threading.Lock = threading.Lock()
+        self._segment_error:     str  = ""
+        self._range_unsupported: bool = False
+        self._last_state_save:   float = 0.0
+
+        # First GET of the download, reused for the transfer when it starts at the right offset
+        self._initial_response:       requests.Response = None
+        self._initial_response_start: int = 0
 
 
     def __del__(self) -> None:
@@ -205,16 +673,21 @@ class DownloadObject:
         """
         self.status = DownloadStatus.DOWNLOADING
         logging.info(f"Starting download: {self.filename}")
+        # Chunklist verified downloads are cached under the chunklist's fingerprint, and don't need to be hashed again
+        should_checksum = verify_checksum or self.expected_checksum is not None or (self.use_cache and self.chunklist is None)
+        self.checksum_requested = verify_checksum
+        if should_checksum and self.checksum is None:
+            self.checksum = hashlib.new(self.checksum_algorithm if self.expected_checksum else "sha256")
         if spawn_thread:
             if self.active_thread:
                 logging.error("Download already in progress")
                 return
-            self.should_checksum = verify_checksum
+            self.should_checksum = should_checksum
             self.active_thread = threading.Thread(target=self._download, args=(display_progress,))
             self.active_thread.start()
             return
 
-        self.should_checksum = verify_checksum
+        self.should_checksum = should_checksum
         self._download(display_progress)
 
 
@@ -230,16 +703,51 @@ class DownloadObject:
             Otherwise, returns True if download was successful, False otherwise
         """
 
-        if verify_checksum:
-            self.should_checksum = True
-            self.checksum = hashlib.sha256()
-
-        self.download(spawn_thread=False)
+        self.download(spawn_thread=False, verify_checksum=verify_checksum)
 
         if not self.download_complete:
             return False
 
-        return self.checksum.hexdigest() if self.checksum else True
+        return self.checksum.hexdigest() if verify_checksum else True
+
+
+    def _mirrors_from_settings(self) -> list:
+        """
+        Resolve mirrors for the URL from the 'Download_Mirrors' global setting
+
+        The setting maps URL prefixes to one or more mirror prefixes, ex.:
+            "https://github.com/dortania/PatcherSupportPkg/releases/download/": [
+                "http://mirror.local/PatcherSupportPkg/",
+                "file:///Volumes/Share/PatcherSupportPkg/",
+            ]
+
+        Returns:
+            list: Mirror URLs, in configured order
+        """
+
+        mirror_map = global_settings.GlobalEnviromentSettings().read_property("Download_Mirrors")
+        if not isinstance(mirror_map, dict):
+            return []
+
+        mirrors = []
+        for prefix, replacements in mirror_map.items():
+            if not self.url.startswith(prefix):
+                continue
+            if isinstance(replacements, str):
+                replacements = [replacements]
+            mirrors += [replacement + self.url[len(prefix):] for replacement in replacements]
+        return mirrors
+
+
+    def _sources(self) -> list:
+        """
+        Get all sources for the file, with the active source first
+
+        Returns:
+            list: URLs
+        """
+
+        return [self.source_url] + [source for source in [self.url] + self.mirrors if source != self.source_url]
 
 
     def _get_filename(self) -> str:
@@ -255,15 +763,49 @@ class DownloadObject:
 
     def _populate_file_size(self) -> None:
         """
-        Get the file size of the file to be downloaded
+        Issue the first GET of the download, and populate file size, validators
+        and range support from its headers
+
+        Range is always requested (resuming from any partial download), so a
+        206 response both confirms range support and carries the total size.
+        The response is kept for the transfer itself, avoiding separate HEAD requests
 
         If unable to get file size, set to zero
         """
 
+        source = self._race_sources()
+        if source is None:
+            self.has_network = False
+            return
+
+        position, validator, validator_source = self._initial_request_position()
+        response = self._initial_request(source, position, validator, validator_source)
+
+        if response.status_code is None:
+            self.has_network = False
+            return
+        if response.status_code not in [200, 206]:
+            response.close()
+            raise Exception(f"Server returned HTTP {response.status_code}")
+
+        if source != self.url:
+            logging.info(f"Downloading {self.filename} from mirror: {source}")
+        self.source_url = source
+
+        self.has_network     = True
+        self.etag            = response.headers.get("ETag", "")
+        self.last_modified   = response.headers.get("Last-Modified", "")
+        self.supports_ranges = response.status_code == 206 or response.headers.get("Accept-Ranges", "").lower() == "bytes"
+
+        self._initial_response       = response
+        self._initial_response_start = self._response_start(response)
+
         try:
-            result = SESSION.head(self.url, allow_redirects=True, timeout=5)
-            if 'Content-Length' in result.headers:
-                self.total_file_size = float(result.headers['Content-Length'])
+            if response.status_code == 206:
+                # Content-Range: bytes <start>-<end>/<total>
+                self.total_file_size = float(response.headers["Content-Range"].rsplit("/", 1)[1])
+            elif "Content-Length" in response.headers:
+                self.total_file_size = float(response.headers["Content-Length"])
             else:
                 raise Exception("Content-Length missing from headers")
         except Exception as e:
@@ -272,6 +814,201 @@ class DownloadObject:
             self.total_file_size = 0.0
 
 
+    def _initial_request_position(self) -> tuple:
+        """
+        Determine where the first request should start, based on the manifest of
+        a previously interrupted download
+
+        The manifest is fully validated later in '_load_partial_state()',
+        this only avoids re-requesting bytes already on disk
+
+        Returns:
+            tuple: (offset, validator for If-Range, source the validator belongs to), (0, "", "") if nothing can be resumed
+        """
+
+        if not self.partial_path.exists() or not self.manifest_path.exists():
+            return (0, "", "")
+
+        try:
+            manifest = plistlib.load(self.manifest_path.open("rb"))
+        except Exception:
+            return (0, "", "")
+
+        validator = manifest.get("ETag") or manifest.get("Last-Modified")
+        if manifest.get("URL") != self.url or not validator:
+            return (0, "", "")
+
+        for start, position, end in manifest.get("Segments", []):
+            if self.chunklist:
+                position = max(start, self._align_to_chunk(position))
+            if position <= end:
+                return (position, validator, manifest.get("Source", self.url))
+
+        return (0, "", "")
+
+
+    def _race_sources(self) -> str or None:
+        """
+        Probe all sources concurrently, and pick the fastest to answer successfully
+
+        Probes only request the first byte and are closed as soon as their headers arrive,
+        so losing sources don't transfer the file. Sources recently found unreachable are skipped
+
+        Returns:
+            str: Source to download from, the primary URL if no probe succeeded, None if no source is reachable
+        """
+
+        def _probe(source: str) -> bool:
+            response = NetworkUtilities().get(source, headers={"Range": "bytes=0-0"}, stream=True, timeout=10)
+            self._close_response(response)
+            # 416 is expected for empty files
+            return response.status_code in [200, 206, 416]
+
+        candidates = [source for source in [self.url] + self.mirrors if NetworkUtilities(source).cached_network_connection() is not False]
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(candidates))
+        try:
+            futures = {executor.submit(_probe, source): source for source in candidates}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    if future.result():
+                        return futures[future]
+                except Exception as e:
+                    logging.warning(f"Failed to probe {futures[future]}: {str(e)}")
+        finally:
+            executor.shutdown(wait=False)
+
+        return self.url
+
+
+    def _initial_request(self, source: str, position: int, validator: str, validator_source: str) -> requests.Response:
+        """
+        Send the first request of the download to the selected source
+
+        Parameters:
+            source           (str): Source to request from
+            position         (int): Offset to request from
+            validator        (str): If-Range validator of the partial download, if any
+            validator_source (str): Source the validator belongs to
+
+        Returns:
+            requests.Response: Streamed response
+        """
+
+        headers = {"Range": f"bytes={position}-"}
+        if validator and source == validator_source:
+            headers["If-Range"] = validator
+        response = NetworkUtilities().get(source, headers=headers, stream=True, timeout=10)
+        if response.status_code == 416:
+            # Range not satisfiable, ie. empty file
+            response.close()
+            response = NetworkUtilities().get(source, stream=True, timeout=10)
+        return response
+
+
+    def _close_response(self, response: requests.Response) -> None:
+        """
+        Close a response, ignoring empty responses from failed requests
+        """
+
+        if response is not None and response.raw is not None:
+            response.close()
+
+
+    def _response_start(self, response: requests.Response) -> int:
+        """
+        Get the file offset of the first byte in the response body
+
+        Parameters:
+            response (requests.Response): Response to inspect
+
+        Returns:
+            int: Offset, 0 for non-partial responses
+        """
+
+        if response.status_code != 206:
+            return 0
+        try:
+            # Content-Range: bytes <start>-<end>/<total>
+            return int(response.headers["Content-Range"].split(" ", 1)[1].split("-", 1)[0])
+        except (KeyError, IndexError, ValueError):
+            return -1
+
+
+    def _response_total(self, response: requests.Response) -> int:
+        """
+        Get the total file size reported by a response
+
+        Parameters:
+            response (requests.Response): Response to inspect
+
+        Returns:
+            int: Size in bytes, -1 if unknown
+        """
+
+        try:
+            if response.status_code == 206:
+                # Content-Range: bytes <start>-<end>/<total>
+                return int(response.headers["Content-Range"].rsplit("/", 1)[1])
+            return int(response.headers["Content-Length"])
+        except (KeyError, IndexError, ValueError):
+            return -1
+
+
+    def _take_initial_response(self, position: int) -> requests.Response or None:
+        """
+        Claim the response of the first request, if its body starts at the provided offset
+
+        Parameters:
+            position (int): File offset the caller wants to download from
+
+        Returns:
+            requests.Response: Response, or None if unavailable or starting elsewhere
+        """
+
+        with self._segment_lock:
+            if self._initial_response is None or self._initial_response_start != position:
+                return None
+            response = self._initial_response
+            self._initial_response = None
+        return response
+
+
+    def _discard_initial_response(self) -> None:
+        """
+        Close the response of the first request, if it was not used
+        """
+
+        with self._segment_lock:
+            response = self._initial_response
+            self._initial_response = None
+        self._close_response(response)
+
+
+    def _rewind_to_chunk(self, segment: list, verifier: integrity_verification.ChunklistStreamVerification) -> None:
+        """
+        Drop any partially verified chunk from a segment, so another source can resume on a chunk boundary
+
+        Parameters:
+            segment  (list):                        [start, position, end] of the segment
+            verifier (ChunklistStreamVerification): Verifier used for the segment, None if no chunklist
+        """
+
+        if verifier is None:
+            return
+
+        with self._segment_lock:
+            if verifier in self._verifiers:
+                self._verifiers.remove(verifier)
+            aligned = max(segment[0], self._align_to_chunk(segment[1]))
+            self.downloaded_file_size -= segment[1] - aligned
+            segment[1] = aligned
+
+
     def _update_checksum(self, chunk: bytes) -> None:
         """
         Update checksum with new chunk
@@ -279,13 +1016,15 @@ class DownloadObject:
         Parameters:
             chunk (bytes): Chunk to update checksum with
         """
-        self._checksum_storage.update(chunk)
+        self.checksum.update(chunk)
 
 
     def _prepare_working_directory(self, path: Path) -> bool:
         """
         Validates working enviroment, including free space and removing existing files
 
+        Partially downloaded files are kept if they can be resumed
+
         Parameters:
             path (str): Path to the file
 
@@ -297,15 +1036,16 @@ class DownloadObject:
             if Path(path).exists():
                 logging.info(f"Deleting existing file: {path}")
                 Path(path).unlink()
-                return True
 
             if not Path(path).parent.exists():
                 logging.info(f"Creating directory: {Path(path).parent}")
                 Path(path).parent.mkdir(parents=True, exist_ok=True)
 
+            self._load_partial_state()
+
             available_space = utilities.get_free_space(Path(path).parent)
-            if self.total_file_size > available_space:
-                msg = f"Not enough free space to download {self.filename}, need {utilities.human_fmt(self.total_file_size)}, have {utilities.human_fmt(available_space)}"
+            if self.total_file_size - self.downloaded_file_size > available_space:
+                msg = f"Not enough free space to download {self.filename}, need {utilities.human_fmt(self.total_file_size - self.downloaded_file_size)}, have {utilities.human_fmt(available_space)}"
                 logging.error(msg)
                 raise Exception(msg)
 
@@ -320,6 +1060,123 @@ class DownloadObject:
         return True
 
 
+    def _load_partial_state(self) -> None:
+        """
+        Load the manifest of a previously interrupted download
+
+        The partial file is only reused if the manifest matches the URL, size and
+        validators reported by the server, otherwise it is discarded
+        """
+
+        self._segment_state = []
+        self.downloaded_file_size = 0.0
+        self.resumed_file_size = 0.0
+
+        if not self.partial_path.exists() or not self.manifest_path.exists():
+            self._reset_partial_state()
+            return
+
+        try:
+            manifest = plistlib.load(self.manifest_path.open("rb"))
+        except Exception as e:
+            logging.info(f"Unable to read download manifest, discarding partial download: {e}")
+            self._reset_partial_state()
+            return
+
+        if (
+            manifest.get("URL") != self.url or
+            manifest.get("Source", self.url) != self.source_url or
+            manifest.get("Size") != int(self.total_file_size) or
+            manifest.get("ETag") != self.etag or
+            manifest.get("Last-Modified") != self.last_modified or
+            not (self.etag or self.last_modified)
+        ):
+            logging.info("Remote file changed since last attempt, discarding partial download")
+            self._reset_partial_state()
+            return
+
+        self._segment_state = [list(segment) for segment in manifest.get("Segments", [])]
+        if self.chunklist:
+            # Only whole chunks were verified, re-download any trailing partial chunk
+            for segment in self._segment_state:
+                segment[1] = max(segment[0], self._align_to_chunk(segment[1]))
+        self.downloaded_file_size = float(sum(position - start for start, position, end in self._segment_state))
+        self.resumed_file_size = self.downloaded_file_size
+
+        if self._segment_state:
+            logging.info(f"Resuming download of {self.filename} from {utilities.human_fmt(self.downloaded_file_size)}")
+
+
+    def _save_partial_state(self, force: bool = False) -> None:
+        """
+        Write the manifest of the current download to disk
+
+        Parameters:
+            force (bool): Write even if the manifest was recently saved
+        """
+
+        if not self._segment_state:
+            return
+        if force is False and time.time() - self._last_state_save < 5:
+            return
+
+        with self._segment_lock:
+            manifest = {
+                "URL":           self.url,
+                "Source":        self.source_url,
+                "ETag":          self.etag,
+                "Last-Modified": self.last_modified,
+                "Size":          int(self.total_file_size),
+                "Segments":      [list(segment) for segment in self._segment_state],
+            }
+
+        try:
+            plistlib.dump(manifest, self.manifest_path.open("wb"))
+        except Exception as e:
+            logging.warning(f"Failed to save download manifest: {e}")
+        self._last_state_save = time.time()
+
+
+    def _reset_partial_state(self) -> None:
+        """
+        Remove any partial download and its manifest
+        """
+
+        for file in [self.partial_path, self.manifest_path]:
+            if file.exists():
+                file.unlink()
+
+        self._segment_state = []
+        self.downloaded_file_size = 0.0
+        self.resumed_file_size = 0.0
+
+
+    def _resume_headers(self, position: int, end: int = None, source: str = None) -> dict:
+        """
+        Generate Range and If-Range headers for resuming at the provided offset
+
+        If-Range ensures the server sends the full file if it changed in the meantime
+
+        Parameters:
+            position (int): First byte to request
+            end      (int): Last byte to request (inclusive), None for end of file
+            source   (str): Source the request is sent to, defaults to the active source
+                            Validators are only sent to the source that reported them
+
+        Returns:
+            dict: Request headers
+        """
+
+        headers = {"Range": f"bytes={position}-{'' if end is None else end}"}
+        if source not in [None, self.source_url]:
+            return headers
+        if self.etag:
+            headers["If-Range"] = self.etag
+        elif self.last_modified:
+            headers["If-Range"] = self.last_modified
+        return headers
+
+
     def _download(self, display_progress: bool = False) -> None:
         """
         Download the file
@@ -333,38 +1190,68 @@ class DownloadObject:
         utilities.disable_sleep_while_running()
 
         try:
+            self._populate_file_size()
+
+            if self._restore_from_cache():
+                self._discard_initial_response()
+                self.download_complete = True
+                self.status = DownloadStatus.COMPLETE
+                utilities.enable_sleep_after_running()
+                return
+
             if not self.has_network:
                 raise Exception("No network connection")
 
             if self._prepare_working_directory(self.filepath) is False:
                 raise Exception(self.error_msg)
 
-            response = NetworkUtilities().get(self.url, stream=True, timeout=10)
+            atexit.register(self.stop)
 
-            with open(self.filepath, 'wb') as file:
-                atexit.register(self.stop)
-                for i, chunk in enumerate(response.iter_content(1024 * 1024 * 4)):
-                    if self.should_stop:
-                        raise Exception("Download stopped")
-                    if chunk:
-                        file.write(chunk)
-                        self.downloaded_file_size += len(chunk)
-                        if self.should_checksum:
-                            self._update_checksum(chunk)
-                        if display_progress and i % 100:
-                            # Don't use logging here, as we'll be spamming the log file
-                            if self.total_file_size == 0.0:
-                                print(f"Downloaded {utilities.human_fmt(self.downloaded_file_size)} of {self.filename}")
-                            else:
-                                print(f"Downloaded {self.get_percent():.2f}% of {self.filename} ({utilities.human_fmt(self.get_speed())}/s) ({self.get_time_remaining():.2f} seconds remaining)")
-                self.download_complete = True
-                logging.info(f"Download complete: {self.filename}")
-                logging.info("Stats:")
-                logging.info(f"- Downloaded size: {utilities.human_fmt(self.downloaded_file_size)}")
-                logging.info(f"- Time elapsed: {(time.time() - self.start_time):.2f} seconds")
-                logging.info(f"- Speed: {utilities.human_fmt(self.downloaded_file_size / (time.time() - self.start_time))}/s")
-                logging.info(f"- Location: {self.filepath}")
+            if self.chunklist and self.total_file_size and self._chunk_offsets[-1] != int(self.total_file_size):
+                raise Exception(f"File size ({int(self.total_file_size)}) does not match chunklist ({self._chunk_offsets[-1]})")
+            if self.expected_size and self.total_file_size and self.expected_size != int(self.total_file_size):
+                raise Exception(f"File size ({int(self.total_file_size)}) does not match expected size ({self.expected_size})")
+
+            if self._should_segment():
+                self._download_segmented(display_progress)
+                if self._range_unsupported:
+                    logging.warning("Server ignored Range request, falling back to single connection download")
+                    self._reset_partial_state()
+                    self._download_stream(display_progress)
+            else:
+                self._download_stream(display_progress)
+
+            if self.chunklist:
+                if not all(verifier.at_chunk_boundary() for verifier in self._verifiers) or self.downloaded_file_size != self._chunk_offsets[-1]:
+                    raise Exception("Downloaded data does not match chunklist")
+                self.chunklist_verified = True
+                logging.info(f"Verified {len(self.chunklist)} chunks during download")
+
+            if not self._matches_expected(self.partial_path):
+                # Don't resume from corrupted data on the next attempt
+                self._reset_partial_state()
+                raise Exception(self.error_msg)
+
+            self.partial_path.replace(self.filepath)
+            if self.manifest_path.exists():
+                self.manifest_path.unlink()
+
+            if self.use_cache:
+                algorithm, digest = self._cache_digest()
+                cache_handler.DownloadCache().store(self.filepath, self.url, self._validator(), digest, algorithm)
+
+            self.download_complete = True
+            logging.info(f"Download complete: {self.filename}")
+            logging.info("Stats:")
+            logging.info(f"- Downloaded size: {utilities.human_fmt(self.downloaded_file_size)}")
+            if self.resumed_file_size:
+                logging.info(f"- Resumed from: {utilities.human_fmt(self.resumed_file_size)}")
+            logging.info(f"- Time elapsed: {(time.time() - self.start_time):.2f} seconds")
+            logging.info(f"- Speed: {self.get_speed_str()}")
+            logging.info(f"- Location: {self.filepath}")
         except Exception as e:
+            self._discard_initial_response()
+            self._save_partial_state(force=True)
             self.error = True
             self.error_msg = str(e)
             self.status = DownloadStatus.ERROR
@@ -374,6 +1261,472 @@ class DownloadObject:
         utilities.enable_sleep_after_running()
 
 
+    def _cache_digest(self) -> tuple:
+        """
+        Get a digest identifying the completed file, without reading it again
+
+        Returns:
+            tuple: (algorithm, digest), (None, None) if the download cache needs to hash the file
+        """
+
+        if self.should_checksum and self.checksum is not None:
+            return (self.checksum.name, self.checksum.hexdigest())
+        if self.chunklist_verified:
+            return ("chunklist", self.chunklist.fingerprint())
+        return (None, None)
+
+
+    def _validator(self) -> str:
+        """
+        Get the strongest validator the server reported for the file
+
+        Returns:
+            str: ETag, Last-Modified, or empty string if neither is available
+        """
+
+        return self.etag or self.last_modified
+
+
+    def _restore_from_cache(self) -> bool:
+        """
+        Attempt to serve the file from the download cache
+
+        Without network, the most recent cached copy of the URL is used
+
+        Returns:
+            bool: True if the file was restored from cache
+        """
+
+        if self.use_cache is False:
+            return False
+
+        cache = cache_handler.DownloadCache()
+        if not cache.is_enabled():
+            return False
+
+        validator = self._validator() if self.has_network else None
+        if self.has_network and not validator:
+            return False
+
+        # The restored copy is always hashed against an expected checksum, as the cache is shared between users
+        # Hashing while copying avoids reading the file again, otherwise only hash if the digest itself is needed
+        hash_copy = self.should_checksum and (self.checksum_requested or self.expected_checksum is not None)
+        object_name = cache.restore(self.url, validator, self.filepath, self.expected_checksum, self.checksum_algorithm, self.checksum if hash_copy else None)
+        if not object_name:
+            if hash_copy:
+                self.checksum = hashlib.new(self.checksum.name)
+            return False
+
+        self._reset_partial_state()
+        reported_file_size = self.total_file_size
+        self.cache_hit = True
+        self.total_file_size = float(self.filepath.stat().st_size)
+        self.downloaded_file_size = self.total_file_size
+        self.resumed_file_size = self.total_file_size
+
+        if not self._matches_expected(self.filepath):
+            logging.warning(f"Cached copy of {self.filename} is corrupted, downloading again")
+            if self.expected_checksum and object_name == cache.object_name(self.expected_checksum, self.checksum_algorithm):
+                # Named after the expected digest, so the object itself is corrupted
+                cache.discard(object_name)
+            self.filepath.unlink()
+            self.cache_hit = False
+            self.total_file_size = reported_file_size
+            self.downloaded_file_size = 0.0
+            self.resumed_file_size = 0.0
+            self.error_msg = ""
+            if self.checksum is not None:
+                self.checksum = hashlib.new(self.checksum.name)
+            return False
+
+        logging.info(f"Download complete: {self.filename} (served from cache)")
+        logging.info(f"- Location: {self.filepath}")
+        return True
+
+
+    def _matches_expected(self, path: Path) -> bool:
+        """
+        Check a completed file against the expected size and checksum, if any were provided
+        The checksum is the one calculated while downloading, the file is not read again
+
+        Parameters:
+            path (Path): Completed file
+
+        Returns:
+            bool: True if the file matches or nothing was expected, False otherwise (see 'error_msg')
+        """
+
+        if self.expected_size:
+            file_size = path.stat().st_size
+            if file_size != self.expected_size:
+                self.error_msg = f"File size ({file_size}) does not match expected size ({self.expected_size})"
+                logging.error(self.error_msg)
+                return False
+
+        if self.expected_checksum:
+            checksum = self.checksum.hexdigest()
+            if checksum != self.expected_checksum:
+                self.error_msg = f"{self.checksum_algorithm.upper()} checksum ({checksum}) does not match expected checksum ({self.expected_checksum})"
+                logging.error(self.error_msg)
+                return False
+
+            logging.info(f"Verified {self.checksum_algorithm.upper()} checksum during download: {checksum}")
+            self.checksum_verified = True
+
+        return True
+
+
+    def _align_to_chunk(self, position: int) -> int:
+        """
+        Round a file offset down to the nearest chunk boundary
+
+        Parameters:
+            position (int): File offset
+
+        Returns:
+            int: Offset of the chunk containing the position
+        """
+
+        return self._chunk_offsets[bisect.bisect_right(self._chunk_offsets, position) - 1]
+
+
+    def _create_verifier(self, position: int) -> integrity_verification.ChunklistStreamVerification or None:
+        """
+        Create a chunklist verifier for a stream starting at the provided offset
+
+        Parameters:
+            position (int): File offset, must be on a chunk boundary
+
+        Returns:
+            ChunklistStreamVerification: Verifier, or None if no chunklist was provided
+        """
+
+        if not self.chunklist:
+            return None
+        verifier = integrity_verification.ChunklistStreamVerification(self.chunklist, position)
+        with self._segment_lock:
+            self._verifiers.append(verifier)
+        return verifier
+
+
+    def _display_progress(self) -> None:
+        """
+        Print download progress to console
+        """
+
+        # Don't use logging here, as we'll be spamming the log file
+        if self.total_file_size == 0.0:
+            print(f"Downloaded {utilities.human_fmt(self.downloaded_file_size)} of {self.filename}")
+        else:
+            print(f"Downloaded {self.get_percent():.2f}% of {self.filename} ({self.get_speed_str()}) ({self.get_time_remaining():.2f} seconds remaining)")
+
+
+    def _should_segment(self) -> bool:
+        """
+        Determine whether the file should be downloaded over multiple connections
+
+        Returns:
+            bool: True if segmented download should be used
+        """
+
+        if len(self._segment_state) > 1:
+            # Resuming a segmented download
+            return True
+        if len(self._segment_state) == 1:
+            # Resuming a single connection download
+            return False
+        if self.segments <= 1:
+            return False
+        if self.expected_checksum:
+            # Hash in order as the file arrives, rather than reading the assembled file again
+            return False
+        if self.supports_ranges is False:
+            return False
+        if self.total_file_size < SEGMENTED_DOWNLOAD_THRESHOLD:
+            return False
+        return True
+
+
+    def _read_size(self) -> int:
+        """
+        Determine how much to read from the socket at once
+
+        When rate limited, smaller reads keep the transfer smooth instead of bursting
+
+        Returns:
+            int: Read size in bytes
+        """
+
+        limit = BANDWIDTH_LIMITER.get_limit(self.bandwidth_class)
+        if limit == 0:
+            return DOWNLOAD_CHUNK_SIZE
+        return max(1024 * 64, min(DOWNLOAD_CHUNK_SIZE, limit // 4))
+
+
+    def _hash_partial_file(self, length: int, path: Path = None) -> None:
+        """
+        Feed the first 'length' bytes of the partial file into the checksum
+
+        Parameters:
+            length (int):  Number of bytes to hash
+            path   (Path): File to hash, defaults to the partial file
+        """
+
+        with open(path or self.partial_path, "rb") as file:
+            while length > 0:
+                chunk = file.read(min(DOWNLOAD_CHUNK_SIZE, length))
+                if not chunk:
+                    break
+                self._update_checksum(chunk)
+                length -= len(chunk)
+
+
+    def _download_stream(self, display_progress: bool = False) -> None:
+        """
+        Download the file over a single connection
+
+        If the connection fails, the download continues from the next source
+
+        Parameters:
+            display_progress (bool): Display progress in console
+        """
+
+        if len(self._segment_state) != 1:
+            self._reset_partial_state()
+            self._segment_state = [[0, 0, int(self.total_file_size) - 1]]
+
+        segment = self._segment_state[0]
+
+        response = self._take_initial_response(segment[1])
+        self._discard_initial_response()
+        self._verifiers = []
+
+        sources = self._sources()
+        for index, source in enumerate(sources):
+            try:
+                self._download_stream_from_source(source, segment, response, display_progress)
+                return
+            except (requests.exceptions.RequestException, OSError) as e:
+                if self.should_stop or index == len(sources) - 1:
+                    raise
+                logging.warning(f"Download from {source} failed ({e}), continuing from {sources[index + 1]}")
+                response = None
+
+
+    def _download_stream_from_source(self, source: str, segment: list, response: requests.Response = None, display_progress: bool = False) -> None:
+        """
+        Download the remainder of the file from a single source
+
+        Parameters:
+            source           (str):               URL to download from
+            segment          (list):              [start, position, end] of the file, position is updated as data arrives
+            response         (requests.Response): Open response starting at the current position, if any
+            display_progress (bool):              Display progress in console
+        """
+
+        if response is None:
+            headers = self._resume_headers(segment[1], source=source) if segment[1] > 0 else {}
+            response = NetworkUtilities().get(source, headers=headers, stream=True, timeout=10)
+
+        try:
+            if response.status_code is None:
+                raise requests.exceptions.ConnectionError(f"Unable to reach {source}")
+            if response.status_code not in [200, 206]:
+                raise requests.exceptions.HTTPError(f"{source} returned HTTP {response.status_code}")
+            if source != self.source_url and self.total_file_size and self._response_total(response) != int(self.total_file_size):
+                raise requests.exceptions.HTTPError(f"{source} reports a different file size")
+            if segment[1] > 0 and response.status_code == 206 and self._response_start(response) != segment[1]:
+                raise requests.exceptions.HTTPError(f"{source} returned an unexpected range")
+            if segment[1] > 0 and response.status_code != 206:
+                logging.info("Server did not honour resume request, restarting download")
+                segment[1] = 0
+                self.downloaded_file_size = 0.0
+                self.resumed_file_size = 0.0
+                self._verifiers = []
+
+            if self.should_checksum:
+                # Restart the checksum, a previous source may have contributed data that was since rewound
+                self.checksum = hashlib.new(self.checksum.name)
+                if segment[1] > 0:
+                    self._hash_partial_file(segment[1])
+
+            verifier = self._create_verifier(segment[1])
+
+            try:
+                with open(self.partial_path, "r+b" if segment[1] > 0 else "wb") as file:
+                    file.seek(segment[1])
+                    for i, chunk in enumerate(response.iter_content(self._read_size())):
+                        if self.should_stop:
+                            raise Exception("Download stopped")
+                        if chunk:
+                            if verifier and not verifier.update(chunk):
+                                raise Exception(verifier.error_msg)
+                            file.write(chunk)
+                            segment[1] += len(chunk)
+                            self.downloaded_file_size += len(chunk)
+                            if self.should_checksum:
+                                self._update_checksum(chunk)
+                            BANDWIDTH_LIMITER.consume(self.bandwidth_class, len(chunk))
+                            if display_progress and i % 100:
+                                self._display_progress()
+                            self._save_partial_state()
+            except (requests.exceptions.RequestException, OSError):
+                self._rewind_to_chunk(segment, verifier)
+                raise
+
+            if self.total_file_size and segment[1] != int(self.total_file_size):
+                self._rewind_to_chunk(segment, verifier)
+                raise requests.exceptions.ChunkedEncodingError(f"Connection closed after {segment[1]} of {int(self.total_file_size)} bytes")
+        finally:
+            self._close_response(response)
+
+
+    def _download_segmented(self, display_progress: bool = False) -> None:
+        """
+        Download the file over multiple connections using HTTP Range requests
+
+        The file is preallocated, with each segment written at its own offset
+        If the server ignores the Range header, '_range_unsupported' is set
+        and the caller is expected to fall back to '_download_stream()'
+
+        Parameters:
+            display_progress (bool): Display progress in console
+        """
+
+        total_size = int(self.total_file_size)
+
+        if not self._segment_state:
+            segment_size = math.ceil(total_size / self.segments)
+            starts = list(range(0, total_size, segment_size))
+            if self.chunklist:
+                # Split on chunk boundaries, so each connection can verify its own chunks
+                starts = sorted(set(self._align_to_chunk(start) for start in starts))
+            ends = [start - 1 for start in starts[1:]] + [total_size - 1]
+            self._segment_state = [[start, start, end] for start, end in zip(starts, ends)]
+            with open(self.partial_path, "wb") as file:
+                file.truncate(total_size)
+
+        logging.info(f"Downloading {self.filename} over {len(self._segment_state)} connections")
+
+        self._segment_error = ""
+        self._range_unsupported = False
+        self._verifiers = []
+
+        threads = [
+            threading.Thread(target=self._download_segment, args=(segment, self._take_initial_response(segment[1]) if segment[1] <= segment[2] else None))
+            for segment in self._segment_state
+        ]
+        self._discard_initial_response()
+        for thread in threads:
+            thread.start()
+
+        while any(thread.is_alive() for thread in threads):
+            if display_progress:
+                self._display_progress()
+            self._save_partial_state()
+            time.sleep(1)
+
+        if self._range_unsupported:
+            return
+        if self.should_stop:
+            raise Exception("Download stopped")
+        if self._segment_error:
+            raise Exception(self._segment_error)
+
+        if self.should_checksum:
+            # Segments arrive out of order, hash the assembled file instead
+            self._hash_partial_file(total_size)
+
+
+    def _download_segment(self, segment: list, response: requests.Response = None) -> None:
+        """
+        Download a single byte range of the file
+
+        If the connection fails, the segment continues from the next source
+
+        Parameters:
+            segment  (list):              [start, position, end] of the segment, position is updated as data arrives
+            response (requests.Response): Open response starting at the segment's position (ie. the first request),
+                                          may extend past the segment's end
+        """
+
+        start, position, end = segment
+        if position > end:
+            return
+
+        sources = self._sources()
+        try:
+            for index, source in enumerate(sources):
+                try:
+                    self._download_segment_from_source(segment, source, response)
+                    return
+                except (requests.exceptions.RequestException, OSError) as e:
+                    if self.should_stop or self._segment_error or index == len(sources) - 1:
+                        raise
+                    logging.warning(f"Segment {start}-{end} failed on {source} ({e}), continuing from {sources[index + 1]}")
+                    response = None
+        except Exception as e:
+            with self._segment_lock:
+                if not self._segment_error:
+                    self._segment_error = str(e)
+
+
+    def _download_segment_from_source(self, segment: list, source: str, response: requests.Response = None) -> None:
+        """
+        Download the remainder of a segment from a single source
+
+        Parameters:
+            segment  (list):              [start, position, end] of the segment, position is updated as data arrives
+            source   (str):               URL to download from
+            response (requests.Response): Open response starting at the segment's position, if any
+        """
+
+        start, position, end = segment
+
+        if response is None:
+            response = NetworkUtilities().get(source, headers=self._resume_headers(position, end, source), stream=True, timeout=10)
+
+        try:
+            if response.status_code is None:
+                raise requests.exceptions.ConnectionError(f"Unable to reach {source}")
+            if response.status_code != 206 or self._response_start(response) != position or self._response_total(response) != int(self.total_file_size):
+                if source == self.source_url and response.status_code in [200, 206]:
+                    with self._segment_lock:
+                        self._range_unsupported = True
+                    return
+                raise requests.exceptions.HTTPError(f"{source} did not honour Range request (HTTP {response.status_code})")
+
+            verifier = self._create_verifier(position)
+
+            try:
+                with open(self.partial_path, "r+b") as file:
+                    file.seek(position)
+                    for chunk in response.iter_content(self._read_size()):
+                        if self.should_stop or self._segment_error or self._range_unsupported:
+                            return
+                        if not chunk:
+                            continue
+                        chunk = chunk[:end + 1 - segment[1]]
+                        if verifier and not verifier.update(chunk):
+                            raise Exception(verifier.error_msg)
+                        file.write(chunk)
+                        with self._segment_lock:
+                            segment[1] += len(chunk)
+                            self.downloaded_file_size += len(chunk)
+                        BANDWIDTH_LIMITER.consume(self.bandwidth_class, len(chunk))
+                        if segment[1] > end:
+                            break
+            except (requests.exceptions.RequestException, OSError):
+                self._rewind_to_chunk(segment, verifier)
+                raise
+
+            if segment[1] != end + 1:
+                self._rewind_to_chunk(segment, verifier)
+                raise requests.exceptions.ChunkedEncodingError(f"Segment {start}-{end} incomplete, received {segment[1] - start} bytes")
+        finally:
+            self._close_response(response)
+
+
     def get_percent(self) -> float:
         """
         Query the download percent
@@ -395,7 +1748,33 @@ class DownloadObject:
             float: The download speed in bytes per second
         """
 
-        return self.downloaded_file_size / (time.time() - self.start_time)
+        return (self.downloaded_file_size - self.resumed_file_size) / (time.time() - self.start_time)
+
+
+    def get_speed_limit(self) -> int:
+        """
+        Query the rate limit applied to the download
+
+        Returns:
+            int: The limit in bytes per second, or 0 if unlimited
+        """
+
+        return BANDWIDTH_LIMITER.get_limit(self.bandwidth_class)
+
+
+    def get_speed_str(self) -> str:
+        """
+        Query the download speed as a human readable string, including any rate limit
+
+        Returns:
+            str: ex. "4.2 MB/s" or "1.0 MB/s (limited to 1.0 MB/s)"
+        """
+
+        speed_str = f"{utilities.human_fmt(self.get_speed())}/s"
+        limit = self.get_speed_limit()
+        if limit:
+            speed_str += f" (limited to {utilities.human_fmt(limit)}/s)"
+        return speed_str
 
 
     def get_time_remaining(self) -> float:
@@ -418,6 +1797,8 @@ class DownloadObject:
         """
         Query the file size of the file to be downloaded
 
+        Only known once the download has started
+
         Returns:
             float: The file size in bytes, or 0.0 if unknown
         """
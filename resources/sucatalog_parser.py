@@ -0,0 +1,173 @@
+# Incremental parser for Apple's Software Update catalogs (.sucatalog)
+# Walks the catalog product by product as it downloads, rather than
+# materializing the entire multi-megabyte property list up front
+
+import binascii
+import datetime
+import xml.parsers.expat
+
+
+PRODUCT_DEPTH: int = 3  # Root dict -> 'Products' dict -> product dict
+
+
+class SUCatalogParser:
+    """
+    Streaming parser for SUCatalog XML property lists
+
+    Only entries under the top level 'Products' dictionary are built, one product at a time.
+    Products are handed out as soon as their closing tag is parsed, and discarded unless they pass the filter
+
+    Parameters:
+        product_filter (function): Called with each product's dictionary, products returning False are skipped
+
+    Usage:
+        >>> parser = SUCatalogParser(lambda product: "InstallAssistantPackageIdentifiers" in product.get("ExtendedMetaInfo", {}))
+        >>> for product_id, product in parser.parse(network_handler.NetworkUtilities().stream(url)):
+        ...     print(product_id, product["PostDate"])
+    """
+
+    def __init__(self, product_filter=None) -> None:
+        self.product_filter = product_filter
+
+        self._parser = xml.parsers.expat.ParserCreate()
+        self._parser.StartElementHandler  = self._start_element
+        self._parser.EndElementHandler    = self._end_element
+        self._parser.CharacterDataHandler = self._character_data
+        self._parser.buffer_text = True
+
+        self._stack:     list = []  # Containers being built, only within a product
+        self._keys:      list = []  # Pending key per dictionary level, including levels above products
+        self._depth:     int  = 0   # Dictionary/array nesting depth
+        self._data:      list = []
+        self._in_products:   bool = False
+        self._completed:     list = []
+
+
+    def parse(self, chunks):
+        """
+        Parse an iterable of byte chunks, yielding products as they complete
+
+        Parameters:
+            chunks (iterable): Chunks of the catalog, ie. from NetworkUtilities().stream()
+
+        Yields:
+            tuple: (product ID, product dictionary)
+        """
+
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        yield from self.close()
+
+
+    def feed(self, data: bytes) -> list:
+        """
+        Parse the next chunk of the catalog
+
+        Returns:
+            list: (product ID, product dictionary) for each product completed by this chunk
+        """
+
+        self._parser.Parse(data, False)
+        return self._take_completed()
+
+
+    def close(self) -> list:
+        """
+        Finish parsing, raising xml.parsers.expat.ExpatError if the catalog was truncated
+
+        Returns:
+            list: (product ID, product dictionary) for any remaining products
+        """
+
+        self._parser.Parse(b"", True)
+        return self._take_completed()
+
+
+    def _take_completed(self) -> list:
+        completed, self._completed = self._completed, []
+        return completed
+
+
+    def _building(self) -> bool:
+        return self._in_products and self._depth >= PRODUCT_DEPTH
+
+
+    def _start_element(self, element: str, attributes: dict) -> None:
+        self._data = []
+        if element not in ["dict", "array"]:
+            return
+
+        self._depth += 1
+        if element == "dict":
+            self._keys.append(None)
+
+        if self._depth == PRODUCT_DEPTH - 1 and self._keys[0] == "Products" and element == "dict":
+            self._in_products = True
+        if self._building():
+            self._stack.append({} if element == "dict" else [])
+
+
+    def _end_element(self, element: str) -> None:
+        if element in ["dict", "array"]:
+            if element == "dict":
+                self._keys.pop()
+            value = self._stack.pop() if self._building() else None
+            self._depth -= 1
+
+            if value is None:
+                if self._depth == PRODUCT_DEPTH - 2:
+                    self._in_products = False
+                return
+
+            if self._depth == PRODUCT_DEPTH - 1:
+                product_id = self._keys[-1]
+                self._keys[-1] = None
+                if self.product_filter is None or self.product_filter(value):
+                    self._completed.append((product_id, value))
+                return
+
+            self._add_value(value)
+            return
+
+        if element == "key":
+            self._keys[-1] = "".join(self._data)
+            return
+
+        if not self._building():
+            # Scalars outside of products (ie. 'CatalogVersion') are not needed
+            if self._keys and element != "plist":
+                self._keys[-1] = None
+            return
+
+        data = "".join(self._data)
+        if   element == "string":
+            value = data
+        elif element == "integer":
+            value = int(data, 16) if data.lower().startswith("0x") else int(data)
+        elif element == "real":
+            value = float(data)
+        elif element == "true":
+            value = True
+        elif element == "false":
+            value = False
+        elif element == "date":
+            value = datetime.datetime.strptime(data, "%Y-%m-%dT%H:%M:%SZ")
+        elif element == "data":
+            value = binascii.a2b_base64(data.encode("utf-8"))
+        else:
+            return
+
+        self._add_value(value)
+
+
+    def _add_value(self, value) -> None:
+        container = self._stack[-1]
+        if isinstance(container, dict):
+            container[self._keys[-1]] = value
+            self._keys[-1] = None
+        else:
+            container.append(value)
+
+
+    def _character_data(self, data: str) -> None:
+        self._data.append(data)
@@ -39,12 +39,17 @@ from pathlib import Path
 from datetime import datetime
 import logging
 
-from resources import constants, utilities, kdk_handler
+from resources import constants, utilities, kdk_handler, manifest_handler
 from resources.sys_patch import sys_patch_detect, sys_patch_auto, sys_patch_helpers, sys_patch_generate
 
 from data import os_data
 
 
+KDK_MERGE_MANIFEST_PATH: str = f"{manifest_handler.MANIFEST_CACHE_PATH}/KDK-Merge.manifest.plist"  # Manifest of the KDK files last merged into the root volume, keyed by volume and build
+KDK_EXTENSIONS_PATH:     str = "System/Library/Extensions"
+IOHID_CODE_SIGNATURE:    str = "IOHIDFamily.kext/Contents/PlugIns/IOHIDEventDriver.kext/Contents/_CodeSignature"
+
+
 class PatchSysVolume:
     def __init__(self, model: str, global_constants: constants.Constants, hardware_details: list = None) -> None:
         self.model = model
@@ -204,19 +209,29 @@ class PatchSysVolume:
         logging.info(f"- Found KDK at: {kdk_path}")
 
         # Due to some IOHIDFamily oddities, we need to ensure their CodeSignature is retained
-        cs_path = Path(self.mount_location) / Path("System/Library/Extensions/IOHIDFamily.kext/Contents/PlugIns/IOHIDEventDriver.kext/Contents/_CodeSignature")
+        cs_path = Path(self.mount_location) / Path(KDK_EXTENSIONS_PATH) / Path(IOHID_CODE_SIGNATURE)
         if save_hid_cs is True and cs_path.exists():
             logging.info("- Backing up IOHIDEventDriver CodeSignature")
             # Note it's a folder, not a file
             utilities.elevated(["cp", "-r", cs_path, f"{self.constants.payload_path}/IOHIDEventDriver_CodeSignature.bak"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
 
         logging.info(f"- Merging KDK with Root Volume: {kdk_path.name}")
-        utilities.elevated(
-            # Only merge '/System/Library/Extensions'
-            # 'Kernels' and 'KernelSupport' is wasted space for root patching (we don't care above dev kernels)
-            ["rsync", "-r", "-i", "-a", f"{kdk_path}/System/Library/Extensions/", f"{self.mount_location}/System/Library/Extensions"],
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        # Only merge '/System/Library/Extensions'
+        # 'Kernels' and 'KernelSupport' is wasted space for root patching (we don't care above dev kernels)
+        # Only kexts that changed since the last merge into this volume and build are copied, ie. when switching between KDK builds
+        merged_manifest = manifest_handler.merge_tree(
+            Path(self.mount_location) / Path(KDK_EXTENSIONS_PATH),
+            self._root_volume_identity(),
+            manifest_handler.TreeManifest.load(Path(self.mount_location) / Path(KDK_EXTENSIONS_PATH), KDK_MERGE_MANIFEST_PATH),
+            self._merge_kdk_files,
+            lambda: manifest_handler.TreeManifest.load_or_build(
+                kdk_path / Path(KDK_EXTENSIONS_PATH),
+                Path(manifest_handler.MANIFEST_CACHE_PATH) / Path(f"{kdk_path.name}.manifest.plist"),
+                manifest_handler.source_identity(kdk_path)
+            ),
+            exclude=[IOHID_CODE_SIGNATURE] if save_hid_cs is True else None
         )
+        merged_manifest.save(KDK_MERGE_MANIFEST_PATH)
         # During reversing, we found that kmutil uses this path to determine whether the KDK was successfully merged
         # Best to verify now before we cause any damage
         if not (Path(self.mount_location) / Path("System/Library/Extensions/System.kext/PlugIns/Libkern.kext/Libkern")).exists():
@@ -234,6 +249,48 @@ class PatchSysVolume:
             utilities.elevated(["rm", "-rf", f"{self.constants.payload_path}/IOHIDEventDriver_CodeSignature.bak"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
 
 
+    def _root_volume_identity(self) -> str:
+        """
+        Identify the root volume and build KDKs are merged into, see manifest_handler.merge_tree()
+
+        The volume is identified by UUID rather than by snapshot, as each root patch creates a new snapshot
+
+        Returns:
+            str: Identity, build only if the volume UUID can't be determined
+        """
+
+        disk = self.root_mount_path or utilities.get_disk_path()
+        try:
+            volume_uuid = plistlib.loads(subprocess.run(["diskutil", "info", "-plist", disk], stdout=subprocess.PIPE).stdout)["VolumeUUID"]
+        except Exception:
+            volume_uuid = ""
+        return f"{self.constants.detected_os_build}:{volume_uuid}"
+
+
+    def _merge_kdk_files(self, source_path: Path, destination_path: Path, relative_paths: list = None) -> None:
+        """
+        Copy KDK files onto the root volume, see manifest_handler.merge_tree()
+
+        Parameters:
+            source_path      (Path): KDK's 'System/Library/Extensions'
+            destination_path (Path): Root volume's 'System/Library/Extensions'
+            relative_paths   (list): Paths to copy, relative to source_path. If None, everything is copied
+        """
+
+        if relative_paths is None:
+            result = utilities.elevated(["rsync", "-r", "-i", "-a", f"{source_path}/", f"{destination_path}"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        else:
+            file_list = Path(self.constants.payload_path) / Path("KDK-Merge-Files.txt")
+            file_list.write_text("".join(f"{relative_path}\n" for relative_path in relative_paths))
+            result = utilities.elevated(["rsync", "-i", "-a", f"--files-from={file_list}", f"{source_path}/", f"{destination_path}"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            file_list.unlink()
+
+        if result.returncode != 0:
+            logging.info("- Failed to merge KDK with Root Volume")
+            logging.info(result.stdout.decode())
+            raise Exception(f"Failed to merge KDK with Root Volume (rsync exited with {result.returncode})")
+
+
     def _unpatch_root_vol(self):
         """
         Reverts APFS snapshot and cleans up any changes made to the root and data volume
@@ -737,19 +794,24 @@ class PatchSysVolume:
         # Make sure we clean old kexts in /L*/E* that are not in the patchset
         self._clean_auxiliary_kc()
 
-        # Make sure SNB kexts are compatible with the host
-        if "Intel Sandy Bridge" in required_patches:
-            sys_patch_helpers.SysPatchHelpers(self.constants).snb_board_id_patch(source_files_path)
-
+        source_files = []
         for patch in required_patches:
             # Check if all files are present
             for method_type in ["Install", "Install Non-Root"]:
                 if method_type in required_patches[patch]:
                     for install_patch_directory in required_patches[patch][method_type]:
                         for install_file in required_patches[patch][method_type][install_patch_directory]:
-                            source_file = source_files_path + "/" + required_patches[patch][method_type][install_patch_directory][install_file] + install_patch_directory + "/" + install_file
-                            if not Path(source_file).exists():
-                                raise Exception(f"Failed to find {source_file}")
+                            source_file = required_patches[patch][method_type][install_patch_directory][install_file] + install_patch_directory + "/" + install_file
+                            if not Path(source_files_path + "/" + source_file).exists():
+                                raise Exception(f"Failed to find {source_files_path}/{source_file}")
+                            source_files.append(source_file)
+
+        # Make sure files are intact, before any are patched in place
+        sys_patch_helpers.SysPatchHelpers(self.constants).verify_source_files(source_files_path, source_files)
+
+        # Make sure SNB kexts are compatible with the host
+        if "Intel Sandy Bridge" in required_patches:
+            sys_patch_helpers.SysPatchHelpers(self.constants).snb_board_id_patch(source_files_path)
 
         # Ensure KDK is properly installed
         self._merge_kdk_with_root(save_hid_cs=True if "Legacy USB 1.1" in required_patches else False)
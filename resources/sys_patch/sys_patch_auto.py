@@ -9,7 +9,7 @@ import webbrowser
 from pathlib import Path
 
 
-from resources import utilities, updates, global_settings, network_handler, constants
+from resources import utilities, updates, global_settings, network_handler, constants, kdk_handler, download_handler
 from resources.sys_patch import sys_patch_detect
 from resources.wx_gui import gui_entry
 
@@ -91,9 +91,14 @@ class AutomaticSysPatch:
                     args_string = f"{self.constants.launcher_binary} {self.constants.launcher_script} --gui_patch"
 
                 warning_str = ""
-                if network_handler.NetworkUtilities("https://api.github.com/repos/dortania/OpenCore-Legacy-Patcher/releases/latest").verify_network_connection() is False:
+                has_network = network_handler.NetworkUtilities(updates.REPO_LATEST_RELEASE_URL).verify_network_connection()
+                if has_network is False:
                     warning_str = f"""\n\nWARNING: We're unable to verify whether there are any new releases of OpenCore Legacy Patcher on Github. Be aware that you may be using an outdated version for this OS. If you're unsure, verify on Github that OpenCore Legacy Patcher {self.constants.patcher_version} is the latest official release"""
 
+                download_manager = None
+                if has_network and patches["Settings: Kernel Debug Kit missing"] is True:
+                    download_manager = self._prefetch_kdk()
+
                 args = [
                     "osascript",
                     "-e",
@@ -105,6 +110,9 @@ class AutomaticSysPatch:
                     stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT
                 )
+                if download_manager:
+                    # Partial download is resumed by the root patcher
+                    download_manager.shutdown()
                 if output.returncode == 0:
                     args = [
                         "osascript",
@@ -129,6 +137,30 @@ class AutomaticSysPatch:
             self._determine_if_boot_matches()
 
 
+    def _prefetch_kdk(self) -> download_handler.DownloadManager:
+        """
+        Start downloading the Kernel Debug Kit in the background while the user is prompted
+
+        The root patcher resumes the partial download (or restores it from the download cache)
+
+        Returns:
+            DownloadManager: Manager running the download, None if no download was started
+        """
+
+        kdk_obj = kdk_handler.KernelDebugKitObject(self.constants, self.constants.detected_os_build, self.constants.detected_os_version, passive=True)
+        if kdk_obj.success is False or kdk_obj.kdk_already_installed is True:
+            return None
+
+        kdk_download_obj = kdk_obj.retrieve_download()
+        if kdk_download_obj is None:
+            return None
+
+        logging.info("- Prefetching Kernel Debug Kit")
+        download_manager = download_handler.DownloadManager()
+        download_manager.enqueue(kdk_download_obj, download_handler.DownloadPriority.BACKGROUND)
+        return download_manager
+
+
     def _determine_if_versions_match(self):
         """
         Determine if the booted version of OCLP matches the installed version
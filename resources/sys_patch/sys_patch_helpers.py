@@ -11,7 +11,10 @@ from pathlib import Path
 from datetime import datetime
 
 from data import os_data
-from resources import bplist, constants, generate_smbios, utilities
+from resources import bplist, constants, generate_smbios, utilities, manifest_handler
+
+
+SNB_FRAMEBUFFER_BINARY: str = "10.13.6/System/Library/Extensions/AppleIntelSNBGraphicsFB.kext/Contents/MacOS/AppleIntelSNBGraphicsFB"  # Board IDs are patched in place
 
 
 class SysPatchHelpers:
@@ -57,7 +60,7 @@ class SysPatchHelpers:
             logging.info(f"Error: Board ID {self.constants.computer.reported_board_id} is longer than {board_to_patch}")
             raise Exception("Host's Board ID is longer than the kext's Board ID, cannot patch!!!")
 
-        path = source_files_path + "/10.13.6/System/Library/Extensions/AppleIntelSNBGraphicsFB.kext/Contents/MacOS/AppleIntelSNBGraphicsFB"
+        path = str(source_files_path) + "/" + SNB_FRAMEBUFFER_BINARY
         if not Path(path).exists():
             logging.info(f"Error: Could not find {path}")
             raise Exception("Failed to find AppleIntelSNBGraphicsFB.kext, cannot patch!!!")
@@ -69,6 +72,41 @@ class SysPatchHelpers:
                 f.write(data)
 
 
+    def verify_source_files(self, source_files_path: Path, relative_paths: list, manifest: manifest_handler.TreeManifest = None):
+        """
+        Verify PatcherSupportPkg files against the manifest shipped with Universal-Binaries.dmg
+
+        The manifest is generated by Build-Binary.command and never written at runtime
+        Only files whose stat information differs from the manifest are rehashed, so repeat checks are cheap
+        Skipped if no manifest was shipped for this PatcherSupportPkg version (ie. running from source)
+
+        Parameters:
+            source_files_path (Path): Root of the mounted Universal-Binaries.dmg
+            relative_paths    (list): Files and bundles to verify, relative to the root
+            manifest  (TreeManifest): Previously loaded manifest, loaded if None
+
+        Returns:
+            TreeManifest: Manifest used, None if skipped
+        """
+
+        if manifest is None:
+            manifest = manifest_handler.TreeManifest.load(source_files_path, self.constants.payload_local_binaries_root_path_manifest, shared_cache=False)
+            if manifest is None:
+                logging.info("- Universal-Binaries.dmg manifest not found, skipping source file integrity check")
+                return None
+            if manifest.source != self.constants.patcher_support_pkg_version:
+                logging.info(f"- Universal-Binaries.dmg manifest is for PatcherSupportPkg {manifest.source}, skipping source file integrity check")
+                return None
+
+        problems = manifest.verify_paths(relative_paths, exclude=[SNB_FRAMEBUFFER_BINARY])
+        if problems:
+            for problem in problems:
+                logging.info(f"- {problem}")
+            raise Exception(f"PatcherSupportPkg resources failed integrity check ({len(problems)} problems), please redownload OpenCore Legacy Patcher")
+
+        return manifest
+
+
     def generate_patchset_plist(self, patchset: dict, file_name: str, kdk_used: Path):
         """
         Generate patchset file for user reference
@@ -119,7 +119,7 @@ class CheckBinaryUpdates:
         if not network_handler.NetworkUtilities(REPO_LATEST_RELEASE_URL).verify_network_connection():
             return None
 
-        response = network_handler.NetworkUtilities().get(REPO_LATEST_RELEASE_URL)
+        response = network_handler.NetworkUtilities().get(REPO_LATEST_RELEASE_URL, use_cache=True)
         data_set = response.json()
 
         if "tag_name" not in data_set:
@@ -19,6 +19,7 @@ class PatcherValidation:
         self.constants: constants.Constants = global_constants
 
         self.constants.validate = True
+        self.payload_manifest = None
 
         self.valid_dumps = [
             example_data.MacBookPro.MacBookPro92_Stock,
@@ -104,6 +105,7 @@ class PatcherValidation:
 
         patchset = sys_patch_dict.SystemPatchDictionary(major_kernel, minor_kernel, self.constants.legacy_accel_support).patchset_dict
         host_os_float = float(f"{major_kernel}.{minor_kernel}")
+        source_files = []
 
         for patch_subject in patchset:
             for patch_core in patchset[patch_subject]:
@@ -115,10 +117,15 @@ class PatcherValidation:
                     if install_type in patchset[patch_subject][patch_core]:
                         for install_directory in patchset[patch_subject][patch_core][install_type]:
                             for install_file in patchset[patch_subject][patch_core][install_type][install_directory]:
-                                source_file = str(self.constants.payload_local_binaries_root_path) + "/" + patchset[patch_subject][patch_core][install_type][install_directory][install_file] + install_directory + "/" + install_file
+                                relative_file = patchset[patch_subject][patch_core][install_type][install_directory][install_file] + install_directory + "/" + install_file
+                                source_file = str(self.constants.payload_local_binaries_root_path) + "/" + relative_file
                                 if not Path(source_file).exists():
                                     logging.info(f"File not found: {source_file}")
                                     raise Exception(f"Failed to find {source_file}")
+                                source_files.append(relative_file)
+
+        # Manifest is shared between kernel versions, only files changed since it was built are rehashed
+        self.payload_manifest = sys_patch_helpers.SysPatchHelpers(self.constants).verify_source_files(self.constants.payload_local_binaries_root_path, source_files, self.payload_manifest)
 
         logging.info(f"Validating against Darwin {major_kernel}.{minor_kernel}")
         if not sys_patch_helpers.SysPatchHelpers(self.constants).generate_patchset_plist(patchset, f"OpenCore-Legacy-Patcher-{major_kernel}.{minor_kernel}.plist", None):
@@ -134,7 +141,7 @@ class PatcherValidation:
         """
 
         if not Path(self.constants.payload_local_binaries_root_path_dmg).exists():
-            dl_obj = network_handler.DownloadObject(f"https://github.com/dortania/PatcherSupportPkg/releases/download/{self.constants.patcher_support_pkg_version}/Universal-Binaries.dmg", self.constants.payload_local_binaries_root_path_dmg)
+            dl_obj = network_handler.DownloadObject(f"https://github.com/dortania/PatcherSupportPkg/releases/download/{self.constants.patcher_support_pkg_version}/Universal-Binaries.dmg", self.constants.payload_local_binaries_root_path_dmg, use_cache=True)
             dl_obj.download(spawn_thread=False)
             if dl_obj.download_complete is False:
                 logging.info("Failed to download Universal-Binaries.dmg")
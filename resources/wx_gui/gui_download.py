@@ -77,7 +77,7 @@ class DownloadFrame(wx.Frame):
             label_amount.Centre(wx.HORIZONTAL)
 
             label_speed.SetLabel(
-                f"Average download speed: {utilities.human_fmt(self.download_obj.get_speed())}/s"
+                f"Average download speed: {self.download_obj.get_speed_str()}"
             )
 
             label_est_time.SetLabel(
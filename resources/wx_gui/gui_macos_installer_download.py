@@ -299,7 +299,15 @@ class macOSInstallerDownloadFrame(wx.Frame):
 
             self.frame_modal.Close()
 
-            download_obj = network_handler.DownloadObject(list(installers.values())[selected_item]['Link'], self.constants.payload_path / "InstallAssistant.pkg")
+            # Grab chunklist ahead of time, allowing the installer to be validated as it downloads
+            chunk_obj = None
+            chunklist = None
+            chunklist_stream = network_handler.NetworkUtilities().get(list(installers.values())[selected_item]['integrity']).content
+            if chunklist_stream:
+                chunk_obj = integrity_verification.ChunklistVerification(self.constants.payload_path / Path("InstallAssistant.pkg"), chunklist_stream, use_cache=True)
+                chunklist = chunk_obj.chunks
+
+            download_obj = network_handler.DownloadObject(list(installers.values())[selected_item]['Link'], self.constants.payload_path / "InstallAssistant.pkg", use_cache=True, chunklist=chunklist)
 
             gui_download.DownloadFrame(
                 self,
@@ -313,12 +321,19 @@ class macOSInstallerDownloadFrame(wx.Frame):
                 self.on_return_to_main_menu()
                 return
 
-            self._validate_installer(list(installers.values())[selected_item]['integrity'])
+            if download_obj.chunklist_verified:
+                chunk_obj.mark_verified()
+
+            self._validate_installer(list(installers.values())[selected_item]['integrity'], already_validated=download_obj.chunklist_verified)
 
 
-    def _validate_installer(self, chunklist_link: str) -> None:
+    def _validate_installer(self, chunklist_link: str, already_validated: bool = False) -> None:
         """
         Validate macOS installer
+
+        Parameters:
+            chunklist_link (str):     Link to the installer's chunklist
+            already_validated (bool): Skip validation, ie. chunks were verified during download
         """
         self.SetSize((300, 200))
         for child in self.GetChildren():
@@ -342,11 +357,11 @@ class macOSInstallerDownloadFrame(wx.Frame):
         self.SetSize((-1, progress_bar.GetPosition()[1] + progress_bar.GetSize()[1] + 40))
         self.Show()
 
-        chunklist_stream = network_handler.NetworkUtilities().get(chunklist_link).content
+        chunklist_stream = network_handler.NetworkUtilities().get(chunklist_link).content if already_validated is False else None
         if chunklist_stream:
             logging.info("Validating macOS installer")
             utilities.disable_sleep_while_running()
-            chunk_obj = integrity_verification.ChunklistVerification(self.constants.payload_path / Path("InstallAssistant.pkg"), chunklist_stream)
+            chunk_obj = integrity_verification.ChunklistVerification(self.constants.payload_path / Path("InstallAssistant.pkg"), chunklist_stream, use_cache=True)
             if chunk_obj.chunks:
                 progress_bar.SetValue(chunk_obj.current_chunk)
                 progress_bar.SetRange(chunk_obj.total_chunks)